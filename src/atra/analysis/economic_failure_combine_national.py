@@ -48,7 +48,7 @@ def main():
     for m in range(len(modes)):
         # Load mode igraph network and GeoDataFrame
         print ('* Loading {} network GeoDataFrame'.format(modes[m]))
-        gdf_edges = gpd.read_file(os.path.join(network_data_path,'{}_edges.shp'.format(modes[m])),encoding='utf-8')
+        gdf_edges = read_geo_file(os.path.join(network_data_path,'{}_edges.shp'.format(modes[m])),encoding='utf-8')
         gdf_edges = gdf_edges[['edge_id','geometry']]
 
         for perct in percentage:
@@ -117,6 +117,8 @@ def main():
         List of float type
     6. Condition on whether analysis is single failure or multiple failure
         Boolean condition True or False
+    7. Number of processes to run the failure scenarios on
+        Integer type, or None to use all cores
 
     Give the paths to the input data files:
 
@@ -148,6 +150,9 @@ def main():
     index_cols = ['origin_id', 'destination_id', 'origin_province', 'destination_province']
     percentage = [100.0]
     single_edge = True
+    num_processes = None
+    # Rerouting mode of run_edge_failure_scenarios: 'dijkstra', 'astar' or 'detour_heuristic'
+    routing = 'dijkstra'
 
     # Give the paths to the input data files
     network_data_path = os.path.join(data_path,'network')
@@ -184,12 +189,20 @@ def main():
     if os.path.exists(minmax_combine) == False:
         os.mkdir(minmax_combine)
 
+    scenario_cache = os.path.join(fail_output_path,'scenario_cache')
+    if os.path.exists(scenario_cache) == False:
+        os.mkdir(scenario_cache)
+
 
     for m in range(len(modes)):
         # Load mode igraph network and GeoDataFrame
         print ('* Loading {} igraph network and GeoDataFrame'.format(modes[m]['sector']))
         G_df = pd.read_csv(os.path.join(network_data_path,'{}_edges.csv'.format(modes[m]['sector'])),encoding='utf-8').fillna(0)
-        gdf_edges = gpd.read_file(os.path.join(network_data_path,'{}_edges.shp'.format(modes[m]['sector'])),encoding='utf-8')
+        gdf_edges = read_geo_file(os.path.join(network_data_path,'{}_edges.shp'.format(modes[m]['sector'])),encoding='utf-8')
+        if routing == 'astar':
+            gdf_nodes = read_geo_file(os.path.join(network_data_path,'{}_nodes.shp'.format(modes[m]['sector'])),encoding='utf-8')
+        else:
+            gdf_nodes = None
 
         # Create failure scenarios
         print ('* Creating {} failure scenarios to include DNV identified roads not found flooded'.format(modes[m]['sector']))
@@ -201,7 +214,7 @@ def main():
         flood_points['poly_geometry'] = flood_points.geometry.apply(lambda x: x.buffer(120))
         poly_df = flood_points[['id','poly_geometry']]
         poly_df.rename(columns={'poly_geometry':'geometry'},inplace=True)
-        road_matches = gpd.sjoin(poly_df,gdf_edges[gdf_edges['road_type'] == 'national'][['edge_id','geometry']].to_crs(epsg=epsg_utm_20s), how="inner", op='intersects').reset_index()
+        road_matches = gpd.sjoin(poly_df,gdf_edges[gdf_edges['road_type'] == 'national'][['edge_id','geometry']].to_crs(epsg=epsg_utm_20s), how="inner", predicate='intersects').reset_index()
         flood_edges += road_matches.edge_id.values.tolist()
         del flood_points, road_matches
 
@@ -217,7 +230,10 @@ def main():
         for perct in percentage:
             # Load flow paths
             print ('* Loading {} flow paths'.format(modes[m]['sector']))
-            flow_df = pd.read_csv(os.path.join(flow_paths_data,'flow_paths_{}_{}_percent_assignment.csv'.format(modes[m]['sector'],int(perct))),encoding='utf-8')
+            flow_paths_file = os.path.join(flow_paths_data,'flow_paths_{}_{}_percent_assignment.csv'.format(modes[m]['sector'],int(perct)))
+            flow_df = pd.read_csv(flow_paths_file,encoding='utf-8')
+            path_store_file = os.path.splitext(flow_paths_file)[0] + '.npz'
+            path_store = load_flow_path_store(path_store_file,source_path=flow_paths_file)
 
             if modes[m]['sector'] == 'road':
                 e_flow = pd.read_csv(os.path.join(output_path,'flow_mapping_combined','weighted_flows_{}_{}_percent.csv'.format(modes[m]['sector'],int(perct))))[['edge_id','max_total_tons']]
@@ -238,23 +254,15 @@ def main():
             # Perform failure analysis
             edge_fail_ranges = []
             for t in range(len(types)):
-                edge_path_idx = get_flow_paths_indexes_of_edges(flow_df,path_types[t])
+                edge_path_idx = get_flow_paths_indexes_of_edges(flow_df,path_types[t],path_store=path_store)
                 print ('* Performing {} {} failure analysis'.format(types[t],modes[m]['sector']))
-                ef_list = []
-                for f_edge in range(len(ef_sc_list)):
-                    fail_edge = ef_sc_list[f_edge]
-                    if isinstance(fail_edge,list) == False:
-                        fail_edge = [fail_edge]
-                    
-                    ef_dict = igraph_scenario_edge_failures_new(
-                            G_df, fail_edge, flow_df,edge_path_idx,
-                            path_types[t],modes[m]['{}_tons_column'.format(types[t])], 
-                            cost_types[t], time_types[t],modes[m]['sector'],new_path=False)
-
-                    if ef_dict:
-                        ef_list += ef_dict
-
-                    print('Done with mode {0} edge {1} out of {2} type {3}'.format(modes[m]['sector'], f_edge, len(ef_sc_list),types[t]))
+                ef_list = run_edge_failure_scenarios(
+                        G_df, ef_sc_list, flow_df,edge_path_idx,
+                        path_types[t],modes[m]['{}_tons_column'.format(types[t])],
+                        cost_types[t], time_types[t],modes[m]['sector'],new_path=False,
+                        num_processes=num_processes,
+                        cache_path=os.path.join(scenario_cache,modes[m]['sector']),
+                        routing=routing,nodes_dataframe=gdf_nodes)
 
                 df = pd.DataFrame(ef_list)
 
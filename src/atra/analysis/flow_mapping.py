@@ -82,7 +82,8 @@ from atra.transport_flow_and_failure_functions import *
 from atra.utils import *
 
 def network_od_paths_assembly(points_dataframe, graph, transport_mode,
-                                min_tons_column,max_tons_column,csv_output_path=''):
+                                min_tons_column,max_tons_column,csv_output_path='',path_store_path='',
+                                path_caches=None):
     """Assemble estimates of OD paths, distances, times, costs and tonnages on networks
 
     Parameters
@@ -95,6 +96,13 @@ def network_od_paths_assembly(points_dataframe, graph, transport_mode,
         name of Province
     excel_writer
         Name of the excel writer to save Pandas dataframe to Excel file
+    csv_output_path : str
+        Path where the output csv file will be stored
+    path_store_path : str
+        Path where the min-max edge paths will be stored in CSR form as a .npz file
+    path_caches : dict
+        AllPairsPathCache of the network for min_gcost and max_gcost, to read the OD paths
+        from instead of estimating them on the graph
 
     Returns
     -------
@@ -116,16 +124,23 @@ def network_od_paths_assembly(points_dataframe, graph, transport_mode,
 
     """
     save_paths = []
+    edge_attributes = EdgeAttributeTable(graph)
     points_dataframe = points_dataframe.set_index('origin_id')
     origins = list(set(points_dataframe.index.values.tolist()))
     for origin in origins:
         try:
             destinations = points_dataframe.loc[[origin], 'destination_id'].values.tolist()
 
-            get_min_path, get_min_dist, get_min_time, get_min_gcost = network_od_path_estimations(
-                graph, origin, destinations, 'min_gcost', 'min_time')
-            get_max_path, get_max_dist, get_max_time, get_max_gcost = network_od_path_estimations(
-                graph, origin, destinations,'max_gcost', 'max_time')
+            if path_caches:
+                get_min_path, get_min_dist, get_min_time, get_min_gcost = path_caches[
+                    'min_gcost'].od_path_estimations(origin, destinations)
+                get_max_path, get_max_dist, get_max_time, get_max_gcost = path_caches[
+                    'max_gcost'].od_path_estimations(origin, destinations)
+            else:
+                get_min_path, get_min_dist, get_min_time, get_min_gcost = network_od_path_estimations(
+                    graph, origin, destinations, 'min_gcost', 'min_time', edge_attributes=edge_attributes)
+                get_max_path, get_max_dist, get_max_time, get_max_gcost = network_od_path_estimations(
+                    graph, origin, destinations,'max_gcost', 'max_time', edge_attributes=edge_attributes)
 
             if min_tons_column == max_tons_column:
                 tons = points_dataframe.loc[[origin], max_tons_column].values
@@ -155,6 +170,9 @@ def network_od_paths_assembly(points_dataframe, graph, transport_mode,
                                   & (save_paths_df['origin_id'] != 0)]
     if csv_output_path:
         save_paths_df.to_csv(csv_output_path, index=False, encoding='utf-8-sig')
+    if path_store_path:
+        write_flow_path_store(path_store_path, save_paths_df, ['min_edge_path', 'max_edge_path'],
+                              source_path=csv_output_path)
     del save_paths
 
     return save_paths_df
@@ -172,6 +190,8 @@ def main():
         - Percentage of OD flow we want to send along path: FLoat type
         - Names of modes: List of dictionaries
         - Names of min-max tonnage column names in OD data
+        - Whether the OD paths of the mode are read from cached all-pairs path matrices,
+          for networks small enough to hold node by node matrices
 
     3. Give the paths to the input data files:
         - Network edges csv files
@@ -190,16 +210,19 @@ def main():
                 'sector':'road',
                 'min_tons_column':'total_tons',
                 'max_tons_column':'total_tons',
+                'all_pairs_cache':False,
                 },
                 {
                 'sector':'rail',
                 'min_tons_column':'min_total_tons',
                 'max_tons_column':'max_total_tons',
+                'all_pairs_cache':True,
                 },
                 {
                 'sector':'port',
                 'min_tons_column':'min_total_tons',
                 'max_tons_column':'max_total_tons',
+                'all_pairs_cache':True,
                 }
     ]
 
@@ -219,15 +242,22 @@ def main():
     if os.path.exists(flow_paths_dir) == False:
         os.mkdir(flow_paths_dir)
 
+    all_pairs_cache_dir = os.path.join(calc_path, 'all_pairs_paths')
+
     for perct in percentage:
         # Start the OD flow mapping process
         for m in range(len(modes)):
             # Load mode igraph network and GeoDataFrame
             print ('* Loading {} igraph network and GeoDataFrame'.format(modes[m]['sector']))
-            edges_in = pd.read_csv(os.path.join(network_data_path,'{}_edges.csv'.format(modes[m]['sector'])),encoding='utf-8-sig')
+            edges_csv = os.path.join(network_data_path,'{}_edges.csv'.format(modes[m]['sector']))
+            edges_in = pd.read_csv(edges_csv,encoding='utf-8-sig')
             G = ig.Graph.TupleList(edges_in.itertuples(index=False), edge_attrs=list(edges_in.columns)[2:])
             del edges_in
-            gdf_edges = gpd.read_file(os.path.join(network_data_path,'{}_edges.shp'.format(modes[m]['sector'])),encoding='utf-8')
+            path_caches = None
+            if modes[m]['all_pairs_cache'] == True:
+                path_caches = dict([(cost_criteria, AllPairsPathCache(edges_csv, all_pairs_cache_dir, cost_criteria, time_criteria))
+                                    for cost_criteria, time_criteria in [('min_gcost','min_time'),('max_gcost','max_time')]])
+            gdf_edges = read_geo_file(os.path.join(network_data_path,'{}_edges.shp'.format(modes[m]['sector'])),encoding='utf-8')
             gdf_edges = gdf_edges[['edge_id','geometry']]
 
             # Load mode OD nodes pairs and tonnages
@@ -248,23 +278,26 @@ def main():
             # Calculate mode OD paths
             print ('* Calculating {} OD paths'.format(modes[m]))
             csv_output_path = os.path.join(flow_paths_dir,'flow_paths_{}_{}_percent_assignment.csv'.format(modes[m]['sector'],int(perct)))
+            path_store_path = os.path.join(flow_paths_dir,'flow_paths_{}_{}_percent_assignment.npz'.format(modes[m]['sector'],int(perct)))
             all_paths = network_od_paths_assembly(
-                all_ods, G, modes[m]['sector'],modes[m]['min_tons_column'],modes[m]['max_tons_column'],csv_output_path=csv_output_path)
+                all_ods, G, modes[m]['sector'],modes[m]['min_tons_column'],modes[m]['max_tons_column'],
+                csv_output_path=csv_output_path,path_store_path=path_store_path,path_caches=path_caches)
 
-            del all_ods
+            del all_ods, path_caches
             # Create network shapefiles with flows
             print ('* Creating {} network shapefiles and csv files with flows'.format(modes[m]['sector']))
 
-            all_paths = pd.read_csv(os.path.join(flow_paths_dir,'flow_paths_{}_{}_percent_assignment.csv'.format(modes[m]['sector'],int(perct))),encoding='utf-8-sig')
-            all_paths['min_edge_path'] = all_paths.progress_apply(lambda x:ast.literal_eval(x['min_edge_path']),axis=1)
-            all_paths['max_edge_path'] = all_paths.progress_apply(lambda x:ast.literal_eval(x['max_edge_path']),axis=1)
+            all_paths = pd.read_csv(csv_output_path,encoding='utf-8-sig')
+            path_store = load_flow_path_store(path_store_path, source_path=csv_output_path)
 
             shp_output_path = os.path.join(flow_shp_dir,'weighted_flows_{}_{}_percent.shp'.format(modes[m]['sector'],int(perct)))
             csv_output_path = os.path.join(flow_csv_dir,'weighted_flows_{}_{}_percent.csv'.format(modes[m]['sector'],int(perct)))
 
             write_flow_paths_to_network_files(all_paths,
                 min_ind_cols,max_ind_cols,gdf_edges,
-                save_csv=True, save_shapes=True, shape_output_path=shp_output_path,csv_output_path=csv_output_path)
+                save_csv=True, save_shapes=True, shape_output_path=shp_output_path,csv_output_path=csv_output_path,
+                path_store=path_store)
+            del path_store
 
 
 if __name__ == '__main__':
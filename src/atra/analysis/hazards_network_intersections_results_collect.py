@@ -72,7 +72,7 @@ from tqdm import tqdm
 
 
 def create_hazard_attributes_for_network(intersection_dir,climate_scenario,year,sector,hazard_files,
-    hazard_df,thresholds,commune_shape,network_id_column,network_type=''):
+    hazard_df,thresholds,commune_shape,network_id_column,network_type='',record_sink=None):
     """Extract results of network edges/nodes and hazard intersections to collect
     network-hazard intersection attributes
 
@@ -99,11 +99,14 @@ def create_hazard_attributes_for_network(intersection_dir,climate_scenario,year,
         value -'edges' or 'nodes': Default = 'nodes'
     name_province : str, optional
         name of province if needed: Default = ''
+    record_sink : IntersectionRecordSink, optional
+        sink the records are streamed to, which the caller closes to get the aggregated
+        records: Default = None, the records are aggregated and returned
 
     Returns
     -------
     data_df : pandas.DataFrame
-        network-hazard-boundary intersection attributes:
+        network-hazard-boundary intersection attributes, or None if a record_sink is given:
             - edge_id/node_id - String name of intersecting edge ID or node ID
             - length - Float length of intersection of edge LineString and hazard Polygon: Only for edges
             - province_id - String/Integer ID of Province
@@ -124,7 +127,10 @@ def create_hazard_attributes_for_network(intersection_dir,climate_scenario,year,
             - length - Float length of intersection of edge LineString and hazard Polygon: Only for edges
 
     """
-    data_dict = []
+    if record_sink is None:
+        data_sink = IntersectionRecordSink()
+    else:
+        data_sink = record_sink
     for root, dirs, files in os.walk(intersection_dir):
         for file in files:
             if file.endswith(".shp"):
@@ -149,20 +155,15 @@ def create_hazard_attributes_for_network(intersection_dir,climate_scenario,year,
                 hazard_dict['max_depth'] = hazard_thrs[1]
 
 
-                data_dict = spatial_scenario_selection(
-                            hazard_shp, commune_shape, hazard_dict, data_dict,
+                data_sink.append(spatial_scenario_attributes(
+                            hazard_shp, commune_shape, hazard_dict,
                             network_id_column,
-                            network_type = network_type)
+                            network_type = network_type))
 
                 print ('Done with file',file)
 
-    data_df = pd.DataFrame(data_dict)
-    data_df_cols = data_df.columns.values.tolist()
-    if 'length' in data_df_cols:
-        selected_cols = [cols for cols in data_df_cols if cols != 'length']
-        data_df = data_df.groupby(selected_cols)['length'].sum().reset_index()
-
-    return data_df
+    if record_sink is None:
+        return data_sink.close()
 
 def main():
     """Collect results
@@ -204,8 +205,8 @@ def main():
                                     'admin_boundaries_and_census',
                                     'provincia',
                                     'Provincias.shp')
-    provinces = gpd.read_file(province_path,encoding='utf-8')
-    provinces = provinces.to_crs({'init': 'epsg:4326'})
+    provinces = read_geo_file(province_path,encoding='utf-8')
+    provinces = provinces.to_crs('epsg:4326')
     provinces.rename(columns={'OBJECTID':'province_id','nombre':'province_name','Geometry':'geom_type'},inplace=True)
     sindex_provinces = provinces.sindex
 
@@ -216,14 +217,14 @@ def main():
                                 'admin_boundaries_and_census',
                                 'departamento',
                                 'Departamentos.shp')
-    zones = gpd.read_file(zones_path,encoding='utf-8')
-    zones = zones.to_crs({'init': 'epsg:4326'})
+    zones = read_geo_file(zones_path,encoding='utf-8')
+    zones = zones.to_crs('epsg:4326')
     zones.rename(columns={'OBJECTID':'department_id','Name':'department_name','Geometry':'geom_type'},inplace=True)
 
     zones['geometry_centroid'] = zones.geometry.centroid
     zones_centriods = zones[['department_id','department_name','geometry_centroid']]
     zones_centriods.rename(columns={'geometry_centroid':'geometry'},inplace=True)
-    zone_matches = gpd.sjoin(zones_centriods,provinces[['province_id','province_name','geometry']], how="inner", op='within').reset_index()
+    zone_matches = gpd.sjoin(zones_centriods,provinces[['province_id','province_name','geometry']], how="inner", predicate='within').reset_index()
     no_zones = [x for x in zones['department_id'].tolist() if x not in zone_matches['department_id'].tolist()]
 
     zones.drop('geometry_centroid',axis=1,inplace=True)
@@ -259,25 +260,25 @@ def main():
     if national_results == 'Yes':
         print ('* Processing national scale results')
         for m in range(len(modes)):
-            mode_data_df = []
+            if modes[m] in ['road','rail','bridge']:
+                ntype = 'edges'
+            else:
+                ntype = 'nodes'
+
+            records_path = os.path.join(output_dir,'{}_hazard_intersection_records.parquet'.format(modes[m]))
+            mode_data_sink = IntersectionRecordSink(records_path=records_path,
+                                                    schema=intersection_record_schema(modes_id_cols[m],network_type=ntype))
             for cl_sc in range(len(climate_scenarios)):
                 intersection_dir = os.path.join(
                     output_path,
                     'networks_hazards_intersection_shapefiles',
                     '{}_hazard_intersections'.format(modes[m]),climate_scenarios[cl_sc])
 
-                if modes[m] in ['road','rail','bridge']:
-                    ntype = 'edges'
-                else:
-                    ntype = 'nodes'
-                data_df = create_hazard_attributes_for_network(
+                create_hazard_attributes_for_network(
                     intersection_dir,climate_scenarios[cl_sc],years[cl_sc],modes[m],hazard_files,hazard_df,
-                    thresholds,zones,modes_id_cols[m],network_type=ntype)
-
-                mode_data_df.append(data_df)
-                del data_df
+                    thresholds,zones,modes_id_cols[m],network_type=ntype,record_sink=mode_data_sink)
 
-            mode_data_df = pd.concat(mode_data_df,axis=0,sort='False', ignore_index=True)
+            mode_data_df = mode_data_sink.close()
             data_path = os.path.join(output_dir,'{}_hazard_intersections.csv'.format(modes[m]))
             mode_data_df.to_csv(data_path,index=False,encoding='utf-8-sig')
             del mode_data_df
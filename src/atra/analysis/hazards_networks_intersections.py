@@ -33,15 +33,34 @@ Results
     - geometry - Shapely Point geometry of intersecting node ID
 
 """
-import itertools
+import multiprocessing
 import os
+import re
 import sys
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
-from shapely.geometry import Polygon
+import rasterio
+import shapely
+from rasterio.windows import Window
 from atra.utils import *
 
+def write_shapefile_atomic(gdf, output_shapefile):
+    """Write a GeoDataFrame to a shapefile in a temporary directory and then move the
+    shapefile files in place, so an interrupted write does not leave a partial shapefile
+    """
+    output_dir, output_name = os.path.split(output_shapefile)
+    tmp_dir = os.path.join(output_dir, '.tmp_{}'.format(output_name[:-4]))
+    if os.path.exists(tmp_dir) == False:
+        os.mkdir(tmp_dir)
+    for file in os.listdir(tmp_dir):
+        os.remove(os.path.join(tmp_dir, file))
+    gdf.to_file(os.path.join(tmp_dir, output_name))
+    for file in os.listdir(tmp_dir):
+        os.replace(os.path.join(tmp_dir, file), os.path.join(output_dir, file))
+    os.rmdir(tmp_dir)
+
 
 def networkedge_hazard_intersection(edge_shapefile, hazard_shapefile, output_shapefile,edge_id_column):
     """Intersect network edges and hazards and write results to shapefiles
@@ -64,61 +83,191 @@ def networkedge_hazard_intersection(edge_shapefile, hazard_shapefile, output_sha
         - geometry - Shapely LineString geometry of intersection of edge LineString and hazard Polygon
     """
     print ('* Starting {} and {} intersections'.format(edge_shapefile,hazard_shapefile))
-    line_gpd = gpd.read_file(edge_shapefile)
-    line_gpd.to_crs({'init': 'epsg:4326'})
+    line_gpd = read_geo_file(edge_shapefile)
+    line_gpd.to_crs('epsg:4326')
     poly_gpd = gpd.read_file(hazard_shapefile)
-    poly_gpd.to_crs({'init': 'epsg:4326'})
+    poly_gpd.to_crs('epsg:4326')
 
     if len(line_gpd.index) > 0 and len(poly_gpd.index) > 0:
         line_gpd.columns = map(str.lower, line_gpd.columns)
         poly_gpd.columns = map(str.lower, poly_gpd.columns)
 
-        line_bounding_box = line_gpd.total_bounds
-        line_bounding_box_coord = list(itertools.product([line_bounding_box[0], line_bounding_box[2]], [
-                                       line_bounding_box[1], line_bounding_box[3]]))
-        line_bounding_box_geom = Polygon(line_bounding_box_coord)
-        line_bounding_box_gpd = gpd.GeoDataFrame(pd.DataFrame(
-            [[1], [line_bounding_box_geom]]).T, crs='epsg:4326')
-        line_bounding_box_gpd.columns = ['ID', 'geometry']
-
-        poly_bounding_box = poly_gpd.total_bounds
-        poly_bounding_box_coord = list(itertools.product([poly_bounding_box[0], poly_bounding_box[2]], [
-                                       poly_bounding_box[1], poly_bounding_box[3]]))
-        poly_bounding_box_geom = Polygon(poly_bounding_box_coord)
-        poly_bounding_box_gpd = gpd.GeoDataFrame(pd.DataFrame(
-            [[1], [poly_bounding_box_geom]]).T, crs='epsg:4326')
-        poly_bounding_box_gpd.columns = ['ID', 'geometry']
-
-        poly_sindex = poly_bounding_box_gpd.sindex
-
-        selected_polys = poly_bounding_box_gpd.iloc[list(
-            poly_sindex.intersection(line_bounding_box_gpd['geometry'].iloc[0].bounds))]
-        if len(selected_polys.index) > 0:
-            data = []
-            poly_sindex = poly_gpd.sindex
-            for l_index, lines in line_gpd.iterrows():
-                intersected_polys = poly_gpd.iloc[list(
-                    poly_sindex.intersection(lines.geometry.bounds))]
-                for p_index, poly in intersected_polys.iterrows():
-                    if (lines['geometry'].intersects(poly['geometry']) is True) and (poly.geometry.is_valid is True):
-                        if line_length(lines['geometry']) > 1e-3:
-                            data.append({edge_id_column: lines[edge_id_column], 'length': 1000.0*line_length(lines['geometry'].intersection(
-                                poly['geometry'])), 'geometry': lines['geometry'].intersection(poly['geometry'])})
-                        else:
-                            data.append({edge_id_column: lines[edge_id_column], 'length': 0, 'geometry': lines['geometry']})
-            if data:
-                intersections_data = gpd.GeoDataFrame(
-                    data, columns=[edge_id_column, 'length', 'geometry'], crs='epsg:4326')
-                intersections_data.to_file(output_shapefile)
-
-                del intersections_data
+        # One spatial index query for all edges returns every intersecting edge-hazard pair
+        poly_gpd = poly_gpd[poly_gpd.geometry.is_valid]
+        line_index, poly_index = poly_gpd.sindex.query(line_gpd.geometry, predicate='intersects')
+        if len(line_index) > 0:
+            pair_order = np.lexsort((poly_index, line_index))
+            line_index, poly_index = line_index[pair_order], poly_index[pair_order]
+
+            edge_lengths = np.zeros(len(line_gpd.index))
+            hazard_edges = np.unique(line_index)
+            edge_lengths[hazard_edges] = line_lengths(line_gpd.geometry.iloc[hazard_edges])
+            pair_lines = line_gpd.geometry.iloc[line_index].reset_index(drop=True)
+            pair_polys = poly_gpd.geometry.iloc[poly_index].reset_index(drop=True)
+            long_pairs = edge_lengths[line_index] > 1e-3
+
+            # Edges shorter than a metre are kept whole, with zero length
+            pair_geoms = pair_lines.copy()
+            pair_geoms[long_pairs] = pair_lines[long_pairs].intersection(pair_polys[long_pairs])
+            pair_lengths = np.zeros(len(line_index))
+            pair_lengths[long_pairs] = 1000.0*line_lengths(pair_geoms[long_pairs])
+
+            intersections_data = gpd.GeoDataFrame(
+                {edge_id_column: line_gpd[edge_id_column].values[line_index], 'length': pair_lengths},
+                geometry=pair_geoms.values, crs='epsg:4326')
+            intersections_data = intersections_data[[edge_id_column, 'length', 'geometry']]
+            write_shapefile_atomic(intersections_data, output_shapefile)
+
+            del intersections_data
 
     del line_gpd, poly_gpd
 
+def sample_raster_values(hazard_raster, xs, ys, window_size=1024):
+    """Sample the first band of a raster at points, reading only the raster windows
+    that contain points
+
+    Parameters
+    ----------
+    hazard_raster
+        GeoTiff file of hazard values
+    xs, ys : numpy.ndarray
+        coordinates of points in the projection system of the raster
+    window_size : int
+        width and height in pixels of the windows read from the raster
+
+    Returns
+    -------
+    values : numpy.ndarray
+        raster values at the points, NaN for points outside the raster or on no data
+    """
+    values = np.full(len(xs), np.nan)
+    with rasterio.open(hazard_raster) as dataset:
+        cols, rows = ~dataset.transform * (np.asarray(xs), np.asarray(ys))
+        cols, rows = np.floor(cols).astype(np.int64), np.floor(rows).astype(np.int64)
+        inside = (cols >= 0) & (cols < dataset.width) & (rows >= 0) & (rows < dataset.height)
+        points = np.flatnonzero(inside)
+        window_ids = (rows[points]//window_size)*(dataset.width//window_size + 1) + cols[points]//window_size
+        point_order = np.argsort(window_ids, kind='mergesort')
+        points, window_ids = points[point_order], window_ids[point_order]
+        window_starts = np.flatnonzero(np.r_[True, window_ids[1:] != window_ids[:-1]])
+        for window_points in np.split(points, window_starts[1:]):
+            if len(window_points) == 0:
+                continue
+            row_off = (rows[window_points[0]]//window_size)*window_size
+            col_off = (cols[window_points[0]]//window_size)*window_size
+            window = Window(col_off, row_off,
+                            min(window_size, dataset.width - col_off),
+                            min(window_size, dataset.height - row_off))
+            window_values = dataset.read(1, window=window).astype(float)
+            if dataset.nodata is not None:
+                window_values[window_values == dataset.nodata] = np.nan
+            values[window_points] = window_values[rows[window_points] - row_off, cols[window_points] - col_off]
+
+    return values
+
+
+def networkedge_hazard_raster_exposure(edge_shapefile, hazard_raster, output_shapefile,
+        edge_id_column, thresholds, thresholds_label, window_size=1024):
+    """Sample hazard rasters along network edges and write the exposed lengths of edges
+    in each hazard threshold range to shapefiles
+
+    An alternative to polygonising the hazard rasters and intersecting them with the
+    edges. The edges are split into pieces no longer than half a raster pixel, and the
+    raster is sampled at the middle of each piece, reading only the raster windows that
+    contain edges. All threshold ranges are estimated in one pass over the raster.
+
+    Parameters
+    ----------
+    edge_shapefile
+        Shapefile of network LineStrings
+    hazard_raster
+        GeoTiff file of hazard values
+    output_shapefile
+        String name of edge-hazard shapefile for storing results, to which the threshold
+        range is added as in the shapefiles of polygonised hazards: _{min}-{max}_threshold.shp
+    edge_id_column
+        String name of edge ID column
+    thresholds : list[float]
+        raster values of the bounds of the threshold ranges
+    thresholds_label : list[str]
+        names of the threshold bounds used in the output shapefile names
+    window_size : int
+        width and height in pixels of the windows read from the raster
+
+    Outputs
+    -------
+    output_shapefile for each threshold range with exposed edges
+        - edge_id - String name of exposed edge ID
+        - length - Float length in meters of edge exposed to the threshold range
+        - geometry - Shapely MultiLineString geometry of the exposed pieces of the edge
+    """
+    print ('* Starting {} and {} raster exposures'.format(edge_shapefile,hazard_raster))
+    line_gpd = read_geo_file(edge_shapefile)
+    line_gpd.columns = map(str.lower, line_gpd.columns)
+    line_gpd = line_gpd[line_gpd.geometry.notna() & (line_gpd.geometry.is_empty == False)].reset_index(drop=True)
+    if len(line_gpd.index) == 0:
+        return
+
+    with rasterio.open(hazard_raster) as dataset:
+        raster_crs = dataset.crs if dataset.crs else 'epsg:4326'
+        spacing = 0.5*min(abs(dataset.res[0]), abs(dataset.res[1]))
+    raster_lines = line_gpd.geometry
+    if line_gpd.crs is not None:
+        raster_lines = raster_lines.to_crs(raster_crs)
+
+    # Split the segments of the edges into pieces no longer than the spacing
+    coords, edge_rows = shapely.get_coordinates(raster_lines.values, return_index=True)
+    same_edge = edge_rows[1:] == edge_rows[:-1]
+    seg_starts, seg_ends, seg_edges = coords[:-1][same_edge], coords[1:][same_edge], edge_rows[1:][same_edge]
+    seg_lengths = np.hypot(*(seg_ends - seg_starts).T)
+    num_pieces = np.maximum(np.ceil(seg_lengths/spacing), 1).astype(np.int64)
+    piece_segs = np.repeat(np.arange(len(seg_lengths)), num_pieces)
+    piece_steps = np.arange(len(piece_segs)) - np.repeat(np.cumsum(num_pieces) - num_pieces, num_pieces)
+    seg_steps = (seg_ends - seg_starts)/num_pieces[:, None]
+    piece_starts = seg_starts[piece_segs] + piece_steps[:, None]*seg_steps[piece_segs]
+    piece_ends = piece_starts + seg_steps[piece_segs]
+    piece_edges = seg_edges[piece_segs]
+
+    # Scale the piece lengths so they add up to the geodesic lengths of the edges
+    edge_planar_lengths = np.bincount(seg_edges, weights=seg_lengths, minlength=len(line_gpd.index))
+    edge_lengths = 1000.0*line_lengths(line_gpd.geometry)
+    edge_scales = np.divide(edge_lengths, edge_planar_lengths,
+                            out=np.zeros(len(edge_lengths)), where=edge_planar_lengths > 0)
+    piece_lengths = (seg_lengths/num_pieces)[piece_segs]*edge_scales[piece_edges]
+
+    piece_mids = 0.5*(piece_starts + piece_ends)
+    piece_values = sample_raster_values(hazard_raster, piece_mids[:, 0], piece_mids[:, 1], window_size=window_size)
+    piece_bands = np.searchsorted(thresholds, piece_values, side='right') - 1
+    exposed = (piece_values >= thresholds[0]) & (piece_values < thresholds[-1])
+
+    for t in range(len(thresholds)-1):
+        band_pieces = np.flatnonzero(exposed & (piece_bands == t))
+        if len(band_pieces) == 0:
+            continue
+        band_edges, piece_groups = np.unique(piece_edges[band_pieces], return_inverse=True)
+        band_lines = shapely.multilinestrings(
+            shapely.linestrings(np.stack((piece_starts[band_pieces], piece_ends[band_pieces]), axis=1)),
+            indices=piece_groups)
+        exposures = gpd.GeoDataFrame(
+            {edge_id_column: line_gpd[edge_id_column].values[band_edges],
+             'length': np.bincount(piece_groups, weights=piece_lengths[band_pieces])},
+            geometry=shapely.line_merge(band_lines), crs=raster_crs)
+        exposures = exposures.to_crs('epsg:4326')
+        write_shapefile_atomic(exposures, output_shapefile.replace(
+            '.shp', '_{0}-{1}_threshold.shp'.format(thresholds_label[t], thresholds_label[t+1])))
+
+        del exposures
+
+    del line_gpd
+
 
 def networknode_hazard_intersection(node_shapefile, hazard_shapefile, output_shapefile,node_id_column):
     """Intersect network nodes and hazards and write results to shapefiles
 
+    All nodes are tested against the hazard Polygons in one spatial index query with the
+    exact intersects predicate, so nodes in gaps between Polygon bounding boxes are not
+    counted as exposed
+
     Parameters
     ----------
     node_shapefile
@@ -133,35 +282,142 @@ def networknode_hazard_intersection(node_shapefile, hazard_shapefile, output_sha
     -------
     output_shapefile
         - node_id - String name of intersecting node ID
+        - hazard Polygon attributes - Attributes of the first hazard Polygon containing the node
+        - min_depth - String name of lower bound of hazard threshold range, from the hazard file name
+        - max_depth - String name of upper bound of hazard threshold range, from the hazard file name
         - geometry - Shapely Point geometry of intersecting node ID
     """
     print ('* Starting {} and {} intersections'.format(node_shapefile,hazard_shapefile))
-    point_gpd = gpd.read_file(node_shapefile)
-    point_gpd.to_crs({'init': 'epsg:4326'})
+    point_gpd = read_geo_file(node_shapefile)
+    point_gpd.to_crs('epsg:4326')
     point_gpd.rename(columns={'id':node_id_column},inplace=True)
     poly_gpd = gpd.read_file(hazard_shapefile)
-    poly_gpd.to_crs({'init': 'epsg:4326'})
+    poly_gpd.to_crs('epsg:4326')
 
     if len(point_gpd.index) > 0 and len(poly_gpd.index) > 0:
         point_gpd.columns = map(str.lower, point_gpd.columns)
         poly_gpd.columns = map(str.lower, poly_gpd.columns)
-        data = []
-        # create spatial index
-        poly_sindex = poly_gpd.sindex
-        for pt_index, points in point_gpd.iterrows():
-            intersected_polys = poly_gpd.iloc[list(
-                poly_sindex.intersection(points.geometry.bounds))]
-            if len(intersected_polys.index) > 0:
-                data.append({node_id_column: points[node_id_column], 'geometry': points['geometry']})
-        if data:
-            intersections_data = gpd.GeoDataFrame(
-                data, columns=[node_id_column, 'geometry'], crs='epsg:4326')
-            intersections_data.to_file(output_shapefile)
+
+        poly_gpd = poly_gpd[poly_gpd.geometry.is_valid]
+        point_index, poly_index = poly_gpd.sindex.query(point_gpd.geometry, predicate='intersects')
+        if len(point_index) > 0:
+            # Keep one record for each node, with the first hazard Polygon containing it
+            pair_order = np.lexsort((poly_index, point_index))
+            point_index, poly_index = point_index[pair_order], poly_index[pair_order]
+            first_pairs = np.r_[True, point_index[1:] != point_index[:-1]]
+            point_index, poly_index = point_index[first_pairs], poly_index[first_pairs]
+
+            intersections_data = pd.DataFrame({node_id_column: point_gpd[node_id_column].values[point_index]})
+            for col in poly_gpd.columns:
+                if col not in [node_id_column, 'geometry']:
+                    intersections_data[col] = poly_gpd[col].values[poly_index]
+            depth_band = re.findall(r'_([^_]+)-([^_]+)_threshold', os.path.basename(hazard_shapefile))
+            if depth_band:
+                intersections_data['min_depth'], intersections_data['max_depth'] = depth_band[-1]
+            intersections_data = gpd.GeoDataFrame(intersections_data,
+                geometry=point_gpd.geometry.values[point_index], crs='epsg:4326')
+            write_shapefile_atomic(intersections_data, output_shapefile)
 
             del intersections_data
 
     del point_gpd, poly_gpd
 
+def network_hazard_jobs(hazard_dir,network_file_path,network_file_name,output_file_path,network_id_column,
+        network_type='',thresholds=None,thresholds_label=None):
+    """Walk through all hazard files and list the network-hazard intersection jobs
+
+    Parameters
+    ----------
+    hazard_dir : str
+        name of directory where all hazard files are stored
+    network_file_path : str
+        name of directory where network shapefile is stored
+    network_file_name : str
+        name network shapefile
+    output_file_path : str
+        name of directory where network-hazard instersection result shapefiles will be stored
+    network_id_column : str
+        name of edge ID or node ID column
+    network_type : str
+        values of 'edges' or 'nodes' to intersect hazard shapefiles, or 'edge_rasters'
+        to sample hazard GeoTiff files along edges
+    thresholds : list[float]
+        raster values of the bounds of the threshold ranges: Only for edge_rasters
+    thresholds_label : list[str]
+        names of the threshold bounds used in the output shapefile names: Only for edge_rasters
+
+    Returns
+    -------
+    jobs : list[tuple]
+        network type, network file, hazard file, output file, network ID column, thresholds
+        and thresholds names of each job
+    """
+    jobs = []
+    for root, dirs, files in os.walk(hazard_dir):
+        for file in files:
+            if network_type == 'edge_rasters' and (file.endswith(".tif") or file.endswith(".tiff")):
+                out_shp_name = network_file_name[:-4] + '_' + file.split(".tif")[0] + '.shp'
+            elif network_type in ['edges','nodes'] and file.endswith(".shp"):
+                out_shp_name = network_file_name[:-4] + '_' + file
+            else:
+                continue
+            jobs.append((network_type, network_file_path, os.path.join(root, file),
+                         os.path.join(output_file_path,out_shp_name), network_id_column,
+                         thresholds, thresholds_label))
+
+    return jobs
+
+
+def run_network_hazard_job(job):
+    """Run one network-hazard intersection job, unless an earlier run has completed it
+
+    A job is completed when its .done file exists, which is written after all its
+    output shapefiles. A job that was interrupted is run again and overwrites its outputs.
+    """
+    network_type, network_file_path, hazard_file, output_file, network_id_column, thresholds, thresholds_label = job
+    done_file = output_file[:-4] + '.done'
+    if os.path.exists(done_file):
+        return job
+
+    if network_type == 'edges':
+        networkedge_hazard_intersection(network_file_path, hazard_file, output_file,network_id_column)
+    elif network_type == 'nodes':
+        networknode_hazard_intersection(network_file_path, hazard_file, output_file,network_id_column)
+    elif network_type == 'edge_rasters':
+        networkedge_hazard_raster_exposure(network_file_path, hazard_file, output_file,
+                                           network_id_column, thresholds, thresholds_label)
+
+    open(done_file, 'w').close()
+    return job
+
+
+def run_network_hazard_jobs(jobs, num_processes=None, chunk_size=4):
+    """Run network-hazard intersection jobs on a pool of processes
+
+    Jobs completed in earlier runs are skipped. The jobs are sorted by network file,
+    so the chunks sent to a worker mostly share a network, which each worker reads once.
+
+    Parameters
+    ----------
+    jobs : list[tuple]
+        jobs listed by network_hazard_jobs
+    num_processes : int
+        number of worker processes: Default = number of CPUs. 1 runs the jobs in this process
+    chunk_size : int
+        number of jobs sent to a worker at a time
+    """
+    jobs = sorted([job for job in jobs if os.path.exists(job[3][:-4] + '.done') == False],
+                  key=lambda job: (job[1], job[2]))
+    print ('* Running {} network-hazard intersection jobs'.format(len(jobs)))
+    if num_processes == 1 or len(jobs) <= 1:
+        for job in jobs:
+            run_network_hazard_job(job)
+    else:
+        with multiprocessing.Pool(processes=num_processes) as pool:
+            for job in pool.imap_unordered(run_network_hazard_job, jobs, chunksize=chunk_size):
+                print ('Done with {} and {}'.format(job[1], job[2]))
+
+
 def intersect_networks_and_all_hazards(hazard_dir,network_file_path,network_file_name,output_file_path,network_id_column,network_type = ''):
     """Walk through all hazard files and select network-hazard intersection criteria
 
@@ -184,16 +440,42 @@ def intersect_networks_and_all_hazards(hazard_dir,network_file_path,network_file
     Edge or Node shapefiles
 
     """
-    for root, dirs, files in os.walk(hazard_dir):
-        for file in files:
-            if file.endswith(".shp"):
-                hazard_file = os.path.join(root, file)
-                out_shp_name = network_file_name[:-4] + '_' + file
-                output_file = os.path.join(output_file_path,out_shp_name)
-                if network_type == 'edges':
-                    networkedge_hazard_intersection(network_file_path, hazard_file, output_file,network_id_column)
-                elif network_type == 'nodes':
-                    networknode_hazard_intersection(network_file_path, hazard_file, output_file,network_id_column)
+    run_network_hazard_jobs(network_hazard_jobs(hazard_dir,network_file_path,network_file_name,
+                                                output_file_path,network_id_column,network_type=network_type),
+                            num_processes=1)
+
+
+def intersect_networks_and_all_hazard_rasters(hazard_dir,network_file_path,network_file_name,output_file_path,
+        network_id_column,thresholds,thresholds_label):
+    """Walk through all hazard GeoTiff files and sample them along network edges
+
+    Parameters
+    ----------
+    hazard_dir : str
+        name of directory where all hazard GeoTiff files are stored
+    network_file_path : str
+        name of directory where network edges shapefile is stored
+    network_file_name : str
+        name network edges shapefile
+    output_file_path : str
+        name of directory where network-hazard exposure result shapefiles will be stored
+    network_id_column : str
+        name of edge ID column
+    thresholds : list[float]
+        raster values of the bounds of the threshold ranges
+    thresholds_label : list[str]
+        names of the threshold bounds used in the output shapefile names
+
+
+    Outputs
+    -------
+    Edge shapefiles for each hazard file and threshold range
+
+    """
+    run_network_hazard_jobs(network_hazard_jobs(hazard_dir,network_file_path,network_file_name,
+                                                output_file_path,network_id_column,network_type='edge_rasters',
+                                                thresholds=thresholds,thresholds_label=thresholds_label),
+                            num_processes=1)
 
 
 def main():
@@ -208,6 +490,10 @@ def main():
         - Names of modes - List of strings
         - Names of mode id columns - List of strings
         - Condition 'Yes' or 'No' is the users wants to process results
+        - Condition 'Yes' or 'No' is the users wants to sample the hazard rasters along
+          the edges, instead of intersecting the edges with the polygonised hazards
+        - Thresholds of flood hazards and their names, as used in polygonising the hazards
+        - Number of processes to run the mode, hazard and climate scenario jobs on
 
     3. Give the paths to the input data files:
         - Hazard directory
@@ -221,7 +507,12 @@ def main():
     modes_id_cols = ['edge_id','edge_id','bridge_id','node_id','node_id']
     climate_scenarios = ['Baseline','Future_Med','Future_High']
     national_results = 'Yes'
+    raster_exposures = 'No'
+    thresholds = [1,2,3,4,999]
+    thresholds_label = ['50cm','1m','2m','3m','4m','999m']
+    num_processes = None
 
+    jobs = []
     for sc in climate_scenarios:
 	    # Give the paths to the input data files
 	    hazard_dir = os.path.join(data_path,'flood_data','FATHOM',sc)
@@ -245,8 +536,11 @@ def main():
 	                if os.path.exists(output_dir) == False:
 	                    os.mkdir(output_dir)
 
-	                print ('* Starting national {} and all hazards intersections'.format(modes[m]))
-	                intersect_networks_and_all_hazards(hazard_dir,edges_in,edges_name,output_dir,modes_id_cols[m],network_type = 'edges')
+	                if raster_exposures == 'Yes':
+	                    jobs += network_hazard_jobs(hazard_dir,edges_in,edges_name,output_dir,modes_id_cols[m],
+	                                                network_type='edge_rasters',thresholds=thresholds,thresholds_label=thresholds_label)
+	                else:
+	                    jobs += network_hazard_jobs(hazard_dir,edges_in,edges_name,output_dir,modes_id_cols[m],network_type = 'edges')
 
 	            elif modes[m] in ['air', 'port']:
 	                nodes_in = os.path.join(data_path,'network','{}_nodes.shp'.format(modes[m]))
@@ -260,8 +554,10 @@ def main():
 	                if os.path.exists(output_dir) == False:
 	                    os.mkdir(output_dir)
 
-	                print ('* Starting national {} and all hazards intersections'.format(modes[m]))
-	                intersect_networks_and_all_hazards(hazard_dir,nodes_in,nodes_name,output_dir,modes_id_cols[m],network_type = 'nodes')
+	                jobs += network_hazard_jobs(hazard_dir,nodes_in,nodes_name,output_dir,modes_id_cols[m],network_type = 'nodes')
+
+    print ('* Starting national networks and all hazards intersections')
+    run_network_hazard_jobs(jobs, num_processes=num_processes)
 
 
 if __name__ == "__main__":
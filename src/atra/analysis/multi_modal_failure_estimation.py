@@ -116,6 +116,8 @@ def main():
         List of float type
     6. Condition on whether analysis is single failure or multiple failure
         Boolean condition True or False
+    7. Number of processes to run the failure scenarios on
+        Integer type, or None to use all cores
 
     Give the paths to the input data files:
 
@@ -144,6 +146,9 @@ def main():
     index_cols = ['origin_id', 'destination_id', 'origin_province', 'destination_province']
     percentage = [100.0]
     single_edge = True
+    num_processes = None
+    # Rerouting mode of run_edge_failure_scenarios: 'dijkstra', 'astar' or 'detour_heuristic'
+    routing = 'dijkstra'
 
     # Give the paths to the input data files
     network_data_path = os.path.join(data_path,'network')
@@ -180,6 +185,10 @@ def main():
     if os.path.exists(minmax_combine) == False:
         os.mkdir(minmax_combine)
 
+    scenario_cache = os.path.join(fail_output_path,'scenario_cache')
+    if os.path.exists(scenario_cache) == False:
+        os.mkdir(scenario_cache)
+
 
     # Create the multi-modal networks
     print ('* Creating multi-modal networks')
@@ -199,6 +208,11 @@ def main():
         G_multi_df.append(G_df)
 
     G_multi_df = pd.concat(G_multi_df, axis=0, sort='False', ignore_index=True)
+    if routing == 'astar':
+        gdf_nodes = pd.concat([read_geo_file(os.path.join(network_data_path,'{}_nodes.shp'.format(mds[m])),encoding='utf-8')[['node_id','geometry']]
+                               for m in range(len(mds)) if mds[m] != 'multi'], axis=0, ignore_index=True)
+    else:
+        gdf_nodes = None
     cols = [c for c in G_multi_df.columns.values.tolist() if c not in ['from_node','to_node']]
     G_multi_df = G_multi_df[['from_node', 'to_node'] + cols]
 
@@ -215,7 +229,10 @@ def main():
         for perct in percentage:
             # Load flow paths
             print ('* Loading {} flow paths'.format(modes[m]['sector']))
-            flow_df = pd.read_csv(os.path.join(flow_paths_data,'flow_paths_{}_{}_percent_assignment.csv'.format(modes[m]['sector'],int(perct))),encoding='utf-8')
+            flow_paths_file = os.path.join(flow_paths_data,'flow_paths_{}_{}_percent_assignment.csv'.format(modes[m]['sector'],int(perct)))
+            flow_df = pd.read_csv(flow_paths_file,encoding='utf-8')
+            path_store_file = os.path.splitext(flow_paths_file)[0] + '.npz'
+            path_store = load_flow_path_store(path_store_file,source_path=flow_paths_file)
 
             if modes[m]['sector'] == 'road':
                 e_flow = pd.read_csv(os.path.join(output_path,'flow_mapping_combined','weighted_flows_{}_{}_percent.csv'.format(modes[m]['sector'],int(perct))))[['edge_id','max_total_tons']]
@@ -234,22 +251,15 @@ def main():
             # Perform failure analysis
             edge_fail_ranges = []
             for t in range(len(types)):
-                edge_path_idx = get_flow_paths_indexes_of_edges(flow_df,path_types[t])
+                edge_path_idx = get_flow_paths_indexes_of_edges(flow_df,path_types[t],path_store=path_store)
                 print ('* Performing {} {} failure analysis'.format(types[t],modes[m]['sector']))
-                ef_list = []
-                for f_edge in range(len(ef_sc_list)):
-                    fail_edge = ef_sc_list[f_edge]
-                    if isinstance(fail_edge,list) == False:
-                        fail_edge = [fail_edge]
-                    
-                    ef_dict = igraph_scenario_edge_failures_new(
-                            G_multi_df, fail_edge, flow_df,edge_path_idx,
-                            path_types[t],modes[m]['{}_tons_column'.format(types[t])], 
-                            cost_types[t], time_types[t],modes[m]['sector'],new_path=True)
-                    if ef_dict:
-                        ef_list += ef_dict
-
-                    print('Done with mode {0} edge {1} out of {2} type {3}'.format(modes[m]['sector'], f_edge, len(ef_sc_list),types[t]))
+                ef_list = run_edge_failure_scenarios(
+                        G_multi_df, ef_sc_list, flow_df,edge_path_idx,
+                        path_types[t],modes[m]['{}_tons_column'.format(types[t])],
+                        cost_types[t], time_types[t],modes[m]['sector'],new_path=True,
+                        num_processes=num_processes,
+                        cache_path=os.path.join(scenario_cache,modes[m]['sector']),
+                        routing=routing,nodes_dataframe=gdf_nodes)
 
                 df = pd.DataFrame(ef_list)
 
@@ -12,12 +12,13 @@ References
 1) Koks, E. E., & Thissen, M. (2016). A multiregional impact assessment model for disaster analysis. Economic Systems Research, 28(4), 429-449.
 
 """
+import itertools
 import os
 
 import numpy as np
 import pandas as pd
 from pyomo.environ import (ConcreteModel, Constraint, Objective, Param, Set,
-                           SetOf, Var, minimize)
+                           SetOf, Suffix, Var, minimize, value)
 from pyomo.opt import SolverFactory
 from ratmarg import ratmarg_IO
 #from oia.utils import load_config
@@ -49,6 +50,8 @@ class MRIA_IO(object):
             - *self*.total_regions - Integer of total amount of regions in the **MRIA_IO** class
             - *self*.sectors - list of sectors in the **MRIA_IO** class
             - *self*.fd_cat - list of final demand categories in the **MRIA_IO** class
+            - *self*.region_index - dictionary of regions and their position in the arrays of the **io_basic** class
+            - *self*.sector_index - dictionary of sectors and their position in the arrays of the **io_basic** class
 
         """
         self.name = name
@@ -57,6 +60,8 @@ class MRIA_IO(object):
         self.total_regions = len(list_regions)
         self.sectors = list_sectors
         self.fd_cat = list_fd_cats
+        self.region_index = {r: i for i, r in enumerate(list_regions)}
+        self.sector_index = {s: i for i, s in enumerate(list_sectors)}
 
 
     def create_sets(self, FD_SET=[], VA_SET=[]):
@@ -107,26 +112,42 @@ class MRIA_IO(object):
     This part focuses on tables, parameters and variables
     """
 
+    def array_values(self, array, *index_lists):
+        """
+        Dictionary of the values of an array, to initialize a Pyomo Parameter or Variable in bulk.
+
+        Parameters
+            - *self* - **MRIA_IO** class object
+            - array - numpy array with one axis for each index list
+            - index_lists - the lists of labels of each axis of the array
+
+        Output
+            - dictionary of tuples of labels and the values of the array
+
+        """
+        return dict(zip(itertools.product(*index_lists), array.ravel().tolist()))
+
     def create_A_mat(self, A_mat_in):
         """
         Creation of the A-matrix for the optimization model.
         
         Parameters
             - *self* - **MRIA_IO** class object
-            - A_mat_in - A-matrix dictionary from the **io_basic** class object
+            - A_mat_in - A-matrix array from the **io_basic** class object
 
         Outputs
+            - *self*.A_matrix - Pyomo Parameter instance for the A-matrix in the **MRIA_IO** class
 
         """
         model = self.m
 
-        def A_matrix_init(model, R, S, Rb, Sb):
-            return A_mat_in[R, S, Rb, Sb]
-
         model.A_matrix = Param(model.R, model.S, model.R, model.Sb,
-                               initialize=A_matrix_init, doc='A matrix')
+                               initialize=self.array_values(A_mat_in, self.regions, self.sectors,
+                                                            self.regions, self.sectors),
+                               doc='A matrix')
 
         self.A_matrix = model.A_matrix
+        self.A_array = A_mat_in
 
 
     def create_FD(self, FinalD, disr_dict_fd):
@@ -135,7 +156,7 @@ class MRIA_IO(object):
         
         Parameters
             - *self* - **MRIA_IO** class object
-            - FinalD - Final Demand dictionary from the **io_basic** class object
+            - FinalD - Final Demand array of the final demand categories of the model, from the **io_basic** class object
             - disr_dict_fd - dictionary containing the disruptions in final demand
     
         Outputs
@@ -150,21 +171,21 @@ class MRIA_IO(object):
 
         model.Rdes = Set(initialize=disrupted_des, doc='Final Demand')
 
-        def tfd_init(model, R, S, Rb):
-            if (R, Rb, S) in list(disr_dict_fd.keys()):
-                return sum(FinalD[R, S, Rb, fdemand] for fdemand in model.fdemand)*disr_dict_fd[R, Rb, S]
-            else:
-                return sum(FinalD[R, S, Rb, fdemand] for fdemand in model.fdemand)
-
-        def fd_init(model, R, S):
-            return sum(model.tfd[R, S, Rb] for Rb in model.Rb)
+        tfd = np.array(FinalD, dtype=float)
+        for (R, Rb, S), disr in disr_dict_fd.items():
+            tfd[self.region_index[R], self.sector_index[S], self.region_index[Rb]] *= disr
 
-        model.tfd = Param(model.R, model.S, model.Rb, initialize=tfd_init, doc='Final Demand')
+        model.tfd = Param(model.R, model.S, model.Rb,
+                          initialize=self.array_values(tfd, self.regions, self.sectors, self.regions),
+                          doc='Final Demand')
 
-        model.fd = Param(model.R, model.S, initialize=fd_init, doc='Final Demand')
+        model.fd = Param(model.R, model.S,
+                         initialize=self.array_values(tfd.sum(axis=2), self.regions, self.sectors),
+                         doc='Final Demand')
 
         self.ttfd = model.tfd
         self.fd = model.fd
+        self.fd_array = tfd.sum(axis=2)
 
 
     def create_LFD(self, FinalD):
@@ -173,7 +194,7 @@ class MRIA_IO(object):
 
         Parameters
             - *self* - **MRIA_IO** class object
-            - FinalD - Final Demand dictionary from the **io_basic** class object
+            - FinalD - Final Demand array of the final demand categories of the model, from the **io_basic** class object
     
         Outputs
             - *self*.lfd - Pyomo Parameter instance for the local final demand in the **MRIA_IO** class
@@ -181,11 +202,14 @@ class MRIA_IO(object):
         """
         model = self.m
 
-        def lfd_init(model, R, S):
-            return sum(FinalD[R, S, R, fdemand] for fdemand in model.fdemand)
-        model.lfd = Param(model.R, model.S, initialize=lfd_init, doc='Final Demand')
+        regions = np.arange(self.total_regions)
+        lfd = FinalD[regions, :, regions]
+        model.lfd = Param(model.R, model.S,
+                          initialize=self.array_values(lfd, self.regions, self.sectors),
+                          doc='Final Demand')
 
         self.lfd = model.lfd
+        self.lfd_array = lfd
 
 
     def create_ExpImp(self, ExpROW, ImpROW):
@@ -194,8 +218,8 @@ class MRIA_IO(object):
         
         Parameters
             - *self* - **MRIA_IO** class object
-            - ExpROW - Exports to the Rest of the World dictionary from the **io_basic** class object
-            - ImpROW - Imports from the Rest of the World dictionary from the **io_basic** class object
+            - ExpROW - Exports to the Rest of the World array from the **io_basic** class object
+            - ImpROW - Imports from the Rest of the World array from the **io_basic** class object
     
         Outputs
             - *self*.ExpROW - Pyomo Parameter instance for the Exports to the Rest of the World in the **MRIA_IO** class
@@ -204,19 +228,18 @@ class MRIA_IO(object):
         model = self.m
 
         # Specify Export ROW
-        def ExpROW_ini(m, R, S):
-            return (ExpROW[R, S, 'Export'])
-        model.ExpROW = Param(model.R, model.S, initialize=ExpROW_ini,
+        model.ExpROW = Param(model.R, model.S,
+                             initialize=self.array_values(ExpROW, self.regions, self.sectors),
                              doc='Exports to the rest of the world')
 
         # Specify Import ROW
-        def ImpROW_init(m, R, S):
-            return (ImpROW[R, S, 'Import'])
-        model.ImpROW = Param(model.R, model.S, initialize=ImpROW_init,
+        model.ImpROW = Param(model.R, model.S,
+                             initialize=self.array_values(ImpROW, self.regions, self.sectors),
                              doc='Imports from the rest of the world')
 
         self.ExpROW = model.ExpROW
         self.ImpROW = model.ImpROW
+        self.ExpROW_array = ExpROW
 
     """  """
 
@@ -242,7 +265,7 @@ class MRIA_IO(object):
                 return 1.025
 
         model.X_up = Param(model.R, model.S, initialize=shock_init,
-                           doc='Maximum production capacity')
+                           doc='Maximum production capacity', mutable=True)
         self.X_up = model.X_up
 
     def create_Xbase(self, Z_matrix, disr_dict, FinalD=None):
@@ -251,29 +274,26 @@ class MRIA_IO(object):
         
         Parameters
             - *self* - **MRIA_IO** class object
-            - Z_matrix - Z-matrix dictionary from the **io_basic** class object
-            - disr_dict - dictionary containing the reduction in production capacity
-            - FinalD - Final Demand dictionary from the **io_basic** class object
+            - Z_matrix - Z-matrix array from the **io_basic** class object
+            - disr_dict - dictionary containing the disruptions in final demand
+            - FinalD - Final Demand array of the final demand categories of the model, from the **io_basic** class object
     
         Outputs
-            - *self*.X_up - Pyomo Parameter instance for the Baseline value of total production **X** in the **MRIA_IO** class
+            - *self*.Xbase - Pyomo Parameter instance for the Baseline value of total production **X** in the **MRIA_IO** class
 
         """
         model = self.m
 
-        if self.fd.active is not True:
+        if model.component('fd') is None:
             self.create_FD(FinalD, disr_dict)
 
-        if self.ExpROW.active is not True:
-            self.create_ExpImp(Z_matrix)
-
-        def x_init_base(model, R, S):
-            return(sum(Z_matrix[R, S, Rb, Sb] for Rb in model.Rb for Sb in
-                       model.Sb) + self.fd[R, S] + self.ExpROW[R, S])
+        Xbase = Z_matrix.sum(axis=(2, 3)) + self.fd_array + self.ExpROW_array
 
-        model.Xbase = Param(model.R, model.S, initialize=x_init_base,
+        model.Xbase = Param(model.R, model.S,
+                            initialize=self.array_values(Xbase, self.regions, self.sectors),
                             doc='Total Production baseline')
         self.Xbase = model.Xbase
+        self.Xbase_array = Xbase
 
     """create X"""
 
@@ -286,49 +306,68 @@ class MRIA_IO(object):
             - *self* - **MRIA_IO** class object
             - disr_dict - dictionary containing the reduction in production capacity
             - Regmaxcap - maximum regional capacity. The default value is set to **0.98**
-            - A_matrix_ini -  A-matrix dictionary from the **io_basic** class object
-            - Z_matrix - Z-matrix dictionary from the **io_basic** class object
-            - FinalD - Final Demand dictionary from the **io_basic** class object
+            - A_matrix_ini -  A-matrix array from the **io_basic** class object
+            - Z_matrix - Z-matrix array from the **io_basic** class object
+            - FinalD - Final Demand array of the final demand categories of the model, from the **io_basic** class object
             - Xbase - Total Production **X** parameter from the **MRIA** class object
             - fd - Final Demand parameter from the **MRIA** class object
             - ExpROW - Export to the Rest of the World parameter from the **MRIA** class object
 
         Outputs
-            - *self*.X_up - Pyomo Variable instance of total production **X** in the **MRIA_IO** class
+            - *self*.X - Pyomo Variable instance of total production **X** in the **MRIA_IO** class
 
         """
 
         model = self.m
 
-        if self.Xbase.active is not True:
-            self.create_Xbase(Z_matrix, FinalD)
+        if model.component('Xbase') is None:
+            self.create_Xbase(Z_matrix, {}, FinalD)
 
-        if self.A_matrix.active is not True:
+        if model.component('A_matrix') is None:
             self.create_A_mat(A_matrix_ini)
 
         def X_bounds(model, R, S):
-            if (R, S) in list(disr_dict.keys()):
-                return (0.0, (self.Xbase[R, S])*disr_dict[R, S]) #1/Regmaxcap*
-            else:
-                return (0.0, (1/Regmaxcap*self.Xbase[R, S])*1.025)
+            return (0.0, self.X_upper_bound(R, S, disr_dict, Regmaxcap))
 
-        def x_init(model, R, S):
-            return(sum(self.A_matrix[R, S, Rb, Sb]*self.Xbase[Rb, Sb] for Rb in model.Rb
-                       for Sb in model.Sb) + self.fd[R, S] + self.ExpROW[R, S])
+        n = self.total_regions*len(self.sectors)
+        X_init = self.A_array.reshape(n, n).dot(self.Xbase_array.ravel()).reshape(
+            self.Xbase_array.shape) + self.fd_array + self.ExpROW_array
 
         model.X = Var(model.R, model.S, bounds=X_bounds,
-                      initialize=x_init, doc='Total Production')
+                      initialize=self.array_values(X_init, self.regions, self.sectors),
+                      doc='Total Production')
 
         self.X = model.X
+        self.X_init_array = X_init
 
 
+    def X_upper_bound(self, R, S, disr_dict, Regmaxcap=0.98):
+        """
+        Upper bound of total production **X** for a region and sector.
+
+        Parameters
+            - *self* - **MRIA_IO** class object
+            - R - region name
+            - S - sector name
+            - disr_dict - dictionary containing the reduction in production capacity
+            - Regmaxcap - maximum regional capacity. The default value is set to **0.98**
+
+        Outputs
+            - float value of the upper bound of **X** for the region and sector
+
+        """
+        if (R, S) in disr_dict:
+            return (self.Xbase[R, S])*disr_dict[R, S] #1/Regmaxcap*
+        else:
+            return (1/Regmaxcap*self.Xbase[R, S])*1.025
+
     def create_VA(self, ValueA):
         """
         Specify Value Added.
         
         Parameters
             - *self* - **MRIA_IO** class object
-            - ValueA - Value Added dictionary from the **io_basic** class object
+            - ValueA - Value Added array from the **io_basic** class object
     
         Outputs
             - *self*.ValueA - Pyomo Parameter instance for the total Value Added in the **MRIA_IO** class
@@ -336,16 +375,15 @@ class MRIA_IO(object):
         """
         model = self.m
 
-        def va_init(model, R, S):
-            return ValueA[R, S, 'VA']
-
-        model.ValueA = Param(model.R, model.S, initialize=va_init, doc='Value Added')
+        model.ValueA = Param(model.R, model.S,
+                             initialize=self.array_values(ValueA, self.regions, self.sectors),
+                             doc='Value Added')
 
         self.ValueA = model.ValueA
 
     def create_Z_mat(self):
         """
-        Specify Trade between regions.
+        Specify Trade between regions, from the A-matrix and the initial values of total production **X**.
         
         Parameters
             - *self* - **MRIA_IO** class object
@@ -356,12 +394,14 @@ class MRIA_IO(object):
         """
         model = self.m
 
-        def Z_matrix_init(model, R, S, Rb, Sb):
-            return self.A_matrix[R, S, Rb, Sb]*self.X[Rb, Sb]
+        Z_matrix = self.A_array*self.X_init_array[np.newaxis, np.newaxis, :, :]
 
         model.Z_matrix = Param(model.R, model.S, model.R, model.Sb,
-                               initialize=Z_matrix_init, doc='Z matrix')
+                               initialize=self.array_values(Z_matrix, self.regions, self.sectors,
+                                                            self.regions, self.sectors),
+                               doc='Z matrix')
         self.Z_matrix = model.Z_matrix
+        self.Z_array = Z_matrix
 
     def create_Trade(self, FinalD, Z_matrix=None):
         """
@@ -369,8 +409,8 @@ class MRIA_IO(object):
         
         Parameters
             - *self* - **MRIA_IO** class object
-            - FinalD - Final Demand dictionary from the **io_basic** class object
-            - Z_matrix - Z-matrix dictionary from the **io_basic** class object
+            - FinalD - Final Demand array of the final demand categories of the model, from the **io_basic** class object
+            - Z_matrix - Z-matrix array from the **io_basic** class object
     
         Outputs
             - *self*.trade - Pyomo Parameter instance for the trade matrix between regions in the **MRIA_IO** class
@@ -378,12 +418,16 @@ class MRIA_IO(object):
         """
         model = self.m
 
-        def Trade_init(model, R, Rb, S):
-            while R != Rb:
-                return sum(self.Z_matrix[Rb, S, R, i] for i in model.Sb) + sum(FinalD[Rb, S, R, i] for i in model.fdemand)
+        # trade[R, Rb, S] is the trade of sector S from region Rb to region R, there is no trade within a region
+        trade = self.Z_array.sum(axis=3).transpose(2, 0, 1) + FinalD.transpose(2, 0, 1)
+        trade[np.arange(self.total_regions), np.arange(self.total_regions), :] = np.nan
+
+        trade_values = {key: (None if np.isnan(value) else value) for key, value in
+                        self.array_values(trade, self.regions, self.regions, self.sectors).items()}
 
-        model.trade = Param(model.R, model.Rb, model.S, initialize=Trade_init, doc='Trade')
+        model.trade = Param(model.R, model.Rb, model.S, initialize=trade_values, doc='Trade')
         self.trade = model.trade
+        self.trade_array = trade
 
 
     def create_TotExp(self):
@@ -399,10 +443,9 @@ class MRIA_IO(object):
         """
         model = self.m
 
-        def totexp_init(model, R, S):
-            return sum(self.trade[Rb, R, S] for Rb in model.Rb if (R != Rb))
-
-        model.TotExp = Param(model.R, model.S, initialize=totexp_init,
+        model.TotExp = Param(model.R, model.S,
+                             initialize=self.array_values(np.nansum(self.trade_array, axis=0),
+                                                          self.regions, self.sectors),
                              doc='Total exports between regions')
         self.TotExp = model.TotExp
 
@@ -420,10 +463,9 @@ class MRIA_IO(object):
         """
         model = self.m
 
-        def totimp_init(model, R, S):
-            return sum(self.trade[R, Rb, S] for Rb in model.Rb if (R != Rb))
-
-        model.TotImp = Param(model.R, model.S, initialize=totimp_init,
+        model.TotImp = Param(model.R, model.S,
+                             initialize=self.array_values(np.nansum(self.trade_array, axis=1),
+                                                          self.regions, self.sectors),
                              doc='Total imports between regions')
         self.TotImp = model.TotImp
 
@@ -441,24 +483,28 @@ class MRIA_IO(object):
         """
         model = self.m
 
-        def impsh_init(model, R, Rb, S):
-            # & ((sum(self.A_matrix[R, S, Rb, Sb]*self.X[Rb, Sb] for Sb in model.Sb) + self.fd[Rb, S]) != None):
-            while (self.trade[Rb, R, S] != None):
-                try:
-                    return self.trade[Rb, R, S]/(sum(self.A_matrix[R, S, Rb, Sb]*self.X[Rb, Sb] for Sb in model.Sb) + self.fd[Rb, S])
-                except ZeroDivisionError:
-                    return 0
+        # demand of region Rb for sector S of region R, with the initial values of total production X
+        ImportShareDisImp = self.Z_array.sum(axis=3).transpose(0, 2, 1) + self.fd_array[np.newaxis, :, :]
+
+        trade = self.trade_array.transpose(1, 0, 2)
+        ImportShare = np.zeros_like(trade)
+        np.divide(trade, ImportShareDisImp, out=ImportShare, where=(ImportShareDisImp != 0))
+        ImportShare[np.isnan(trade)] = np.nan
 
-        def impshdis_init(model, R, Rb, S):
-            return (sum(self.A_matrix[R, S, Rb, Sb]*self.X[Rb, Sb] for Sb in model.Sb) + self.fd[Rb, S])
+        import_shares = {key: (None if np.isnan(value) else value) for key, value in
+                         self.array_values(ImportShare, self.regions, self.regions, self.sectors).items()}
 
         model.ImportShare = Param(model.R, model.Rb, model.S,
-                                  initialize=impsh_init, doc='Importshare of each region')
+                                  initialize=import_shares, doc='Importshare of each region')
         model.ImportShareDisImp = Param(
-            model.R, model.Rb, model.S, initialize=impshdis_init, doc='Importshare DisImp of each region')
+            model.R, model.Rb, model.S,
+            initialize=self.array_values(ImportShareDisImp, self.regions, self.regions, self.sectors),
+            doc='Importshare DisImp of each region')
 
         self.ImportShare = model.ImportShare
         self.ImportShareDisImp = model.ImportShareDisImp
+        self.ImportShare_array = np.nan_to_num(ImportShare)
+        self.ImportShareDisImp_array = ImportShareDisImp
 
 
     def create_Rdem(self):
@@ -482,8 +528,8 @@ class MRIA_IO(object):
         
         Parameters
             - *self* - **MRIA_IO** class object
-            - FinalD - Final Demand dictionary from the **io_basic** class object
-            - Z_matrix - Z-matrix dictionary from the **io_basic** class object
+            - FinalD - Final Demand array of the final demand categories of the model, from the **io_basic** class object
+            - Z_matrix - Z-matrix array from the **io_basic** class object
     
         Outputs
             - *self*.Rat - Pyomo Variable instance for rationing in the **MRIA_IO** class
@@ -552,22 +598,38 @@ class MRIA_IO(object):
 
         disrupted_ctry = list(np.unique([x[0] for x in disr_dict]))
 
-        # problem regions
-        dimp_ctry = ['KEN', 'UGA']
-        dimp_ind = ['i3']
-
         def Dis_bounds(model, R, S):
-            if R in dimp_ctry and S in dimp_ind:
-                return (0, 0)
-            elif (model.X_up[R, S] < (1.025) or R in disrupted_ctry):
-                return (0, None)
-            else:
-                return (0, None)
+            return self.DisImp_bounds(R, S, disrupted_ctry)
 
         model.DisImp = Var(model.R, model.S, bounds=Dis_bounds,
                            initialize=0, doc='Disaster Imports')
         self.DisImp = model.DisImp
 
+    def DisImp_bounds(self, R, S, disrupted_ctry):
+        """
+        Bounds of disaster imports **DisImp** for a region and sector.
+
+        Parameters
+            - *self* - **MRIA_IO** class object
+            - R - region name
+            - S - sector name
+            - disrupted_ctry - list of regions with a reduction in production capacity
+
+        Outputs
+            - tuple of the lower and upper bound of **DisImp** for the region and sector
+
+        """
+        # problem regions
+        dimp_ctry = ['KEN', 'UGA']
+        dimp_ind = ['i3']
+
+        if R in dimp_ctry and S in dimp_ind:
+            return (0, 0)
+        elif (value(self.X_up[R, S]) < (1.025) or R in disrupted_ctry):
+            return (0, None)
+        else:
+            return (0, None)
+
 
     def create_demand(self):
         """
@@ -582,18 +644,15 @@ class MRIA_IO(object):
         """
         model = self.m
 
-        def demand_init(model, R, S):
-            return (
-                sum(self.A_matrix[R, S, R, Sb]*self.X[R, Sb]
-                    for Sb in model.Sb) + self.lfd[R, S] + self.Rdem[R, S] - self.Rat[R, S]
-                + sum(self.ImportShare[R, Rb, S]*(sum(self.A_matrix[R, S, Rb, Sb]*self.X[Rb, Sb]
-                                                      for Sb in model.Sb) + self.fd[Rb, S] + self.Rdem[Rb, S] - self.Rat[R, S]) for Rb in model.Rb if (R != Rb))
-                + sum(self.ImportShare[R, Rb, S]*(self.DisImp[Rb, S])
-                      for Rb in model.Rb if (R != Rb))
-                + self.ExpROW[R, S]
-            )
+        # initial demand with the initial values of total production X, and no rationing or disaster imports
+        regions = np.arange(self.total_regions)
+        Z_sum = self.Z_array.sum(axis=3)
+        demand = (Z_sum[regions, :, regions] + self.lfd_array
+                  + (self.ImportShare_array*self.ImportShareDisImp_array).sum(axis=1)
+                  + self.ExpROW_array)
 
-        model.Demand = Var(model.R, model.S, bounds=(0.0, None), initialize=demand_init)
+        model.Demand = Var(model.R, model.S, bounds=(0.0, None),
+                           initialize=self.array_values(demand, self.regions, self.sectors))
         self.Demand = model.Demand
 
     """ Create baseline dataset to use in model """
@@ -613,16 +672,18 @@ class MRIA_IO(object):
 
         """
 
-        self.create_ExpImp(Table.ExpROW, Table.ImpROW)
+        FinalD = Table.final_demand(self.fd_cat)
 
-        self.create_A_mat(Table.A_matrix)
-        self.create_FD(Table.FinalD, disr_dict_fd)
-        self.create_LFD(Table.FinalD)
-        self.create_Xbase(Table.Z_matrix, Table.FinalD, disr_dict_fd)
-        self.create_X(disr_dict_sup, Z_matrix=Table.Z_matrix, FinalD=Table.FinalD)
-        self.create_VA(Table.ValueA)
+        self.create_ExpImp(Table.ExpROW_array, Table.ImpROW_array)
+
+        self.create_A_mat(Table.A_array)
+        self.create_FD(FinalD, disr_dict_fd)
+        self.create_LFD(FinalD)
+        self.create_Xbase(Table.Z_array, disr_dict_fd, FinalD)
+        self.create_X(disr_dict_sup, Z_matrix=Table.Z_array, FinalD=FinalD)
+        self.create_VA(Table.ValueA_array)
         self.create_Z_mat()
-        self.create_Trade(Table.FinalD)
+        self.create_Trade(FinalD)
         self.create_TotExp()
         self.create_TotImp()
         self.create_ImpShares()
@@ -644,7 +705,7 @@ class MRIA_IO(object):
 
         self.create_X_up(disr_dict_sup)
         self.create_Rdem()
-        self.create_Rat(Table.FinalD, Table.Z_matrix)
+        self.create_Rat(Table.final_demand(self.fd_cat), Table.Z_array)
         self.create_Ratmarg(Table)
         self.create_DisImp(disr_dict_sup)
         self.create_demand()
@@ -698,32 +759,29 @@ class MRIA_IO(object):
         results.write()
         
 
-    def run_impactmodel(self, solver=None, output=None, tol=1e-6, DisWeight=1.75, RatWeight=2):
+    def create_impact_constraints(self, DisWeight=1.75, RatWeight=2):
         """
-        Run the **MRIA** model with disruptions. This will return an economy with a new equilibrium, based on the new production and demand values.
-        
+        Create the constraints and objective function of the **MRIA** model with disruptions.
+
+        The penalty weights are mutable parameters, so the constraints only have to be created once per model.
+
         Parameters
             - *self* - **MRIA_IO** class object
-            - solver - Specify the solver to be used with Pyomo. The Default value is set to **None**. If set to **None**, the ipopt solver will be used
-            - output - Specify whether you want the solver to print its progress.The default value is set to **None**
-            - tol - the tolerance value that determines whether the outcome of the model is feasible. The default value is set to **1e-6**
-            - DisWeight - the weight that determines the penalty set to let the model allow for additional imports. A higher penalty value will result in less imports. The default value is set to **1.75**
-            - RatWeight - the weight that determines the penalty set to let the model allow to ration goods. A higher penalty value will result in less rationing. The default value is set to **2**
-    
+            - DisWeight - the weight that determines the penalty set to let the model allow for additional imports. The default value is set to **1.75**
+            - RatWeight - the weight that determines the penalty set to let the model allow to ration goods. The default value is set to **2**
+
         Outputs
-            - returns the output of an optimized **MRIA_IO** class and the **MRIA** model
+            - *self*.DisWeight - Pyomo Parameter instance for the disaster imports penalty in the **MRIA_IO** class
+            - *self*.RatWeight - Pyomo Parameter instance for the rationing penalty in the **MRIA_IO** class
+            - constraints and objective function of the **MRIA** model
 
         """
         model = self.m
 
-        if solver is None:
-            solver = 'ipopt'
-
-        if DisWeight is None:
-            DisWeight = 1.75
-
-        if RatWeight is None:
-            RatWeight = 2
+        model.DisWeight = Param(initialize=DisWeight, doc='Disaster imports weight', mutable=True)
+        model.RatWeight = Param(initialize=RatWeight, doc='Rationing weight', mutable=True)
+        self.DisWeight = model.DisWeight
+        self.RatWeight = model.RatWeight
 
         def demDisRat(model, R, S):
             return (
@@ -756,10 +814,10 @@ class MRIA_IO(object):
         def ObjectiveDis2(model):
             return (
                 sum(self.X[R, S] for S in model.S for R in model.R)
-                + DisWeight*sum((self.Ratmarg[R, S]*self.DisImp[R, S])
-                                for R in model.R for S in model.S)
-                + RatWeight*sum((self.Ratmarg[R, S]*self.Rat[R, S])
-                                for R in model.R for S in model.S)
+                + self.DisWeight*sum((self.Ratmarg[R, S]*self.DisImp[R, S])
+                                     for R in model.R for S in model.S)
+                + self.RatWeight*sum((self.Ratmarg[R, S]*self.Rat[R, S])
+                                     for R in model.R for S in model.S)
                 + sum((sum(self.ImportShare[R, Rb, S]*(sum(self.A_matrix[R, S, Rb, Sb]*self.X[Rb, Sb] for Sb in model.Sb) + self.fd[Rb, S] + self.Rdem[Rb, S] - self.Rat[Rb, S]) for Rb in model.Rb if (R != Rb))
                        + sum(self.ImportShare[R, Rb, S]*(self.DisImp[Rb, S]) for Rb in model.Rb if (R != Rb))) for R in model.R for S in model.S)
             )
@@ -767,6 +825,127 @@ class MRIA_IO(object):
         model.objective = Objective(rule=ObjectiveDis2, sense=minimize,
                                     doc='Define objective function')
 
+    def create_warm_start(self):
+        """
+        Create the suffixes to pass the bound multipliers of a previous ipopt solution to the next solve.
+
+        Parameters
+            - *self* - **MRIA_IO** class object
+
+        Outputs
+            - import and export suffixes for the ipopt bound multipliers and the constraint duals on the Pyomo ConcreteModel
+
+        """
+        model = self.m
+
+        model.ipopt_zL_out = Suffix(direction=Suffix.IMPORT)
+        model.ipopt_zU_out = Suffix(direction=Suffix.IMPORT)
+        model.ipopt_zL_in = Suffix(direction=Suffix.EXPORT)
+        model.ipopt_zU_in = Suffix(direction=Suffix.EXPORT)
+        model.dual = Suffix(direction=Suffix.IMPORT_EXPORT)
+
+    def clear_warm_start(self):
+        """
+        Remove the stored ipopt multipliers, so the next solve does not start from a failed solution.
+
+        Parameters
+            - *self* - **MRIA_IO** class object
+
+        """
+        model = self.m
+
+        if model.component('dual') is not None:
+            model.ipopt_zL_in.clear()
+            model.ipopt_zU_in.clear()
+            model.dual.clear()
+
+    def build_impact_model(self, Table, disr_dict_fd={}, DisWeight=1.75, RatWeight=2):
+        """
+        Build a reusable **MRIA** model with disruptions.
+
+        All sets, parameters, variables and constraints are created once without supply disruptions.
+        Each event afterwards only needs a call to *update_disruption* before *run_impactmodel*,
+        which starts from the solution of the previous solve.
+
+        Parameters
+            - *self* - **MRIA_IO** class object
+            - Table - the **io_basic** class object
+            - disr_dict_fd - dictionary containing the disruptions in final demand. The default is an **empty dictionary**
+            - DisWeight - the weight that determines the penalty set to let the model allow for additional imports. The default value is set to **1.75**
+            - RatWeight - the weight that determines the penalty set to let the model allow to ration goods. The default value is set to **2**
+
+        Outputs
+            - a complete **MRIA_IO** class object and **MRIA** model with mutable production capacities
+
+        """
+        self.create_sets()
+        self.create_alias()
+        self.baseline_data(Table, {}, disr_dict_fd)
+        self.impact_data(Table, {}, disr_dict_fd)
+        self.create_impact_constraints(DisWeight, RatWeight)
+        self.create_warm_start()
+
+    def update_disruption(self, disr_dict_sup, Regmaxcap=0.98):
+        """
+        Set the reduction in production capacity of a prebuilt **MRIA** model.
+
+        Parameters
+            - *self* - **MRIA_IO** class object
+            - disr_dict_sup - dictionary containing the reduction in production capacity
+            - Regmaxcap - maximum regional capacity. The default value is set to **0.98**
+
+        Outputs
+            - updated *self*.X_up parameter values, upper bounds of *self*.X and bounds of *self*.DisImp
+
+        """
+        model = self.m
+
+        disrupted_ctry = list(np.unique([x[0] for x in disr_dict_sup]))
+
+        for R in model.R:
+            for S in model.S:
+                if (R, S) in disr_dict_sup:
+                    self.X_up[R, S] = disr_dict_sup[R, S]
+                else:
+                    self.X_up[R, S] = 1.025
+                self.X[R, S].setub(self.X_upper_bound(R, S, disr_dict_sup, Regmaxcap))
+                DisImp_lb, DisImp_ub = self.DisImp_bounds(R, S, disrupted_ctry)
+                self.DisImp[R, S].setlb(DisImp_lb)
+                self.DisImp[R, S].setub(DisImp_ub)
+
+    def run_impactmodel(self, solver=None, output=None, tol=1e-6, DisWeight=1.75, RatWeight=2):
+        """
+        Run the **MRIA** model with disruptions. This will return an economy with a new equilibrium, based on the new production and demand values.
+        
+        Parameters
+            - *self* - **MRIA_IO** class object
+            - solver - Specify the solver to be used with Pyomo. The Default value is set to **None**. If set to **None**, the ipopt solver will be used
+            - output - Specify whether you want the solver to print its progress.The default value is set to **None**
+            - tol - the tolerance value that determines whether the outcome of the model is feasible. The default value is set to **1e-6**
+            - DisWeight - the weight that determines the penalty set to let the model allow for additional imports. A higher penalty value will result in less imports. The default value is set to **1.75**
+            - RatWeight - the weight that determines the penalty set to let the model allow to ration goods. A higher penalty value will result in less rationing. The default value is set to **2**
+    
+        Outputs
+            - returns the output of an optimized **MRIA_IO** class and the **MRIA** model
+
+        """
+        model = self.m
+
+        if solver is None:
+            solver = 'ipopt'
+
+        if DisWeight is None:
+            DisWeight = 1.75
+
+        if RatWeight is None:
+            RatWeight = 2
+
+        if model.component('objective') is None:
+            self.create_impact_constraints(DisWeight, RatWeight)
+        else:
+            self.DisWeight.set_value(DisWeight)
+            self.RatWeight.set_value(RatWeight)
+
         opt = SolverFactory(solver)
         if solver == 'ipopt':
             opt.options['max_iter'] = 7500
@@ -782,13 +961,16 @@ class MRIA_IO(object):
 
         if output is None:
             results = opt.solve(model, tee=False)
-            return results.solver.status
         else:
             results = opt.solve(model, tee=True)
             # sends results to stdout
             results.write()
-            return results.solver.status
 
+        if model.component('dual') is not None:
+            if results.solver.status.key == 'ok':
+                model.ipopt_zL_in.update(model.ipopt_zL_out)
+                model.ipopt_zU_in.update(model.ipopt_zU_out)
+            else:
+                self.clear_warm_start()
 
-            
-            
\ No newline at end of file
+        return results.solver.status
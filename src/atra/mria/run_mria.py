@@ -4,9 +4,13 @@ Run the MRIA Model for a given set of disruptions.
 """
 
 import os
+import hashlib
+import json
+import multiprocessing
 import numpy as np
 import pandas as pd
 from model import MRIA_IO as MRIA
+from screening import LeontiefScreening, benchmark_screening
 from table import io_basic
 from tqdm import tqdm
 
@@ -14,59 +18,18 @@ def get_rel_disruption(x,df_od):
     x.value = 1 - float(x.value/df_od.loc[(df_od.destination_province == x.destination_province) & (df_od.sector == x.sector)].value)
     return x
 
-def estimate_losses(input_file):
+def load_failure_disruptions(input_file, data_path):
     """
-    Estimate the economic losses for a given set of failure scenarios
+    Estimate the relative disruption of the trade to each destination province for a given set of failure scenarios
 
     Parameters
         - input_file - String name of input file to failure scenarios
+        - data_path - String path to the data directory
 
     Outputs
-        - .csv file with total losses per failure scenario
-        
-    """
-
-    print('{} started!'.format(input_file))
-
-
-    data_path = os.path.join('..','Data')
-    output_path = os.path.join('..','results')
-    
-    """Specify disruption"""
-    output_dir = os.path.join(output_path,
-                              'economic_failure_results',
-                              'od_regions_losses'
-                              )
-
-    """ Specify file path """
-    filepath = os.path.join(data_path, 'economic_IO_tables','output', 'IO_ARGENTINA.xlsx')
-    
-    regions = ['Ciudad de Buenos Aires', 'Buenos Aires', 'Catamarca', 'Cordoba',
-           'Corrientes', 'Chaco', 'Chubut', 'Entre Rios', 'Formosa', 'Jujuy',
-           'La Pampa', 'La Rioja', 'Mendoza', 'Misiones', 'Neuquen', 'Rio Negro',
-           'Salta', 'San Juan', 'San Luis', 'Santa Cruz', 'Santa Fe',
-           'Santiago del Estero', 'Tucuman', 'Tierra del Fuego']
-    
-    regions = [x.replace(' ','_') for x in regions]
-    
-    """Create data input"""
-    DATA = io_basic('Argentina', filepath,regions)
-    DATA.prep_data()
-
-    """Run model and create some output"""
-    output = pd.DataFrame()
-
-    """Specify disruption"""
-    output_dir = os.path.join(
-        output_path,
-        'economic_failure_results',
-        os.path.basename(os.path.splitext(input_file)[0])
-    )
-
-    """Create output folders"""
-    if os.path.exists(output_dir) == False:
-        os.mkdir(output_dir)
+        - pandas DataFrame of relative disruptions with (event, sector) as index and destination provinces as columns
 
+    """
     """prepare mapper functions"""
     reg_mapper = pd.read_excel(os.path.join(data_path,'economic_IO_tables','input','sh_cou_06_16.xls'),
                           sheet_name='reg_mapper',header=None)
@@ -101,104 +64,424 @@ def estimate_losses(input_file):
     df_failures = df_failures.groupby(['edge_id','destination_province','sector']).sum().unstack(1)
     df_failures[df_failures <= 0.8] = 0.8
 
-    """Run model for the first time and create some output"""
-    output = pd.DataFrame()
-    
-    disr_dict_fd = {}
-    disr_dict_sup = {}
-    
-    """Create model"""
+    return df_failures
+
+def event_disruptions(df_failures):
+    """
+    Create the supply disruption dictionaries of the failure events that have to be run in the MRIA model
+
+    Events with less than 5 percent disruption are skipped.
+
+    Parameters
+        - df_failures - pandas DataFrame of relative disruptions, as given by load_failure_disruptions
+
+    Outputs
+        - events - list of (event, disr_dict_sup) tuples of the events to run
+
+    """
+    events = []
+    for event,edge in df_failures.groupby(level=0,axis=0):
+        edge.index = edge.index.droplevel(0)
+        edge.columns = edge.columns.droplevel(0)
+
+        disr = edge.dropna(axis=1)
+
+        if (1-disr.min().min()) < 0.05:
+            continue
+
+        disr_dict_sup = {(k,r): v for r, kv in disr.iterrows() for k,v in kv.to_dict().items() if v < 1}
+        events.append((event, disr_dict_sup))
+
+    return events
+
+def round_disruption(disr_dict_sup, decimals=3):
+    """
+    Round the reduction in production capacity of a disruption
+
+    Disruptions that are equal after rounding give the same MRIA results, so only one of them
+    has to be solved. Regions and sectors that are not disrupted after rounding are dropped.
+
+    Parameters
+        - disr_dict_sup - dictionary containing the reduction in production capacity
+        - decimals - Integer number of decimals to round the production capacities to. The default is **3**
+
+    Outputs
+        - dictionary containing the rounded reduction in production capacity
+
+    """
+    rounded_disr = {}
+    for key, value in disr_dict_sup.items():
+        value = round(float(value), decimals)
+        if value < 1:
+            rounded_disr[key] = value
+
+    return rounded_disr
+
+def disruption_signature(disr_dict_sup, table_version=''):
+    """
+    Hash of a rounded disruption, as given by round_disruption
+
+    Parameters
+        - disr_dict_sup - dictionary containing the rounded reduction in production capacity
+        - table_version - String hash of the IO table and model settings. The default is **''**
+
+    Outputs
+        - String hash of the disruption
+
+    """
+    disruption = sorted([str(r), str(s), v] for (r, s), v in disr_dict_sup.items())
+    return hashlib.sha1('|'.join([table_version, json.dumps(disruption)]).encode('utf-8')).hexdigest()
+
+class MRIAResultCache(object):
+    """
+    Store of MRIA event results on disk, addressed by the hash of their disruption.
+
+    Results are stored by the disruption_signature of the rounded disruption and the version of
+    the IO table and model settings, so they stay valid until the table or the settings change.
+    """
+
+    def __init__(self, cache_path):
+        """
+        Parameters
+            - cache_path - String path of the directory where results are stored as .csv files
+
+        """
+        self.cache_path = cache_path
+        if os.path.exists(self.cache_path) == False:
+            os.makedirs(self.cache_path)
+
+    def table_version(self, table_file, regions, model_settings):
+        """
+        Hash of the IO table file, the regions and the settings of the model
+
+        Parameters
+            - table_file - String path to the IO table
+            - regions - list of regions to include
+            - model_settings - list of the settings of the MRIA model
+
+        """
+        table_hash = hashlib.sha1()
+        with open(table_file, 'rb') as table_fh:
+            for block in iter(lambda: table_fh.read(1 << 20), b''):
+                table_hash.update(block)
+        table_hash.update(json.dumps([str(r) for r in regions]).encode('utf-8'))
+        table_hash.update(json.dumps([str(m) for m in model_settings]).encode('utf-8'))
+        return table_hash.hexdigest()
+
+    def get(self, key):
+        """
+        Load the results of a disruption, or None if they are not cached
+        """
+        result_file = self._result_file(key)
+        if os.path.exists(result_file):
+            return pd.read_csv(result_file, index_col=[0, 1])
+        return None
+
+    def put(self, key, output):
+        """
+        Save the results of a disruption, replacing the file only once it is complete
+        """
+        result_file = self._result_file(key)
+        if os.path.exists(os.path.dirname(result_file)) == False:
+            os.makedirs(os.path.dirname(result_file), exist_ok=True)
+        output.to_csv(result_file + '.tmp')
+        os.replace(result_file + '.tmp', result_file)
+
+    def _result_file(self, key):
+        return os.path.join(self.cache_path, key[:2], '{}.csv'.format(key))
+
+def _init_mria_worker(table_name, table_file, regions, disr_dict_fd, retries):
+    """Create the IO table and the MRIA model with its baseline solution once in each worker process
+    """
+    global _mria_worker_inputs
+
+    """Create data input"""
+    DATA = io_basic(table_name, table_file, regions)
+    DATA.prep_data()
+
+    """Create model once, only the production capacities change per event"""
     MRIA_RUN = MRIA(DATA.name, DATA.regions, DATA.sectors, list_fd_cats=['FinDem'])
+    MRIA_RUN.build_impact_model(DATA, disr_dict_fd)
+
+    status = MRIA_RUN.run_impactmodel()
+    if status.key != 'ok':
+        print('Baseline MRIA model finished with solver status {}'.format(status.key))
+
+    """Get base line values of all variables, to reset the model after a failed solve"""
+    _mria_worker_inputs = {
+        'model': MRIA_RUN,
+        'var_base': {var_name: getattr(MRIA_RUN, var_name).get_values()
+                     for var_name in ['X', 'Demand', 'DisImp', 'Rat']},
+        'retries': retries
+    }
+
+def _restore_mria_baseline(MRIA_RUN, var_base):
+    """Set all variables of the model back to their baseline values
+    """
+    for var_name, values in var_base.items():
+        getattr(MRIA_RUN, var_name).set_values(values)
+
+def _run_mria_event(event_disruption):
+    """Estimate the losses of one disruption with the model stored in the worker
+
+    Returns the event, the losses per region and sector or None and the solver status or error message
+    """
+    event, disr_dict_sup = event_disruption
+    MRIA_RUN = _mria_worker_inputs['model']
+    var_base = _mria_worker_inputs['var_base']
+
+    try:
+        output = pd.DataFrame()
+        output['x_in'] = pd.Series(var_base['X'])
+        output.index.names = ['region', 'sector']
+
+        """Get direct losses """
+        disrupt = pd.DataFrame.from_dict(disr_dict_sup, orient='index')
+        disrupt.reset_index(inplace=True)
+        disrupt[['region', 'sector']] = disrupt['index'].apply(pd.Series)
+        disrupt.drop('index', axis=1, inplace=True)
+        disrupt = 1 - disrupt.groupby(['region', 'sector']).sum()
+        disrupt.columns = ['shock']
+
+        output['dir_losses'] = (disrupt['shock']*output['x_in']).fillna(0)*-1
+
+        """Update the production capacities of the model"""
+        MRIA_RUN.update_disruption(disr_dict_sup)
+
+        """Retry failed solves from the baseline solution instead of the previous event"""
+        for attempt in range(_mria_worker_inputs['retries'] + 1):
+            status = MRIA_RUN.run_impactmodel()
+            if status.key == 'ok':
+                break
+            _restore_mria_baseline(MRIA_RUN, var_base)
+
+        if status.key != 'ok':
+            return event, None, 'solver status {}'.format(status.key)
+
+        output['x_out'] = pd.Series(MRIA_RUN.X.get_values())
+        output['total_losses'] = (output['x_out'] - output['x_in'])
+        output['ind_losses'] = (output['total_losses'] - output['dir_losses'])
+
+        return event, output, status.key
+
+    except Exception as e:
+        _restore_mria_baseline(MRIA_RUN, var_base)
+        MRIA_RUN.clear_warm_start()
+        return event, None, '{}'.format(e)
+
+def run_mria_events(events, table_name, table_file, regions, output_dir,
+                    disr_dict_fd={}, num_processes=None, chunk_size=10, retries=1,
+                    cache_path='', decimals=3):
+    """
+    Estimate the economic losses of a list of failure events in parallel worker processes
+
+    The disruption of each event is rounded and only one event of each distinct rounded
+    disruption is solved, the other events reuse its results. If a cache path is given,
+    disruptions that were solved before with the same IO table are read from the
+    MRIAResultCache, and the results of new disruptions are added to the cache.
+
+    Each worker creates its own IO table and MRIA model once and solves the disruptions
+    it is given one after the other, starting from the solution of the previous one.
+
+    Parameters
+        - events - list of (event, disr_dict_sup) tuples, as given by event_disruptions
+        - table_name - String name of the IO table
+        - table_file - String path to the IO table
+        - regions - list of regions to include
+        - output_dir - String path to the directory of the .csv file per event
+        - disr_dict_fd - dictionary containing the disruptions in final demand. The default is an **empty dictionary**
+        - num_processes - Integer number of worker processes. The default is **None** for all cores, 1 to run the events serially in this process
+        - chunk_size - Integer number of consecutive disruptions sent to a worker at a time. The default is **10**
+        - retries - Integer number of times a failed solve is retried. The default is **1**
+        - cache_path - String path of the directory of cached results. The default is **''** for no cache
+        - decimals - Integer number of decimals the disruptions are rounded to. The default is **3**
+
+    Outputs
+        - collect_outputs - dictionary of events and pandas DataFrames of their losses per province
+        - failed_events - list of (event, reason) tuples of the events without results
+
+    """
+    table_version = ''
+    if cache_path:
+        result_cache = MRIAResultCache(cache_path)
+        table_version = result_cache.table_version(table_file, regions, [disr_dict_fd, decimals])
+
+    """Group the events by their rounded disruption"""
+    event_keys = []
+    disruptions = {}
+    for event, disr_dict_sup in events:
+        disr_dict_sup = round_disruption(disr_dict_sup, decimals)
+        key = disruption_signature(disr_dict_sup, table_version)
+        if key not in disruptions:
+            disruptions[key] = disr_dict_sup
+        event_keys.append((event, key))
+
+    disruption_outputs = {}
+    if cache_path:
+        for key in disruptions:
+            output = result_cache.get(key)
+            if output is not None:
+                disruption_outputs[key] = output
+
+    run_disruptions = [(key, disruptions[key]) for key in disruptions if key not in disruption_outputs]
+    print('Number of disruptions to run {} out of {} for {} events'.format(len(run_disruptions),
+                                                                         len(disruptions), len(events)))
+
+    failed_disruptions = {}
+    init_args = (table_name, table_file, regions, disr_dict_fd, retries)
+    if run_disruptions and num_processes == 1:
+        _init_mria_worker(*init_args)
+        results = map(_run_mria_event, run_disruptions)
+        for key, output, status in tqdm(results, total=len(run_disruptions)):
+            if output is None:
+                failed_disruptions[key] = status
+            else:
+                disruption_outputs[key] = output
+                if cache_path:
+                    result_cache.put(key, output)
+    elif run_disruptions:
+        with multiprocessing.Pool(processes=num_processes,
+                                  initializer=_init_mria_worker,
+                                  initargs=init_args) as pool:
+            results = pool.imap(_run_mria_event, run_disruptions, chunksize=chunk_size)
+            for key, output, status in tqdm(results, total=len(run_disruptions)):
+                if output is None:
+                    failed_disruptions[key] = status
+                else:
+                    disruption_outputs[key] = output
+                    if cache_path:
+                        result_cache.put(key, output)
+
+    collect_outputs = {}
+    failed_events = []
+    for event, key in event_keys:
+        if key in failed_disruptions:
+            print('Failed to finish {} because of {}!'.format(event, failed_disruptions[key]))
+            failed_events.append((event, failed_disruptions[key]))
+            continue
+
+        output = disruption_outputs[key]
+        output.to_csv(os.path.join(output_dir, '{}.csv'.format(event)))
+
+        collect_outputs[event] = output.groupby(level=0, axis=0).sum()[['dir_losses','total_losses','ind_losses']]/365
+
+        total_losses_sum = (output['total_losses'].sum().sum()/365)
+        print('{} results in {} Million USD daily losses'.format(event,total_losses_sum))
+
+    return collect_outputs, failed_events
+
+def estimate_losses(input_file, num_processes=None, chunk_size=10, retries=1,
+                    screening_threshold=None, benchmark_sample=50):
+    """
+    Estimate the economic losses for a given set of failure scenarios
+
+    Parameters
+        - input_file - String name of input file to failure scenarios
+        - num_processes - Integer number of worker processes. The default is **None** for all cores, 1 to run the events serially
+        - chunk_size - Integer number of consecutive events sent to a worker at a time. The default is **10**
+        - retries - Integer number of times a failed solve is retried. The default is **1**
+        - screening_threshold - daily total losses estimated by the LeontiefScreening above which an event is run in the MRIA model. The default is **None** to run all events
+        - benchmark_sample - Integer number of events below the screening threshold that are also run in the MRIA model to benchmark the screening. The default is **50**
+
+    Outputs
+        - .csv files with the losses per region and the total losses per failure scenario, including the screening estimates of the scenarios below the screening threshold that were not run in the MRIA model
+        - .csv file with the source of the losses of each failure scenario, mria or screening
+        - .csv file with the failure scenarios that could not be estimated
+        - .csv files with the screening losses of all failure scenarios and the benchmark against the MRIA model, if a screening threshold is given
+        
+    """
+
+    print('{} started!'.format(input_file))
+
+
+    data_path = os.path.join('..','Data')
+    output_path = os.path.join('..','results')
     
-    """Define sets and alias"""
-    # CREATE SETS
-    MRIA_RUN.create_sets()
-    
-    # CREATE ALIAS
-    MRIA_RUN.create_alias()
+    """ Specify file path """
+    filepath = os.path.join(data_path, 'economic_IO_tables','output', 'IO_ARGENTINA.xlsx')
     
-    """ Define tables and parameters"""
-    MRIA_RUN.baseline_data(DATA, disr_dict_sup, disr_dict_fd)
-    MRIA_RUN.impact_data(DATA, disr_dict_sup, disr_dict_fd)
+    regions = ['Ciudad de Buenos Aires', 'Buenos Aires', 'Catamarca', 'Cordoba',
+           'Corrientes', 'Chaco', 'Chubut', 'Entre Rios', 'Formosa', 'Jujuy',
+           'La Pampa', 'La Rioja', 'Mendoza', 'Misiones', 'Neuquen', 'Rio Negro',
+           'Salta', 'San Juan', 'San Luis', 'Santa Cruz', 'Santa Fe',
+           'Santiago del Estero', 'Tucuman', 'Tierra del Fuego']
     
-    MRIA_RUN.run_impactmodel()
+    regions = [x.replace(' ','_') for x in regions]
     
-    """Get base line values"""
-    output['x_in'] = pd.Series(MRIA_RUN.X.get_values())
-    output.index.names = ['region', 'sector']
+    """Specify disruption"""
+    output_dir = os.path.join(
+        output_path,
+        'economic_failure_results',
+        os.path.basename(os.path.splitext(input_file)[0])
+    )
+
+    """Create output folders"""
+    if os.path.exists(output_dir) == False:
+        os.mkdir(output_dir)
+
+    df_failures = load_failure_disruptions(input_file, data_path)
+    events = event_disruptions(df_failures)
+
+    """Screen the events and only run the ones with large losses in the MRIA model"""
+    if screening_threshold is not None:
+        DATA = io_basic('Argentina', filepath, regions)
+        DATA.prep_data()
+
+        screening = LeontiefScreening(DATA)
+        screened_events, screened_losses = screening.select_events(events, screening_threshold)
+        run_events = set(screened_losses.index[screened_losses['selected']])
+        below_events = list(screened_losses.index[~screened_losses['selected']])
+        if benchmark_sample > 0 and len(below_events) > 0:
+            sample_index = np.random.RandomState(0).choice(len(below_events),
+                                                          min(benchmark_sample, len(below_events)), replace=False)
+            run_events.update([below_events[e] for e in sample_index])
+
+        screened_events = [(event, disr_dict_sup) for event, disr_dict_sup in events if event in run_events]
+        print('{} of {} events selected by the screening'.format(len(screened_events), len(events)))
+        screening_outputs = screening.estimate_region_losses(
+            [(event, disr_dict_sup) for event, disr_dict_sup in events if event not in run_events])
+        events = screened_events
+    else:
+        screening_outputs = {}
 
     """Run model and create some output"""
     disr_dict_fd = {}
-    collect_outputs = {}
-    
-    sum_disr = 0
-    prov_impact = pd.DataFrame()
-    
-    for event,edge in tqdm(df_failures.groupby(level=0,axis=0),total=len(df_failures.groupby(level=0,axis=0).sum())):
-        try:
-            edge.index = edge.index.droplevel(0)
-            edge.columns = edge.columns.droplevel(0)
-    
-            disr = edge.dropna(axis=1)
-    
-            if (1-disr.min().min()) < 0.05:
-                continue
-            elif abs(sum_disr - disr.sum().sum()) < 0.001:
-                collect_outputs[event] = prov_impact
-                total_losses_sum = (prov_impact['total_losses'].sum().sum())
-                print('{} results in {} Million USD daily losses'.format(event,total_losses_sum))
-                continue
-    
-            disr_dict_sup = {(k,r): v for r, kv in disr.iterrows() for k,v in kv.to_dict().items() if v < 1}
-            sum_disr = disr.sum().sum()
-    
-            """Create model"""
-            MRIA_RUN = MRIA(DATA.name, DATA.regions, DATA.sectors, list_fd_cats=['FinDem'])
-    
-            """Define sets and alias"""
-            # CREATE SETS
-            MRIA_RUN.create_sets()
-    
-            # CREATE ALIAS
-            MRIA_RUN.create_alias()
-    
-            """ Define tables and parameters"""
-            MRIA_RUN.baseline_data(DATA, disr_dict_sup, disr_dict_fd)
-            MRIA_RUN.impact_data(DATA, disr_dict_sup, disr_dict_fd)
-    
-            """Get direct losses """
-            disrupt = pd.DataFrame.from_dict(disr_dict_sup, orient='index')
-            disrupt.reset_index(inplace=True)
-            disrupt[['region', 'sector']] = disrupt['index'].apply(pd.Series)
-            disrupt.drop('index', axis=1, inplace=True)
-            disrupt = 1 - disrupt.groupby(['region', 'sector']).sum()
-            disrupt.columns = ['shock']
-    
-            output['dir_losses'] = (disrupt['shock']*output['x_in']).fillna(0)*-1
-    
-            status = MRIA_RUN.run_impactmodel()
-            if status.key != 'ok':
-                continue
-            output['x_out'] = pd.Series(MRIA_RUN.X.get_values())
-            output['total_losses'] = (output['x_out'] - output['x_in'])
-            output['ind_losses'] = (output['total_losses'] - output['dir_losses'])
-    
-            output.to_csv(os.path.join(output_dir, '{}.csv'.format(event)))
-    
-            prov_impact = output.groupby(level=0, axis=0).sum()[['dir_losses','total_losses','ind_losses']]/365
-            collect_outputs[event] = prov_impact
-    
-            total_losses_sum = (output['total_losses'].sum().sum()/365)
-            print('{} results in {} Million USD daily losses'.format(event,total_losses_sum))
+    cache_path = os.path.join(output_path, 'economic_failure_results', 'mria_cache')
+    collect_outputs, failed_events = run_mria_events(events, 'Argentina', filepath, regions, output_dir,
+                                                     disr_dict_fd=disr_dict_fd, num_processes=num_processes,
+                                                     chunk_size=chunk_size, retries=retries,
+                                                     cache_path=cache_path)
+
+    pd.DataFrame(failed_events, columns=['event_id', 'reason']).to_csv(
+        os.path.join(output_dir, 'failed_events.csv'), index=False)
 
-        except Exception as e:
-            print('Failed to finish {} because of {}!'.format(event, e))
+    if screening_threshold is not None:
+        screened_losses.to_csv(os.path.join(output_dir, 'screening_losses.csv'))
+        benchmark_screening(screened_losses, collect_outputs, threshold=screening_threshold).to_csv(
+            os.path.join(output_dir, 'screening_benchmark.csv'))
 
     """Create output folders"""
+    output_dir = os.path.join(
+        output_path,
+        'economic_failure_results',
+        'od_regions_losses'
+    )
     if os.path.exists(output_dir) == False:
         os.mkdir(output_dir)
     
-    pd.concat(collect_outputs).to_csv(os.path.join(
+    """Add the screening estimates of the events that were not run in the MRIA model"""
+    od_region_losses = {}
+    loss_sources = {}
+    for event in collect_outputs:
+        od_region_losses[event] = collect_outputs[event]
+        loss_sources[event] = 'mria'
+    for event in screening_outputs:
+        od_region_losses[event] = screening_outputs[event]
+        loss_sources[event] = 'screening'
+
+    od_region_losses = pd.concat(od_region_losses) if od_region_losses else pd.DataFrame(
+        columns=['dir_losses', 'total_losses', 'ind_losses'])
+    od_region_losses.to_csv(os.path.join(
         output_path,
         'economic_failure_results',
         'od_regions_losses',
@@ -207,9 +490,10 @@ def estimate_losses(input_file):
     get_sums = {}
     for event in collect_outputs:
         get_sums[event] = collect_outputs[event]['total_losses'].sum()
+    for event in screening_outputs:
+        get_sums[event] = screening_outputs[event]['total_losses'].sum()
     
-    sums = pd.DataFrame.from_dict(get_sums, orient='index')
-    sums.columns = ['total_losses']
+    sums = pd.DataFrame.from_dict(get_sums, orient='index', columns=['total_losses'])
     
     """Specify disruption"""
     output_dir = os.path.join(
@@ -228,7 +512,14 @@ def estimate_losses(input_file):
         'summarized',
         '{}_summarized.csv'.format(os.path.basename(os.path.splitext(input_file)[0]))))
 
-    return pd.concat(collect_outputs), sums
+    """Keep the source of the losses of each event apart, so the summaries keep their columns"""
+    pd.DataFrame(list(loss_sources.items()), columns=['event_id', 'source']).to_csv(os.path.join(
+        output_path,
+        'economic_failure_results',
+        'summarized',
+        '{}_loss_sources.csv'.format(os.path.basename(os.path.splitext(input_file)[0]))), index=False)
+
+    return od_region_losses, sums
 
 if __name__ == '__main__':
 
@@ -242,6 +533,7 @@ if __name__ == '__main__':
                               )
     multi_modal = False
     railway = True
+    num_processes = None
     output_dir = os.path.join(
         output_path,
         'economic_failure_results')
@@ -263,4 +555,4 @@ if __name__ == '__main__':
 
 
     for gi in get_all_input_files:
-        estimate_losses(gi)
+        estimate_losses(gi, num_processes=num_processes)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Screen failure events with a linear Inoperability Input-Output model before running the MRIA model.
+
+The inoperability model propagates the direct loss of production capacity through the
+interregional supply chains of the IO table with a single Leontief inverse, which is
+estimated once. The losses of many events are estimated with one matrix product, so only
+the events with large losses have to be solved with the full MRIA model.
+
+The inoperability model of Santos and Haimes (2004) is demand driven: the interdependency
+matrix A* = diag(X)^-1 A diag(X) propagates a loss of production backward to the suppliers
+of the disrupted sectors. The failure events are losses of supply capacity, which in the MRIA
+model propagate forward to the buyers and can be made up by imports or other regions. The
+screening applies the supply shocks as direct inoperability of the disrupted sectors in the
+demand driven model, which is an approximation that ranks events by their size rather than
+estimates the MRIA losses. Inoperabilities are capped at 1, full loss of production, and the
+events where the cap is reached are reported. How safe the triage of a screening threshold
+is, is measured by benchmark_screening on a sample of the events below the threshold.
+
+References
+----------
+
+1) Santos, J. R., & Haimes, Y. Y. (2004). Modeling the demand reduction input-output (I-O) inoperability due to terrorism of interconnected infrastructures. Risk Analysis, 24(6), 1437-1451.
+
+"""
+import numpy as np
+import pandas as pd
+
+
+class LeontiefScreening(object):
+    """
+    This is the class object **LeontiefScreening** which is used to estimate the losses of
+    supply disruptions with the Inoperability Input-Output model.
+    """
+
+    def __init__(self, Table):
+        """
+        Creation of the interdependency matrix and its Leontief inverse from an IO table.
+
+        Parameters
+            - *self* - **LeontiefScreening** class object
+            - Table - the **io_basic** class object, after prep_data
+
+        Output
+            - *self*.index - pandas MultiIndex of the regions and sectors of the IO table
+            - *self*.index_map - dictionary of (region, sector) tuples and their position in the matrices
+            - *self*.X - numpy array of the total production of each region and sector
+            - *self*.L_star - numpy array of the Leontief inverse of the interdependency matrix
+
+        """
+        A = Table.A.reindex(index=Table.T_data.index, columns=Table.T_data.index).fillna(0)
+        self.index = A.index
+        self.index_map = dict(zip(self.index, range(len(self.index))))
+        self.X = Table.sum_data.reindex(self.index).fillna(0).values
+
+        """Interdependency matrix A* = diag(X)^-1 A diag(X)"""
+        x_inv = np.zeros_like(self.X)
+        x_inv[self.X > 0] = 1.0/self.X[self.X > 0]
+        A_star = x_inv[:, np.newaxis]*A.values*self.X[np.newaxis, :]
+
+        self.L_star = np.linalg.inv(np.eye(len(self.index)) - A_star)
+
+    def disruption_matrix(self, events):
+        """
+        Create the direct inoperability of each region and sector for a list of events.
+
+        Parameters
+            - *self* - **LeontiefScreening** class object
+            - events - list of (event, disr_dict_sup) tuples, as given by event_disruptions
+
+        Outputs
+            - numpy array with the direct inoperability of each region and sector in the rows and the events in the columns
+
+        """
+        C = np.zeros((len(self.index), len(events)))
+        for e, (event, disr_dict_sup) in enumerate(events):
+            for key, value in disr_dict_sup.items():
+                if key in self.index_map:
+                    C[self.index_map[key], e] = 1 - value
+
+        return C
+
+    def estimate_losses(self, events):
+        """
+        Estimate the direct, indirect and total losses of a list of events.
+
+        Losses are negative, in the same daily units as the MRIA results per province.
+
+        Parameters
+            - *self* - **LeontiefScreening** class object
+            - events - list of (event, disr_dict_sup) tuples, as given by event_disruptions
+
+        Outputs
+            - pandas DataFrame with the event as index and dir_losses, ind_losses, total_losses and max_inoperability columns, where max_inoperability is the largest inoperability before it is capped at 1
+
+        """
+        C = self.disruption_matrix(events)
+        Q = self.L_star.dot(C)
+        max_inoperability = Q.max(axis=0) if len(events) > 0 else np.zeros(0)
+        if (max_inoperability > 1).any():
+            print('Inoperability above 1 capped for {} of {} events'.format((max_inoperability > 1).sum(), len(events)))
+        Q = np.clip(Q, 0, 1)
+
+        dir_losses = -self.X.dot(C)/365
+        total_losses = -self.X.dot(Q)/365
+
+        return pd.DataFrame({'dir_losses': dir_losses,
+                             'ind_losses': total_losses - dir_losses,
+                             'total_losses': total_losses,
+                             'max_inoperability': max_inoperability},
+                            index=pd.Index([event for event, disr_dict_sup in events], name='event_id'))
+
+    def estimate_region_losses(self, events):
+        """
+        Estimate the direct, indirect and total losses per region of a list of events.
+
+        Parameters
+            - *self* - **LeontiefScreening** class object
+            - events - list of (event, disr_dict_sup) tuples, as given by event_disruptions
+
+        Outputs
+            - dictionary of events and pandas DataFrames of their losses per region, in the same form as the MRIA results of run_mria_events
+
+        """
+        C = self.disruption_matrix(events)
+        Q = np.clip(self.L_star.dot(C), 0, 1)
+
+        dir_losses = -self.X[:, np.newaxis]*C/365
+        total_losses = -self.X[:, np.newaxis]*Q/365
+        regions = self.index.get_level_values(0)
+
+        region_losses = {}
+        for e, (event, disr_dict_sup) in enumerate(events):
+            prov_impact = pd.DataFrame({'dir_losses': dir_losses[:, e],
+                                        'total_losses': total_losses[:, e],
+                                        'ind_losses': total_losses[:, e] - dir_losses[:, e]},
+                                       index=regions).groupby(level=0).sum()
+            prov_impact.index.name = 'region'
+            region_losses[event] = prov_impact
+
+        return region_losses
+
+    def select_events(self, events, threshold):
+        """
+        Select the events with estimated total losses above a threshold.
+
+        Parameters
+            - *self* - **LeontiefScreening** class object
+            - events - list of (event, disr_dict_sup) tuples, as given by event_disruptions
+            - threshold - absolute value of the daily total losses above which an event is selected
+
+        Outputs
+            - selected_events - list of (event, disr_dict_sup) tuples of the selected events
+            - screened_losses - pandas DataFrame of the estimated losses of all events, with a selected column
+
+        """
+        screened_losses = self.estimate_losses(events)
+        screened_losses['selected'] = screened_losses['total_losses'].abs().values >= threshold
+        selected_events = [events[e] for e in np.where(screened_losses['selected'].values)[0]]
+
+        return selected_events, screened_losses
+
+
+def benchmark_screening(screened_losses, collect_outputs, threshold=None):
+    """
+    Compare the screening estimates to the MRIA results of the events that were solved.
+
+    The events below the screening threshold that were solved as a benchmark sample show
+    how many events the screening misses: their false negative rate is the share of them
+    with MRIA total losses above the threshold.
+
+    Parameters
+        - screened_losses - pandas DataFrame of estimated losses, as given by LeontiefScreening.estimate_losses or LeontiefScreening.select_events
+        - collect_outputs - dictionary of events and pandas DataFrames of their MRIA losses per province
+        - threshold - absolute value of the daily total losses above which an event is selected. The default is **None**, no false negative rate is estimated
+
+    Outputs
+        - pandas DataFrame with the screening and MRIA total losses of each solved event and their ratio, and if a threshold is given whether the screening selected the event and whether its MRIA losses are above the threshold
+
+    """
+    mria_losses = pd.Series({event: prov_impact['total_losses'].sum()
+                             for event, prov_impact in collect_outputs.items()}, dtype=float)
+
+    benchmark = pd.DataFrame({'screening_total_losses': screened_losses['total_losses'],
+                              'mria_total_losses': mria_losses}).dropna()
+    benchmark.index.name = 'event_id'
+    benchmark['ratio'] = benchmark['mria_total_losses']/benchmark['screening_total_losses'].replace(0, np.nan)
+
+    if len(benchmark.index) > 1:
+        print('Screening vs MRIA total losses of {} events: rank correlation {:.3f}, median ratio {:.3f}'.format(
+            len(benchmark.index),
+            benchmark['screening_total_losses'].rank().corr(benchmark['mria_total_losses'].rank()),
+            benchmark['ratio'].median()))
+
+    if threshold is not None:
+        benchmark['selected'] = benchmark['screening_total_losses'].abs() >= threshold
+        benchmark['mria_above_threshold'] = benchmark['mria_total_losses'].abs() >= threshold
+        below_events = benchmark[benchmark['selected'] == False]
+        if len(below_events.index) > 0:
+            false_negatives = below_events['mria_above_threshold'].sum()
+            print('Screening threshold {} missed {} of {} benchmark events below it: false negative rate {:.3f}'.format(
+                threshold, false_negatives, len(below_events.index), float(false_negatives)/len(below_events.index)))
+
+    return benchmark
@@ -2,10 +2,30 @@
 """
 Create the economic tables required to run the MRIA model.
 """
+import os
+import pickle
+
 import numpy as np
 import pandas as pd
 
 
+def table_dictionary(table):
+    """
+    Transform a table into a dictionary with the tuples of the row and column labels as keys.
+
+    Parameters
+        - table - pandas DataFrame with a MultiIndex for the rows and the columns
+
+    Output
+        - dictionary of tuples of the row and column labels and the values of the table
+
+    """
+    rows = [row if isinstance(row, tuple) else (row,) for row in table.index]
+    columns = [column if isinstance(column, tuple) else (column,) for column in table.columns]
+    keys = [row + column for row in rows for column in columns]
+    return dict(zip(keys, table.values.ravel().tolist()))
+
+
 class io_basic(object):
     """
     This is the class object **io_basic** which is used to set up the table.
@@ -33,6 +53,49 @@ class io_basic(object):
         self.regions = list_regions
         self.total_regions = len(list_regions)
 
+    def read_sheets(self):
+        """
+        Read all sheets of the IO table, from a binary cache next to the Excel file if it is up to date.
+
+        The cache is a pickle file of the sheets, which is written the first time the Excel file
+        is read and again whenever the size or modification time of the Excel file changes,
+        or when the cache cannot be unpickled.
+
+        Parameters
+            - *self* - **io_basic** class object
+
+        Output
+            - dictionary of sheet names and pandas DataFrames of the sheets, read without a header
+
+        """
+        try:
+            return self.sheets
+        except AttributeError:
+            pass
+
+        file_stat = os.stat(self.file)
+        signature = (file_stat.st_size, file_stat.st_mtime)
+        cache_file = os.path.splitext(self.file)[0] + '.pkl'
+
+        sheets = None
+        if os.path.exists(cache_file):
+            try:
+                cached = pd.read_pickle(cache_file)
+                if cached['signature'] == signature:
+                    sheets = cached['sheets']
+            except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, KeyError):
+                # a damaged cache, or one written by another version of pandas, is read again from Excel
+                sheets = None
+
+        if sheets is None:
+            sheets = pd.read_excel(self.file, sheet_name=None, header=None)
+            tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+            pd.to_pickle({'signature': signature, 'sheets': sheets}, tmp_file)
+            os.replace(tmp_file, cache_file)
+
+        self.sheets = sheets
+        return sheets
+
     def load_labels(self):
         """
         Load all labels for the **io_basic** class.
@@ -51,14 +114,15 @@ class io_basic(object):
         """
 
         if 'xls' in self.file:
-            FD_labels = pd.read_excel(self.file, sheet_name="labels_FD",
-                                      names=['reg', 'tfd'], header=None)
-            Exp_labels = pd.read_excel(self.file, sheet_name="labels_ExpROW", names=[
-                                       'export'], header=None)
-            T_labels = pd.read_excel(self.file, sheet_name="labels_T",
-                                     header=None, names=['reg', 'ind'])
-            VA_labels = pd.read_excel(self.file, sheet_name="labels_VA", names=[
-                                      'Import', 'ValueA'], header=None)
+            sheets = self.read_sheets()
+            FD_labels = sheets['labels_FD'].copy()
+            FD_labels.columns = ['reg', 'tfd']
+            Exp_labels = sheets['labels_ExpROW'].copy()
+            Exp_labels.columns = ['export']
+            T_labels = sheets['labels_T'].copy()
+            T_labels.columns = ['reg', 'ind']
+            VA_labels = sheets['labels_VA'].copy()
+            VA_labels.columns = ['Import', 'ValueA']
 
         if len(self.regions) == 0:
             self.regions = list(T_labels['reg'].unique())
@@ -92,10 +156,11 @@ class io_basic(object):
             self.load_labels()
 
         #LOAD DATA
-        FD_data = pd.read_excel(self.file, sheet_name="FD", header=None)
-        T_data = pd.read_excel(self.file, sheet_name="T", header=None)
-        VA_data = pd.read_excel(self.file, sheet_name="VA", header=None)
-        ExpROW_data = pd.read_excel(self.file, sheet_name="ExpROW", header=None)
+        sheets = self.read_sheets()
+        FD_data = sheets['FD'].copy()
+        T_data = sheets['T'].copy()
+        VA_data = sheets['VA'].copy()
+        ExpROW_data = sheets['ExpROW'].copy()
 
         # Add labels to the data from 'load_labels'
         FD_data.index = pd.MultiIndex.from_arrays(self.T_labels.values.T)
@@ -125,12 +190,23 @@ class io_basic(object):
 
     def prep_data(self):
         """
-        Transform the dataframes into dictionaries, ready to be used in the **MRIA_IO** class instance. 
+        Transform the dataframes into arrays and dictionaries, ready to be used in the **MRIA_IO** class instance. 
         
+        The arrays have one axis for the regions and one for the sectors of each side of the table,
+        in the order of *self*.regions and *self*.sectors.
+
         Parameters
             - *self* - **io_basic** class object
             
         Output
+            - *self*.region_index - dictionary of regions and their position in the arrays in the **io_basic** class
+            - *self*.sector_index - dictionary of sectors and their position in the arrays in the **io_basic** class
+            - *self*.Z_array - array of Z matrix (region, sector, region, sector) in the **io_basic** class
+            - *self*.A_array - array of A matrix (region, sector, region, sector) in the **io_basic** class
+            - *self*.FinalD_array - array of Final Demand (region, sector, region, final demand category) in the **io_basic** class
+            - *self*.ValueA_array - array of Value Added (region, sector) in the **io_basic** class
+            - *self*.ImpROW_array - array of import from the Rest of the World (region, sector) in the **io_basic** class
+            - *self*.ExpROW_array - array of exports to the Rest of The World (region, sector) in the **io_basic** class
             - *self*.FinalD - dictionary of Final Demand in the **io_basic** class            
             - *self*.A_matrix - dictionary of A matrix in the **io_basic** class 
             - *self*.Z_matrix - dictionary of Z matrix in the **io_basic** class 
@@ -149,18 +225,45 @@ class io_basic(object):
 
         self.A = self.T_data.divide(self.sum_data, axis=1).fillna(0)
 
+        #Create the arrays of the regions and sectors in the model
+        self.region_index = {r: i for i, r in enumerate(self.regions)}
+        self.sector_index = {s: i for i, s in enumerate(self.sectors)}
+
+        n_reg = len(self.regions)
+        n_sec = len(self.sectors)
+        index = pd.MultiIndex.from_product([self.regions, self.sectors])
+        fd_columns = pd.MultiIndex.from_product([self.regions, self.FD_cat])
+
+        self.Z_array = self.T_data.reindex(index=index, columns=index).fillna(0).values.reshape(
+            n_reg, n_sec, n_reg, n_sec)
+        self.A_array = self.A.reindex(index=index, columns=index).fillna(0).values.reshape(
+            n_reg, n_sec, n_reg, n_sec)
+        self.FinalD_array = self.FD_data.reindex(index=index, columns=fd_columns).fillna(0).values.reshape(
+            n_reg, n_sec, n_reg, len(self.FD_cat))
+        self.ValueA_array = self.VA_data.reindex(index=index).fillna(0).values[:, 0].reshape(n_reg, n_sec)
+        self.ImpROW_array = self.ImpROW_data.reindex(index=index).fillna(0).values[:, 0].reshape(n_reg, n_sec)
+        self.ExpROW_array = self.ExpROW_data.reindex(index=index).fillna(0).values[:, 0].reshape(n_reg, n_sec)
 
         #Return all the parts of the dataset to the class again
 
-        self.Z_matrix = {r + k: v for r, kv in self.T_data.iterrows()
-                         for k, v in kv.to_dict().items()}
-        self.A_matrix = {r + k: v for r, kv in self.A.iterrows()
-                         for k, v in kv.to_dict().items()}
-        self.FinalD = {r + k: v for r, kv in self.FD_data.iterrows()
-                       for k, v in kv.to_dict().items()}
-        self.ValueA = {r + k: v for r, kv in self.VA_data.iterrows()
-                       for k, v in kv.to_dict().items()}
-        self.ImpROW = {r + k: v for r, kv in self.ImpROW_data.iterrows()
-                       for k, v in kv.to_dict().items()}
-        self.ExpROW = {r + k: v for r, kv in self.ExpROW_data.iterrows()
-                       for k, v in kv.to_dict().items()}
+        self.Z_matrix = table_dictionary(self.T_data)
+        self.A_matrix = table_dictionary(self.A)
+        self.FinalD = table_dictionary(self.FD_data)
+        self.ValueA = table_dictionary(self.VA_data)
+        self.ImpROW = table_dictionary(self.ImpROW_data)
+        self.ExpROW = table_dictionary(self.ExpROW_data)
+
+    def final_demand(self, fd_cats):
+        """
+        Total Final Demand of a set of final demand categories.
+
+        Parameters
+            - *self* - **io_basic** class object
+            - fd_cats - list of final demand categories
+
+        Output
+            - array of Final Demand (region, sector, region) of the final demand categories
+
+        """
+        fd_index = [self.FD_cat.index(fd_cat) for fd_cat in fd_cats]
+        return self.FinalD_array[:, :, :, fd_index].sum(axis=3)
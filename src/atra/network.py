@@ -60,7 +60,7 @@ class Network():
             raise ValueError("Either crs or epsg must be provided to Network.set_crs")
 
         if epsg is not None:
-            crs = {'init': 'epsg:{}'.format(epsg)}
+            crs = 'epsg:{}'.format(epsg)
 
         self.edges.crs = crs
         self.nodes.crs = crs
@@ -80,7 +80,7 @@ class Network():
             raise ValueError("Either crs or epsg must be provided to Network.set_crs")
 
         if epsg is not None:
-            crs = {'init': 'epsg:{}'.format(epsg)}
+            crs = 'epsg:{}'.format(epsg)
 
         self.edges.to_crs(crs, inplace=True)
         self.nodes.to_crs(crs, inplace=True)
@@ -48,7 +48,7 @@ def main(config):
 		proj = "+proj=tmerc +lat_0=-34.629269 +lon_0=-58.4633 +k=0.9999980000000001 +x_0=100000 +y_0=100000 +ellps=intl +units=m +no_defs"
 		records.crs = proj
 		print (records)
-		records = records.to_crs({'init': 'epsg:4326'})
+		records = records.to_crs('epsg:4326')
 		print (records)
 		records.to_file(os.path.join(config['paths']['incoming_data'], 'cba_pdoh_shps_2','co100_3h_{}.shp'.format(depths[d])))
 
@@ -18,50 +18,75 @@ mpl.rcParams['savefig.pad_inches'] = 0.05
 def main(config):
     """Read shapes, plot map
     """
-    file_paths_info = [('GLOFRIS','WATCH','ARG_inunriver_historical_000000000WATCH_1980_rp01000.tif'),
-    				('GLOFRIS','RCP45','ARG_inunriver_rcp4p5_0000GFDL-ESM2M_2030_rp01000.tif'),
-    				('GLOFRIS','RCP85','ARG_inunriver_rcp8p5_0000GFDL-ESM2M_2030_rp01000.tif'),
-    				('FATHOM','AR_fluvial_undefended_merged','AR-FU-1000.tif'),
-    				('FATHOM','AR_pluvial_undefended_merged','AR-PU-1000.tif')
-    				]
+    # (source, climate scenario directory, hazard type, part of the file name of the model run)
+    hazard_info = [('GLOFRIS','WATCH','fluvial undefended','WATCH_1980'),
+                   ('GLOFRIS','RCP45','fluvial undefended','GFDL-ESM2M_2030'),
+                   ('GLOFRIS','RCP85','fluvial undefended','GFDL-ESM2M_2030'),
+                   ('FATHOM','AR_fluvial_undefended_merged','fluvial undefended',''),
+                   ('FATHOM','AR_pluvial_undefended_merged','pluvial undefended','')
+                   ]
     figure_names = ['GLOFRIS-WATCH-fluvial','GLOFRIS-RCP45-fluvial','GLOFRIS-RCP85-fluvial','FATHOM-fluvial','FATHOM-pluvial']
     figure_titles = ['current fluvial flooding','RCP4.5 fluvial flooding','RCP8.5 fluvial flooding','current fluvial flooding','current pluvial flooding']
-    for f_i in range(len(file_paths_info)):
-	    hazard_file = os.path.join(config['paths']['data'],'flood_data', file_paths_info[f_i][0],file_paths_info[f_i][1],file_paths_info[f_i][2])
-	    output_file = os.path.join(config['paths']['figures'], 'flood-map-{}.png'.format(figure_names[f_i]))
-	    ax = get_axes()
-	    plot_basemap(ax, config['paths']['data'])
-	    scale_bar(ax, location=(0.8, 0.05))
-	    plot_basemap_labels(ax, config['paths']['data'], include_regions=True,include_zorder=3)
 
-	    proj_lat_lon = ccrs.PlateCarree()
+    # Index the hazard rasters of each source once, from their headers only
+    hazard_catalogues = {}
+    for source in set([h[0] for h in hazard_info]):
+        hazard_catalogues[source] = HazardCatalogue(os.path.join(config['paths']['data'],'flood_data',source))
 
+    for f_i in range(len(hazard_info)):
+        source, climate_scenario, hazard_type, model_run = hazard_info[f_i]
+        output_file = os.path.join(config['paths']['figures'], 'flood-map-{}.png'.format(figure_names[f_i]))
+        ax = get_axes()
+        plot_basemap(ax, config['paths']['data'])
+        scale_bar(ax, location=(0.8, 0.05))
+        plot_basemap_labels(ax, config['paths']['data'], include_regions=True,include_zorder=3)
 
-	    # Create color map
-	    colors = plt.get_cmap('Blues')
+        proj_lat_lon = ccrs.PlateCarree()
 
-	    # Read in raster data
-	    data, lat_lon_extent = get_data(hazard_file)
-	    data[(data <= 0) | (data > 5)] = np.nan
-	    max_val = np.nanmax(data)
-	    norm=mpl.colors.Normalize(vmin=0, vmax=max_val)
 
-	    # Plot population data
-	    im = ax.imshow(data, extent=lat_lon_extent,transform=proj_lat_lon, cmap=colors,norm =norm, zorder=2)
+        # Create color map
+        colors = plt.get_cmap('Blues')
 
-	    # Add colorbar
-	    cbar = plt.colorbar(im, ax=ax,fraction=0.1, shrink=0.87,pad=0.01, drawedges=False, orientation='horizontal',
-	                        norm=mpl.colors.Normalize(vmin=0, vmax=max_val), ticks=list(np.linspace(0,max_val,3)))
-	    cbar.set_clim(vmin=0,vmax=max_val)
+        # Select the 1 in 1000 year rasters intersecting the map extent, and read them only over
+        # the map extent and at about the resolution of the figure
+        x_min, x_max, y_min, y_max = ax.get_extent(crs=proj_lat_lon)
+        hazard_rasters = hazard_catalogues[source].select(hazard_type=hazard_type, return_period=1000,
+                                                          climate_scenario=climate_scenario,
+                                                          bounds=(x_min, y_min, x_max, y_max))
+        hazard_rasters = hazard_rasters[hazard_rasters['file_name'].str.contains(model_run, regex=False)]
+        if len(hazard_rasters.index) == 0:
+            print ('* No {} {} rasters over the map extent'.format(source, climate_scenario))
+            plt.close()
+            continue
 
+        hazard_data = []
+        for hazard_file in hazard_rasters['file_path'].values.tolist():
+            data, lat_lon_extent = hazard_catalogues[source].read(hazard_file, bounds=(x_min, y_min, x_max, y_max),
+                                                                  max_size=2000)
+            data = data.astype(float)
+            data[(data <= 0) | (data > 5)] = np.nan
+            hazard_data.append((data, lat_lon_extent))
 
-	    cbar.outline.set_color("none")
-	    cbar.ax.yaxis.set_tick_params(color='black')
-	    cbar.ax.set_xlabel('Flood depths (m)',fontsize=12,color='black')
+        max_val = np.nanmax([np.nanmax(data) if np.isfinite(data).any() else 0 for data, lat_lon_extent in hazard_data])
+        norm=mpl.colors.Normalize(vmin=0, vmax=max_val)
 
-	    plt.title('1 in 1000 year {}'.format(figure_titles[f_i]), fontsize = 14)
-	    save_fig(output_file)
-	    plt.close()
+        # Plot flood depth data
+        for data, lat_lon_extent in hazard_data:
+            im = ax.imshow(data, extent=lat_lon_extent,transform=proj_lat_lon, cmap=colors,norm =norm, zorder=2)
+
+        # Add colorbar
+        cbar = plt.colorbar(im, ax=ax,fraction=0.1, shrink=0.87,pad=0.01, drawedges=False, orientation='horizontal',
+                            norm=mpl.colors.Normalize(vmin=0, vmax=max_val), ticks=list(np.linspace(0,max_val,3)))
+        cbar.set_clim(vmin=0,vmax=max_val)
+
+
+        cbar.outline.set_color("none")
+        cbar.ax.yaxis.set_tick_params(color='black')
+        cbar.ax.set_xlabel('Flood depths (m)',fontsize=12,color='black')
+
+        plt.title('1 in 1000 year {}'.format(figure_titles[f_i]), fontsize = 14)
+        save_fig(output_file)
+        plt.close()
 
 
 if __name__ == '__main__':
@@ -46,7 +46,7 @@ def main():
                                 'admin_boundaries_and_census',
                                 'departamento', 'Departamentos.shp')
     zones = gpd.read_file(zones_path,encoding='utf-8')
-    zones = zones.to_crs({'init': 'epsg:4326'})
+    zones = zones.to_crs('epsg:4326')
     zones.rename(columns={'OBJECTID':'department_id','Name':'department_name'},inplace=True)
 
     labels = ['0 to 10', '10 to 20', '20 to 30', '30 to 40', '40 to 100', 'No value']
@@ -39,7 +39,7 @@ def main():
 
 		networks.append(input_df)
 
-	networks_file = gpd.GeoDataFrame(pd.concat(networks,ignore_index=True,sort=False),geometry='geometry',crs={'init': 'epsg:4326'})
+	networks_file = gpd.GeoDataFrame(pd.concat(networks,ignore_index=True,sort=False),geometry='geometry',crs='epsg:4326')
 	networks_file.to_file(os.path.join(config['paths']['incoming_data'],
 				'pre_processed_network_data',
 				'roads',
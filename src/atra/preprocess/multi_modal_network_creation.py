@@ -97,7 +97,7 @@ def multi_modal_shapefile_to_dataframe(edges_in, mode_properties_file, mode_name
     # assgin asset terrain
 
     # get the right linelength
-    edges['length'] = edges.geometry.apply(line_length)
+    edges['length'] = line_lengths(edges.geometry)
 
     cost_values_df = pd.read_excel(mode_properties_file, sheet_name=mode_name)
 
@@ -175,20 +175,20 @@ def main(config):
 
     road_nodes_path = os.path.join(data_path,'network','road_nodes.shp')
     road_nodes = gpd.read_file(road_nodes_path,encoding='utf-8').fillna(0)
-    road_nodes = road_nodes.to_crs({'init': 'epsg:4326'})
+    road_nodes = road_nodes.to_crs('epsg:4326')
     road_nodes.columns = map(str.lower, road_nodes.columns)
     road_nodes.rename(columns={'id':'node_id'},inplace=True)
     road_nodes = road_nodes[['node_id','geometry']]
 
     rail_nodes_path = os.path.join(data_path,'network','rail_nodes.shp')
     rail_nodes = gpd.read_file(rail_nodes_path,encoding='utf-8').fillna(0)
-    rail_nodes = rail_nodes.to_crs({'init': 'epsg:4326'})
+    rail_nodes = rail_nodes.to_crs('epsg:4326')
     rail_nodes.columns = map(str.lower, rail_nodes.columns)
     rail_nodes = rail_nodes[['node_id','geometry']]
 
     port_nodes_path = os.path.join(data_path,'network','port_nodes.shp')
     port_nodes = gpd.read_file(port_nodes_path,encoding='utf-8').fillna('none')
-    port_nodes = port_nodes.to_crs({'init': 'epsg:4326'})
+    port_nodes = port_nodes.to_crs('epsg:4326')
     port_nodes.columns = map(str.lower, port_nodes.columns)
     port_nodes.rename(columns={'id':'node_id'},inplace=True)
     port_nodes = port_nodes[port_nodes['name'] != 'none']
@@ -206,7 +206,7 @@ def main(config):
 
     multi_edge_df = pd.concat(multi_edge_df,axis=0,sort='False', ignore_index=True)
     multi_edge_df['geometry'] = multi_edge_df.progress_apply(lambda x: LineString([x.from_geometry,x.to_geometry]),axis = 1)
-    multi_edge_df['length'] = multi_edge_df.geometry.progress_apply(line_length)
+    multi_edge_df['length'] = line_lengths(multi_edge_df.geometry)
     multi_edge_df.drop(['from_geometry','to_geometry'],axis=1,inplace=True)
     multi_edge_df = multi_edge_df[multi_edge_df['length'] < 2]
 
@@ -233,7 +233,7 @@ def main(config):
 
     '''Write the output to files
     '''
-    multi_edge_df = gpd.GeoDataFrame(multi_edge_df,geometry='geometry',crs={'init' :'epsg:4326'})
+    multi_edge_df = gpd.GeoDataFrame(multi_edge_df,geometry='geometry',crs='epsg:4326')
     multi_edge_df.to_file(os.path.join(data_path,'network','multi_edges.shp'),encoding='utf-8')
     multi_edge_df.drop('geometry',axis=1,inplace=True)
     multi_edge_df.to_csv(os.path.join(data_path,'network','multi_edges.csv'),index=False,encoding='utf-8-sig')
@@ -5,7 +5,6 @@ import os
 import geopandas
 import pandas
 
-from fiona.crs import from_epsg
 from atra.utils import load_config
 from shapely.geometry import Point
 from snkit import Network
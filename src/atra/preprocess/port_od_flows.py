@@ -153,7 +153,7 @@ def main(config):
                                 'ports',
                                 'port_network',
                                 'water_nodes.shp'),encoding='utf-8').fillna('none')
-    port_nodes.crs = {'init' :'epsg:4326'}
+    port_nodes.crs = 'epsg:4326'
     port_names = port_nodes[['name','id','province']]
 
 
@@ -380,7 +380,7 @@ def main(config):
     port_edges.rename(columns={'id':'edge_id','from_id':'from_node','to_id':'to_node'},inplace=True)
     port_edges = port_edges[['from_node','to_node','edge_id','geometry']]
     # get the right linelength
-    port_edges['length'] = port_edges.geometry.apply(line_length)
+    port_edges['length'] = line_lengths(port_edges.geometry)
     port_edges['min_speed'] = 4.0
     port_edges['max_speed'] = 5.0
     port_edges['min_time'] = port_edges['length']/port_edges['max_speed']
@@ -389,7 +389,7 @@ def main(config):
     cost_df = pd.read_excel(os.path.join(incoming_data_path,'costs','port','port_costs.xlsx'),sheet_name='costs')
     port_edges['min_gcost'] = cost_df['min_cost'].values[0]
     port_edges['max_gcost'] = cost_df['max_cost'].values[0]
-    port_edges.crs = {'init' :'epsg:4326'}
+    port_edges.crs = 'epsg:4326'
 
     port_edges.to_file(os.path.join(data_path,'network','port_edges.shp'),encoding = 'utf-8')
     port_edges.drop('geometry', axis=1, inplace=True)
@@ -325,7 +325,7 @@ def main(config):
                                     'rail_network',
                                     'ffcc_nodes.shp')
     rail_nodes = gpd.read_file(rail_nodes_path,encoding='utf-8').fillna(0)
-    rail_nodes = rail_nodes.to_crs({'init': 'epsg:4326'})
+    rail_nodes = rail_nodes.to_crs('epsg:4326')
     rail_nodes.columns = map(str.lower, rail_nodes.columns)
 
     '''Specific and read the province GIS data for matching rail nodes to provinces
@@ -335,7 +335,7 @@ def main(config):
                                     'provincia',
                                     'Provincias.shp')
     provinces = gpd.read_file(province_path,encoding='utf-8')
-    provinces = provinces.to_crs({'init': 'epsg:4326'})
+    provinces = provinces.to_crs('epsg:4326')
     sindex_provinces = provinces.sindex
 
     '''Find the provinces of rail GIS nodes by matching with province GIS data
@@ -407,7 +407,7 @@ def main(config):
     cost_df = pd.read_excel(os.path.join(incoming_data_path,'costs','rail','rail_costs.xlsx'),sheet_name='route_costs')
     '''Add length and cost values to the rail edges
     '''
-    rail_edges['length'] = rail_edges.geometry.apply(line_length)
+    rail_edges['length'] = line_lengths(rail_edges.geometry)
     rail_edges['cost'] = rail_edges.progress_apply(lambda x:min_max_cost(x,cost_df),axis=1)
     rail_edges[['min_gcost', 'max_gcost']] = rail_edges['cost'].apply(pd.Series)
     rail_edges.drop('cost', axis=1, inplace=True)
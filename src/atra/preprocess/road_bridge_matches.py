@@ -46,7 +46,7 @@ def find_point_edges(road_dataframe,marker_dataframe,marker_columns,edge_columns
     marker_dataframe['poly_geometry'] = marker_dataframe.geometry.apply(lambda x: x.buffer(geom_buffer))
     poly_df = marker_dataframe[marker_columns + ['poly_geometry']]
     poly_df.rename(columns={'poly_geometry':'geometry'},inplace=True)
-    road_matches = gpd.sjoin(road_dataframe,poly_df, how="inner", op='intersects').reset_index()
+    road_matches = gpd.sjoin(road_dataframe,poly_df, how="inner", predicate='intersects').reset_index()
     return road_matches[edge_columns+marker_columns]
 
 def get_marker(x,points_dataframe,common_column,extract_column):
@@ -310,7 +310,7 @@ def main(config):
                                                 sort='False',
                                                 ignore_index=True).fillna(0),
                                                 geometry='geometry',
-                                                crs={'init' :'epsg:32720'})
+                                                crs='epsg:32720')
 
     '''Match finalised bridge locations to markers
     '''
@@ -324,7 +324,7 @@ def main(config):
 
     # bridge_markers = pd.read_csv('bridge_markers.csv',encoding='utf-8-sig').fillna(0)
     # bridge_markers['geometry'] = bridge_markers['geometry'].apply(wkt.loads)
-    # bridge_markers = gpd.GeoDataFrame(bridge_markers,geometry='geometry',crs={'init' :'epsg:32720'})
+    # bridge_markers = gpd.GeoDataFrame(bridge_markers,geometry='geometry',crs='epsg:32720')
 
     routes = list(set(bridge_markers['cod_ruta'].values.tolist()))
     bridge_data = []
@@ -397,7 +397,7 @@ def main(config):
         else:
             print (r,len(bridge_info.index),len(bridge_ids.index))
 
-    bridges = gpd.GeoDataFrame(pd.concat(bridge_data,axis=0,sort='False', ignore_index=True).fillna(0),geometry='geometry',crs={'init' :'epsg:32720'})
+    bridges = gpd.GeoDataFrame(pd.concat(bridge_data,axis=0,sort='False', ignore_index=True).fillna(0),geometry='geometry',crs='epsg:32720')
     bridges.rename(columns=columns_dict,inplace=True)
     bridges['width'] = bridges['right_lane_width'] + bridges['left_lane_width'] + bridges['pavement_width_asc'] + bridges['pavement_width_desc']
 
@@ -464,7 +464,7 @@ def main(config):
 
     bridge_lines = gpd.GeoDataFrame(pd.DataFrame(bridge_lines,
                                                 columns=['bridge_id','geometry','length']).fillna(0),
-                                                geometry='geometry',crs={'init' :'epsg:32720'})
+                                                geometry='geometry',crs='epsg:32720')
     bridge_lines = bridge_lines.to_crs(epsg=4326)
     bridge_lines.to_file(os.path.join(data_path,'network','bridge_edges.shp'),encoding='utf-8')
 
@@ -350,7 +350,7 @@ def find_km_markers(road_dataframe,marker_dataframe):
     marker_dataframe['poly_geometry'] = marker_dataframe.geometry.progress_apply(lambda x: x.buffer(0.04))
     poly_df = marker_dataframe[['id','progresiva','distancia','poly_geometry']]
     poly_df.rename(columns={'poly_geometry':'geometry'},inplace=True)
-    road_matches = gpd.sjoin(road_dataframe,poly_df, how="inner", op='intersects').reset_index()
+    road_matches = gpd.sjoin(road_dataframe,poly_df, how="inner", predicate='intersects').reset_index()
     marker_dataframe.drop('poly_geometry',axis=1,inplace=True)
     del poly_df
     road_matches = road_matches[['edge_id','id','progresiva','distancia']].set_index(['edge_id'])
@@ -403,7 +403,7 @@ def get_numeric_attributes(road_gpd,attribute_gpd,attribute_id_column,attribute_
     road_gpd = road_gpd.to_crs(epsg=epsg_utm_20s)
     attribute_gpd = attribute_gpd.to_crs(epsg=epsg_utm_20s)
     attribute_gpd['geometry'] = attribute_gpd.geometry.progress_apply(lambda x: x.buffer(0.04))
-    road_matches = gpd.sjoin(road_gpd,attribute_gpd, how="inner", op='intersects').reset_index()
+    road_matches = gpd.sjoin(road_gpd,attribute_gpd, how="inner", predicate='intersects').reset_index()
     road_matches = road_matches[['edge_id',attribute_id_column,attribute_value_column]].set_index(['edge_id'])
     attribute_gpd = attribute_gpd.set_index([attribute_id_column])
     edge_ids = list(set(road_matches.index.values.tolist()))
@@ -441,7 +441,7 @@ def get_string_attributes(road_gpd,attribute_gpd,attribute_value_column,road_col
     road_gpd = road_gpd.to_crs(epsg=epsg_utm_20s)
     attribute_gpd = attribute_gpd.to_crs(epsg=epsg_utm_20s)
     attribute_gpd['geometry'] = attribute_gpd.geometry.progress_apply(lambda x: x.buffer(0.04))
-    road_matches = gpd.sjoin(road_gpd,attribute_gpd, how="inner", op='intersects').reset_index()
+    road_matches = gpd.sjoin(road_gpd,attribute_gpd, how="inner", predicate='intersects').reset_index()
     road_matches = road_matches[['edge_id',attribute_value_column]].set_index(['edge_id'])
     edge_ids = list(set(road_matches.index.values.tolist()))
     edge_vals = []
@@ -577,7 +577,7 @@ def main(config):
     '''Start calculations from here
     '''
     # get the right linelength
-    edges['length'] = edges.geometry.progress_apply(line_length)
+    edges['length'] = line_lengths(edges.geometry)
 
     '''Add properties to the national roads
     '''
@@ -32,7 +32,7 @@ def assign_node_weights_by_area_population_proximity(region_path,nodes,region_po
     # load provinces and get geometry of the right regions data
     tqdm.pandas()
     regions_data = gpd.read_file(region_path,encoding='utf-8')
-    regions_data = regions_data.to_crs({'init': 'epsg:4326'})
+    regions_data = regions_data.to_crs('epsg:4326')
     sindex_regions_data = regions_data.sindex
 
     # create Voronoi polygons for the nodes
@@ -213,7 +213,7 @@ def main(config):
                                     'provincia',
                                     'Provincias.shp')
     provinces = gpd.read_file(province_path,encoding='utf-8')
-    provinces = provinces.to_crs({'init': 'epsg:4326'})
+    provinces = provinces.to_crs('epsg:4326')
     sindex_provinces = provinces.sindex
 
     '''Assign provinces to zones
@@ -225,7 +225,7 @@ def main(config):
                                     '3.6.1.10.zonas',
                                     'ZonasSHP.shp')
     zones = gpd.read_file(zones_path,encoding='utf-8')
-    zones = zones.to_crs({'init': 'epsg:4326'})
+    zones = zones.to_crs('epsg:4326')
     zones.columns = map(str.lower, zones.columns)
     zones.rename(columns={'data':'od_id'},inplace=True)
     sindex_zones = zones.sindex
@@ -235,7 +235,7 @@ def main(config):
     print('* Reading nodes dataframe and adding provinces and zone ids')
     road_nodes_path = os.path.join(data_path,'network','road_nodes.shp')
     road_nodes = gpd.read_file(road_nodes_path,encoding='utf-8').fillna(0)
-    road_nodes = road_nodes.to_crs({'init': 'epsg:4326'})
+    road_nodes = road_nodes.to_crs('epsg:4326')
     road_nodes.columns = map(str.lower, road_nodes.columns)
     road_nodes.rename(columns={'id':'node_id'},inplace=True)
     road_nodes = road_nodes[(road_nodes['road_type'] == 'national')| (road_nodes['road_type'] == 'province')]
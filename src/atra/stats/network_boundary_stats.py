@@ -87,7 +87,7 @@ def main():
                                     'admin_boundaries_and_census',
                                     'provincia','Provincias.shp')
     provinces = gpd.read_file(province_path,encoding='utf-8')
-    provinces = provinces.to_crs({'init': 'epsg:4326'})
+    provinces = provinces.to_crs('epsg:4326')
     provinces.rename(columns={'OBJECTID':'province_id','nombre':'province_name','Geometry':'geom_type'},inplace=True)
     sindex_provinces = provinces.sindex
 
@@ -97,13 +97,13 @@ def main():
     zones_path = os.path.join(incoming_data_path, 'admin_boundaries_and_census',,
                                 'departamento', 'Departamentos.shp')
     zones = gpd.read_file(zones_path,encoding='utf-8')
-    zones = zones.to_crs({'init': 'epsg:4326'})
+    zones = zones.to_crs('epsg:4326')
     zones.rename(columns={'OBJECTID':'department_id','Name':'department_name','Geometry':'geom_type'},inplace=True)
 
     zones['geometry_centroid'] = zones.geometry.centroid
     zones_centriods = zones[['department_id','department_name','geometry_centroid']]
     zones_centriods.rename(columns={'geometry_centroid':'geometry'},inplace=True)
-    zone_matches = gpd.sjoin(zones_centriods,provinces[['province_id','province_name','geometry']], how="inner", op='within').reset_index()
+    zone_matches = gpd.sjoin(zones_centriods,provinces[['province_id','province_name','geometry']], how="inner", predicate='within').reset_index()
     no_zones = [x for x in zones['department_id'].tolist() if x not in zone_matches['department_id'].tolist()]
 
     zones.drop('geometry_centroid',axis=1,inplace=True)
@@ -143,12 +143,10 @@ def main():
                 'network',
                 '{}_nodes.shp'.format(modes[m]))
 
-        data_dict = []
-        data_dict = spatial_scenario_selection(
-                        network_shp, zones, {}, data_dict,
+        data_df = spatial_scenario_attributes(
+                        network_shp, zones, {},
                         modes_id_cols[m],
                         network_type = ntype)
-        data_df = pd.DataFrame(data_dict)
 
         data_df.to_excel(nat_excel_writer, modes[m], index=False)
         nat_excel_writer.save()
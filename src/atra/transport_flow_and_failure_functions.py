@@ -3,8 +3,10 @@
 import ast
 import copy
 import csv
+import hashlib
 import itertools
 import math
+import multiprocessing
 import operator
 import os
 import sys
@@ -17,66 +19,257 @@ from itertools import chain
 import numpy as np
 import pandas as pd
 from atra.utils import *
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
 from tqdm import tqdm
 
-def spatial_scenario_selection(network_shapefile, 
-                    polygon_dataframe, hazard_dictionary, 
-                    data_dictionary,network_id_column,network_type ='nodes'):
+def spatial_scenario_attributes(network_shapefile,
+                    polygon_dataframe, hazard_dictionary,
+                    network_id_column,network_type ='nodes'):
     """Intersect network edges/nodes and boundary Polygons to collect boundary and hazard attributes
 
+    All edges/nodes are matched to the boundary Polygons they intersect with one spatial index
+    query, and the edges are cut by their boundary Polygons in one vectorised intersection
+
     Parameters
         - network_shapefile - Shapefile of edge LineStrings or node Points
-        - polygon_shapefile - Shapefile of boundary Polygons
+        - polygon_dataframe - GeoDataFrame of boundary Polygons
         - hazard_dictionary - Dictionary of hazard attributes
-        - data_dictionary - Dictionary of network-hazard-boundary intersection attributes
+        - network_id_column - String name of edge ID or node ID column
         - network_type - String value -'edges' or 'nodes' - Default = 'nodes'
-        - name_province - String name of province if needed - Default = ''
 
     Outputs
-        data_dictionary - Dictionary of network-hazard-boundary intersection attributes:
+        data_df - Pandas DataFrame of network-hazard-boundary intersection attributes:
             - edge_id/node_id - String name of intersecting edge ID or node ID
             - length - Float length of intersection of edge LineString and hazard Polygon: Only for edges
             - province_id - String/Integer ID of Province
             - province_name - String name of Province in English
-            - district_id - String/Integer ID of District
-            - district_name - String name of District in English
-            - commune_id - String/Integer ID of Commune
-            - commune_name - String name of Commune in English
-            - hazard_attributes - Dictionary of all attributes from hazard dictionary
+            - department_id - String/Integer ID of Department
+            - department_name - String name of Department in English
+            - hazard_attributes - Columns of all attributes from hazard dictionary
     """
-    line_gpd = gpd.read_file(network_shapefile)
+    line_gpd = read_geo_file(network_shapefile, memo=False, cache=False)
     poly_gpd = polygon_dataframe
 
+    boundary_columns = ['province_id', 'province_name', 'department_id', 'department_name']
+    if network_type == 'edges':
+        data_columns = [network_id_column, 'length'] + boundary_columns
+    else:
+        data_columns = [network_id_column] + boundary_columns
 
+    data_df = pd.DataFrame(columns=data_columns)
     if len(line_gpd.index) > 0 and len(poly_gpd.index) > 0:
         print (network_shapefile,len(line_gpd.index),len(poly_gpd.index))
         line_gpd.columns = map(str.lower, line_gpd.columns)
         poly_gpd.columns = map(str.lower, poly_gpd.columns)
 
-        # create spatial index
-        poly_sindex = poly_gpd.sindex
-
-        poly_sindex = poly_gpd.sindex
-        for l_index, lines in line_gpd.iterrows():
-            intersected_polys = poly_gpd.iloc[list(
-                poly_sindex.intersection(lines.geometry.bounds))]
-            for p_index, poly in intersected_polys.iterrows():
-                if (lines['geometry'].intersects(poly['geometry']) is True) and (poly.geometry.is_valid is True) and (lines.geometry.is_valid is True):
-                    if network_type == 'edges':
-                        value_dictionary = {network_id_column: lines[network_id_column],
-                                            'length': 1000.0*line_length(lines['geometry'].intersection(poly['geometry'])),
-                                            'province_id': poly['province_id'], 'province_name': poly['province_name'],
-                                            'department_id': poly['department_id'], 'department_name': poly['department_name']}
-                    elif network_type == 'nodes':
-                        value_dictionary = {network_id_column: lines[network_id_column],
-                                            'province_id': poly['province_id'], 'province_name': poly['province_name'],
-                                            'department_id': poly['department_id'], 'department_name': poly['department_name']}
-
-                    data_dictionary.append({**value_dictionary, **hazard_dictionary})
+        line_gpd = line_gpd[line_gpd.geometry.is_valid]
+        poly_gpd = poly_gpd[poly_gpd.geometry.is_valid]
+        line_index, poly_index = poly_gpd.sindex.query(line_gpd.geometry, predicate='intersects')
+        pair_order = np.lexsort((poly_index, line_index))
+        line_index, poly_index = line_index[pair_order], poly_index[pair_order]
+
+        data_df = pd.DataFrame({network_id_column: line_gpd[network_id_column].values[line_index]})
+        if network_type == 'edges':
+            pair_geoms = line_gpd.geometry.iloc[line_index].reset_index(drop=True).intersection(
+                poly_gpd.geometry.iloc[poly_index].reset_index(drop=True))
+            data_df['length'] = 1000.0*line_lengths(pair_geoms)
+        for column in boundary_columns:
+            data_df[column] = poly_gpd[column].values[poly_index]
+
+    for key, value in hazard_dictionary.items():
+        data_df[key] = value
 
     del line_gpd, poly_gpd
+    return data_df
+
+def spatial_scenario_selection(network_shapefile, 
+                    polygon_dataframe, hazard_dictionary, 
+                    data_dictionary,network_id_column,network_type ='nodes'):
+    """Intersect network edges/nodes and boundary Polygons to collect boundary and hazard attributes
+    as a list of dictionaries, see spatial_scenario_attributes
+
+    Parameters
+        - network_shapefile - Shapefile of edge LineStrings or node Points
+        - polygon_shapefile - Shapefile of boundary Polygons
+        - hazard_dictionary - Dictionary of hazard attributes
+        - data_dictionary - Dictionary of network-hazard-boundary intersection attributes
+        - network_type - String value -'edges' or 'nodes' - Default = 'nodes'
+
+    Outputs
+        data_dictionary - List of dictionaries of network-hazard-boundary intersection attributes
+    """
+    data_df = spatial_scenario_attributes(network_shapefile, polygon_dataframe, hazard_dictionary,
+                                          network_id_column, network_type=network_type)
+    data_dictionary += data_df.to_dict('records')
     return data_dictionary
 
+def intersection_record_schema(network_id_column, network_type='nodes'):
+    """Columns and types of the network-hazard-boundary intersection records, see
+    spatial_scenario_attributes and create_hazard_attributes_for_network
+
+    Parameters
+        - network_id_column - String name of the edge ID or node ID column
+        - network_type - String value -'edges' or 'nodes' - Default = 'nodes'
+
+    Outputs
+        schema - List of (column, type) tuples, with types 'string', 'int64' or 'float64'
+    """
+    schema = [(network_id_column, 'string')]
+    if network_type == 'edges':
+        schema += [('length', 'float64')]
+    schema += [('province_id', 'int64'), ('province_name', 'string'),
+               ('department_id', 'int64'), ('department_name', 'string'),
+               ('sector', 'string'), ('hazard_type', 'string'), ('model', 'string'),
+               ('year', 'int64'), ('climate_scenario', 'string'), ('probability', 'float64'),
+               ('min_depth', 'string'), ('max_depth', 'string')]
+    return schema
+
+def cast_to_schema(data_df, schema):
+    """Cast the columns of a DataFrame to the types of a schema, see intersection_record_schema
+
+    Columns of the schema missing from the DataFrame are added as missing values, and
+    columns of the DataFrame that are not in the schema, or values that cannot be
+    converted to the type of their column, raise a ValueError
+
+    Parameters
+        - data_df - Pandas DataFrame
+        - schema - List of (column, type) tuples, with types 'string', 'int64' or 'float64'
+
+    Outputs
+        data_df - Pandas DataFrame with the columns of the schema in order
+    """
+    schema_columns = [column for column, column_type in schema]
+    extra_columns = [c for c in data_df.columns if c not in schema_columns]
+    if extra_columns:
+        raise ValueError('Columns not in the record schema: {}'.format(extra_columns))
+
+    cast_df = pd.DataFrame(index=data_df.index)
+    for column, column_type in schema:
+        if column in data_df.columns:
+            values = data_df[column]
+        else:
+            values = pd.Series(None, index=data_df.index, dtype=object)
+        if column_type == 'string':
+            cast_df[column] = values.astype(object).where(values.notna(), None).map(
+                lambda x: x if x is None else str(x))
+            continue
+
+        try:
+            numeric_values = pd.to_numeric(values.astype(object).where(values.notna(), None))
+        except (ValueError, TypeError):
+            raise ValueError('Values of column {} are not {}: {}'.format(
+                column, column_type, values[pd.to_numeric(values, errors='coerce').isna() & values.notna()].unique()[:10]))
+        if column_type == 'int64':
+            non_integers = numeric_values.notna() & (numeric_values != numeric_values.round())
+            if non_integers.any():
+                raise ValueError('Values of column {} are not int64: {}'.format(
+                    column, values[non_integers].unique()[:10]))
+            cast_df[column] = numeric_values.astype('Float64').astype('Int64')
+        else:
+            cast_df[column] = numeric_values.astype('float64')
+    return cast_df
+
+class IntersectionRecordSink():
+    """Stream network-hazard-boundary intersection records in fixed-size chunks
+
+    Records appended to the sink are buffered, and every chunk_size records the buffer is
+    appended to a records file and its lengths are summed into a running aggregate over
+    all other columns, so memory is bounded by the number of distinct records rather than
+    the number of intersections. Records without a length column, e.g. of nodes, are kept
+    as they are.
+
+    Parameters
+    ---------
+    records_path - Path of the file the records are appended to: .parquet (needs pyarrow)
+        or .csv. Default = '', the records are only aggregated
+    value_column - String name of the column summed in the aggregate - Default = 'length'
+    chunk_size - Number of records buffered before they are written and aggregated
+    schema - List of (column, type) tuples of the records file, as given by
+        intersection_record_schema, which every chunk is cast to - Default = None, the
+        columns and types of the first chunk
+    """
+    def __init__(self, records_path='', value_column='length', chunk_size=500000, schema=None):
+        self.records_path = records_path
+        self.value_column = value_column
+        self.chunk_size = chunk_size
+        self.record_schema = schema
+        self.buffer = []
+        self.buffered_rows = 0
+        self.aggregate = None
+        self.writer = None
+        self.schema = None
+        if records_path and os.path.exists(records_path):
+            os.remove(records_path)
+
+    def append(self, data_df):
+        """Add a DataFrame of records to the sink
+        """
+        if len(data_df.index) == 0:
+            return
+        self.buffer.append(data_df)
+        self.buffered_rows += len(data_df.index)
+        if self.buffered_rows >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records and add them to the aggregate
+        """
+        if not self.buffer:
+            return
+        chunk_df = pd.concat(self.buffer, axis=0, sort=False, ignore_index=True)
+        self.buffer = []
+        self.buffered_rows = 0
+
+        if self.records_path:
+            if self.record_schema is not None:
+                records_df = cast_to_schema(chunk_df, self.record_schema)
+            else:
+                records_df = chunk_df
+
+        if self.records_path.endswith('.csv'):
+            records_df.to_csv(self.records_path, mode='a', index=False, encoding='utf-8-sig',
+                              header=os.path.exists(self.records_path) == False)
+        elif self.records_path:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self.writer is None:
+                if self.record_schema is not None:
+                    self.schema = pa.schema([(column, getattr(pa, column_type)())
+                                             for column, column_type in self.record_schema])
+                else:
+                    self.schema = pa.Schema.from_pandas(records_df, preserve_index=False)
+                self.writer = pq.ParquetWriter(self.records_path, self.schema)
+            self.writer.write_table(pa.Table.from_pandas(records_df[self.schema.names],
+                                                         schema=self.schema, preserve_index=False))
+
+        if self.value_column in chunk_df.columns:
+            key_columns = [c for c in chunk_df.columns if c != self.value_column]
+            chunk_df = chunk_df.groupby(key_columns)[self.value_column].sum().reset_index()
+            if self.aggregate is not None:
+                chunk_df = pd.concat([self.aggregate, chunk_df], axis=0, sort=False, ignore_index=True)
+                chunk_df = chunk_df.groupby(key_columns)[self.value_column].sum().reset_index()
+            self.aggregate = chunk_df
+        elif self.aggregate is not None:
+            self.aggregate = pd.concat([self.aggregate, chunk_df], axis=0, sort=False, ignore_index=True)
+        else:
+            self.aggregate = chunk_df
+
+    def close(self):
+        """Write the remaining records and close the records file
+
+        Returns
+        -------
+        aggregate - Pandas DataFrame of the aggregated records
+        """
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.aggregate is None:
+            return pd.DataFrame()
+        return self.aggregate
+
 def combine_hazards_and_network_attributes_and_impacts(hazard_dataframe, network_dataframe,network_id_column):
     hazard_dataframe.rename(columns={
         'length': 'exposure_length',
@@ -110,6 +303,20 @@ def correct_exposures(x,length_thr):
     else:
         return el,ep, 1.0
 
+def correct_exposures_columns(dataframe, length_thr):
+    """Vectorised correct_exposures over the exposure_length and percent_exposure columns,
+    which also adds the risk_wt column
+    """
+    exposure_length = dataframe['exposure_length'].values.astype(float)
+    percent_exposure = dataframe['percent_exposure'].values.astype(float)
+    over_exposed = percent_exposure > 100
+    exposure_length = np.where(over_exposed, 100.0*exposure_length/np.where(over_exposed, percent_exposure, 1.0),
+                               exposure_length)
+    dataframe['exposure_length'] = exposure_length
+    dataframe['percent_exposure'] = np.where(over_exposed, 100.0, percent_exposure)
+    dataframe['risk_wt'] = np.where(exposure_length < length_thr, 1.0*exposure_length/length_thr, 1.0)
+    return dataframe
+
 def change_depth_string_to_number(x):
     if 'cm' in x:
         return 0.01*float(x.split('cm')[0])
@@ -118,37 +325,85 @@ def change_depth_string_to_number(x):
     else:
         return x
 
+def change_depth_strings_to_numbers(depths):
+    """Vectorised change_depth_string_to_number over a Series of depth strings
+    """
+    depth_strings = depths.astype(str)
+    in_cm = depth_strings.str.contains('cm', regex=False)
+    in_m = (in_cm == False) & depth_strings.str.contains('m', regex=False)
+    depth_values = depths.copy().astype(object)
+    depth_values[in_cm] = 0.01*depth_strings[in_cm].str.split('cm').str[0].astype(float)
+    depth_values[in_m] = 1.0*depth_strings[in_m].str.split('m').str[0].astype(float)
+    return depth_values.infer_objects()
+
+def trapezoid_risk_weights(prob_exposures, index_cols):
+    """Integrate the risk weights and exposure lengths of failure scenarios over their
+    probabilities with the trapezoid rule
+
+    The rows are sorted by scenario and probability once, and the trapezoids of all
+    scenarios are summed together with NumPy. Scenarios with a single probability get
+    the product of the probability and the weight.
+
+    Parameters
+    ---------
+    prob_exposures - Pandas DataFrame of scenarios with index_cols, probability,
+        exposure_length and risk_wt columns
+    index_cols - List of names of columns identifying scenarios
+
+    Returns
+    -------
+    scenarios_df - Pandas DataFrame of index_cols, risk_wt and dam_wt of each scenario
+    """
+    group_ids = prob_exposures.groupby(index_cols, sort=False).ngroup().values
+    valid = group_ids >= 0
+    probabilities = prob_exposures['probability'].values.astype(float)
+    order = np.flatnonzero(valid)[np.lexsort((probabilities[valid], group_ids[valid]))]
+    group_ids = group_ids[order]
+    probabilities = probabilities[order]
+    weights = np.column_stack((prob_exposures['risk_wt'].values.astype(float)[order],
+                               prob_exposures['exposure_length'].values.astype(float)[order]))
+    num_groups = group_ids.max() + 1 if len(group_ids) > 0 else 0
+
+    same_scenario = group_ids[1:] == group_ids[:-1]
+    trapezoids = 0.5*(np.diff(probabilities)*same_scenario)[:, None]*(weights[1:] + weights[:-1])
+    group_starts = np.flatnonzero(np.r_[True, same_scenario == False]) if len(group_ids) > 0 else np.zeros(0, dtype=int)
+    single_probability = np.bincount(group_ids, minlength=num_groups)[group_ids[group_starts]] == 1
+
+    scenarios_df = prob_exposures[index_cols].iloc[order[group_starts]].reset_index(drop=True)
+    for w, col in enumerate(['risk_wt', 'dam_wt']):
+        weight_sums = np.bincount(group_ids[1:], weights=trapezoids[:, w], minlength=num_groups)[group_ids[group_starts]]
+        scenarios_df[col] = np.where(single_probability,
+                                     probabilities[group_starts]*weights[group_starts, w], weight_sums)
+
+    return scenarios_df
+
 
 def create_hazard_scenarios_for_adaptation(all_edge_fail_scenarios, index_cols, length_thr):
-    tqdm.pandas()
-    all_edge_fail_scenarios['min_flood_depth'] = all_edge_fail_scenarios.min_flood_depth.progress_apply(
-                                                lambda x:change_depth_string_to_number(x))
-    all_edge_fail_scenarios['max_flood_depth'] = all_edge_fail_scenarios.max_flood_depth.progress_apply(
-                                                lambda x:change_depth_string_to_number(x))
-    min_height_prob = all_edge_fail_scenarios.groupby(index_cols)['min_flood_depth',
-                                                        'probability'].min().reset_index()
+    all_edge_fail_scenarios['min_flood_depth'] = change_depth_strings_to_numbers(all_edge_fail_scenarios['min_flood_depth'])
+    all_edge_fail_scenarios['max_flood_depth'] = change_depth_strings_to_numbers(all_edge_fail_scenarios['max_flood_depth'])
+    min_height_prob = all_edge_fail_scenarios.groupby(index_cols)[['min_flood_depth',
+                                                        'probability']].min().reset_index()
     min_height_prob.rename(columns={'probability': 'min_probability'},inplace=True)
-    max_height_prob = all_edge_fail_scenarios.groupby(index_cols)['max_flood_depth',
-                                                        'probability'].max().reset_index()
+    max_height_prob = all_edge_fail_scenarios.groupby(index_cols)[['max_flood_depth',
+                                                        'probability']].max().reset_index()
     max_height_prob.rename(columns={'probability': 'max_probability'},inplace=True)
     min_max_height_prob = pd.merge(min_height_prob,max_height_prob,how='left',on=index_cols)
     del min_height_prob,max_height_prob
-    prob_exposures = all_edge_fail_scenarios.groupby(index_cols + ['probability'])['percent_exposure',
-                                                        'exposure_length'].sum().reset_index()
+    prob_exposures = all_edge_fail_scenarios.groupby(index_cols + ['probability'])[['percent_exposure',
+                                                        'exposure_length']].sum().reset_index()
     del all_edge_fail_scenarios
 
-    prob_exposures['exposures_risk'] = prob_exposures.progress_apply(lambda x: correct_exposures(x,length_thr),axis=1)
-    prob_exposures[['exposure_length','percent_exposure','risk_wt']] = prob_exposures['exposures_risk'].apply(pd.Series)
+    prob_exposures = correct_exposures_columns(prob_exposures, length_thr)
 
     min_exposures = prob_exposures[index_cols + \
                     ['exposure_length',
-                    'percent_exposure']].groupby(index_cols)['exposure_length',
-                    'percent_exposure'].min().reset_index()
+                    'percent_exposure']].groupby(index_cols)[['exposure_length',
+                    'percent_exposure']].min().reset_index()
     min_exposures.rename(columns={'exposure_length':'min_exposure_length','percent_exposure':'min_exposure_percent'},inplace=True)
     max_exposures = prob_exposures[index_cols + \
                     ['exposure_length',
-                    'percent_exposure']].groupby(index_cols)['exposure_length',
-                    'percent_exposure'].max().reset_index()
+                    'percent_exposure']].groupby(index_cols)[['exposure_length',
+                    'percent_exposure']].max().reset_index()
     max_exposures.rename(columns={'exposure_length':'max_exposure_length','percent_exposure':'max_exposure_percent'},inplace=True)
 
     exposures = pd.merge(min_exposures,max_exposures,how='left',on=index_cols).fillna(0)
@@ -156,36 +411,11 @@ def create_hazard_scenarios_for_adaptation(all_edge_fail_scenarios, index_cols,
     height_prob_exposures = pd.merge(min_max_height_prob,exposures,how='left',on=index_cols).fillna(0)
     del min_max_height_prob, exposures
 
-    prob_exposures = prob_exposures.set_index(index_cols)
-    scenarios = list(set(prob_exposures.index.values.tolist()))
-    t = len(scenarios)
-    print('Number of failure scenarios',t)
-    scenarios_list = []
-    l = 0
-    for sc in scenarios:
-        l+= 1
-        prob_tup = [tuple(x) for x in prob_exposures.loc[[sc], ['probability','exposure_length','risk_wt']].values.tolist()]
-        if len(prob_tup) > 1:
-            prob_tup = [(w,x,y) for (w,x,y) in sorted(prob_tup, key=lambda pair: pair[0])]
-            risk_wt = 0
-            dam_wt = 0
-            for p in range(len(prob_tup)-1):
-                risk_wt += 0.5*(prob_tup[p+1][0]-prob_tup[p][0])*(prob_tup[p+1][-1]+prob_tup[p][-1])
-                dam_wt += 0.5*(prob_tup[p+1][0]-prob_tup[p][0])*(prob_tup[p+1][1]+prob_tup[p][1])
-
-        else:
-            risk_wt = prob_tup[0][0]*prob_tup[0][-1]
-            dam_wt = prob_tup[0][0]*prob_tup[0][1]
-
-        scenarios_list.append(list(sc) + [risk_wt, dam_wt])
-
-        print ('Done with scenario {} out of {}'.format(l,t))
-    
-    new_cols = ['risk_wt', 'dam_wt']
-    scenarios_df = pd.DataFrame(scenarios_list, columns=index_cols + new_cols)
+    scenarios_df = trapezoid_risk_weights(prob_exposures, index_cols)
+    print('Number of failure scenarios',len(scenarios_df.index))
 
     scenarios_df = pd.merge(scenarios_df,height_prob_exposures,how='left',on=index_cols).fillna(0)
-    del scenarios_list,height_prob_exposures
+    del prob_exposures,height_prob_exposures
     return scenarios_df
 
 def swap_min_max(x, min_col, max_col):
@@ -202,6 +432,17 @@ def swap_min_max(x, min_col, max_col):
         else:
             return x[min_col], x[max_col]
 
+def swap_min_max_columns(dataframe, min_col, max_col):
+    """Swap the values of min-max columns on all rows where necessary, as in swap_min_max
+    """
+    min_values = dataframe[min_col].values
+    max_values = dataframe[max_col].values
+    both_negative = (min_values < 0) & (max_values < 0)
+    swap = (both_negative & (np.abs(min_values) > np.abs(max_values))) | (
+            ~both_negative & (min_values > max_values))
+    dataframe[min_col], dataframe[max_col] = np.where(swap, max_values, min_values), np.where(swap, min_values, max_values)
+    return dataframe
+
 def add_igraph_generalised_costs(G, vehicle_numbers, tonnage):
     # G.es['max_cost'] = list(cost_param*(np.array(G.es['length'])/np.array(G.es['max_speed'])))
     # G.es['min_cost'] = list(cost_param*(np.array(G.es['length'])/np.array(G.es['min_speed'])))
@@ -234,8 +475,63 @@ def add_dataframe_generalised_costs(G, vehicle_numbers, tonnage):
 
     return G
 
+class EdgeAttributeTable():
+    """NumPy arrays of igraph edge attributes indexed by igraph edge index
+
+    Used to estimate the attributes of many edge paths at once, by indexing the
+    attribute arrays with the concatenated edge indexes of the paths and summing them
+    per path, instead of looking up each edge attribute of each path on the graph.
+
+    Parameters
+    ---------
+    graph - igraph network structure
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self.attributes = {}
+
+    def values(self, attribute):
+        """Array of values of an edge attribute, read from the graph on first use
+        """
+        if attribute not in self.attributes:
+            self.attributes[attribute] = np.asarray(self.graph.es[attribute])
+        return self.attributes[attribute]
+
+    def path_sums(self, paths, attributes):
+        """Sum edge attributes along each path
+
+        Parameters
+        ---------
+        paths - List of lists of igraph edge indexes
+        attributes - List of string names of edge attributes to sum
+
+        Returns
+        -------
+        path_sums - Dictionary of attribute names and arrays of path sums, with 0 for empty paths
+        """
+        path_lengths = np.fromiter((len(path) for path in paths), dtype=np.int64, count=len(paths))
+        edge_indexes = np.fromiter(chain.from_iterable(paths), dtype=np.int64, count=path_lengths.sum())
+        path_starts = np.cumsum(path_lengths) - path_lengths
+        non_empty = path_lengths > 0
+
+        path_sums = {}
+        for attribute in attributes:
+            sums = np.zeros(len(paths))
+            if len(edge_indexes) > 0:
+                sums[non_empty] = np.add.reduceat(self.values(attribute)[edge_indexes],
+                                                  path_starts[non_empty])
+            path_sums[attribute] = sums
+
+        return path_sums
+
+    def path_edge_ids(self, paths, id_attribute='edge_id'):
+        """Convert paths of igraph edge indexes to lists of edge ID's
+        """
+        edge_ids = self.values(id_attribute)
+        return [edge_ids[path].tolist() if path else [] for path in paths]
+
 def network_od_path_estimations(graph,
-    source, target, cost_criteria, time_criteria):
+    source, target, cost_criteria, time_criteria, edge_attributes=None):
     """Estimate the paths, distances, times, and costs for given OD pair
 
     Parameters
@@ -255,6 +551,8 @@ def network_od_path_estimations(graph,
     time_criteria : str
         name of time criteria to be used: min_time or max_time
     fixed_cost : bool
+    edge_attributes : EdgeAttributeTable
+        edge attribute arrays of graph, built once for repeated calls on the same graph
 
     Returns
     -------
@@ -268,36 +566,243 @@ def network_od_path_estimations(graph,
         estimated generalised costs of routes
 
     """
+    if edge_attributes is None:
+        edge_attributes = EdgeAttributeTable(graph)
+
     paths = graph.get_shortest_paths(source, target, weights=cost_criteria, output="epath")
+    path_sums = edge_attributes.path_sums(paths, ['length', time_criteria, cost_criteria])
 
-    edge_path_list = []
-    path_dist_list = []
-    path_time_list = []
-    path_gcost_list = []
-
-    for path in paths:
-        edge_path = []
-        path_dist = 0
-        path_time = 0
-        path_gcost = 0
-        if path:
-            for n in path:
-                edge_path.append(graph.es[n]['edge_id'])
-                path_dist += graph.es[n]['length']
-                path_time += graph.es[n][time_criteria]
-                path_gcost += graph.es[n][cost_criteria]
-
-        edge_path_list.append(edge_path)
-        path_dist_list.append(path_dist)
-        path_time_list.append(path_time)
-        path_gcost_list.append(path_gcost)
+    edge_path_list = edge_attributes.path_edge_ids(paths)
+    path_dist_list = path_sums['length'].tolist()
+    path_time_list = path_sums[time_criteria].tolist()
+    path_gcost_list = path_sums[cost_criteria].tolist()
 
     return edge_path_list, path_dist_list, path_time_list, path_gcost_list
 
+class AllPairsPathCache():
+    """All-pairs shortest path matrices of a small network, cached on disk
+
+    For one generalised cost criterion, the cache holds the matrices of route costs,
+    times and distances between all pairs of nodes, and the predecessor matrix of the
+    routes, as .npy files that are memory-mapped when loaded. The files are named by
+    the hash of the network edges csv file and the criteria, so they are estimated
+    again only when the network changes. Meant for the rail, port and air networks,
+    whose node by node matrices fit in memory.
+
+    Parameters
+    ---------
+    edges_csv - Path of network edges csv file, with from_node and to_node as the
+        first two columns, followed by edge_id, length and the cost and time criteria
+    cache_path - Path of the directory where the matrices are stored
+    cost_criteria - String name of generalised cost criteria to route on: min_gcost or max_gcost
+    time_criteria - String name of time criteria to sum along routes: min_time or max_time
+    """
+    def __init__(self, edges_csv, cache_path, cost_criteria, time_criteria):
+        self.cost_criteria = cost_criteria
+        self.time_criteria = time_criteria
+        if os.path.exists(cache_path) == False:
+            os.makedirs(cache_path)
+
+        with open(edges_csv, 'rb') as edges_fh:
+            edges_hash = hashlib.sha1(edges_fh.read()).hexdigest()
+        cache_name = '{}_{}_{}_{}'.format(os.path.splitext(os.path.basename(edges_csv))[0],
+                                          cost_criteria, time_criteria, edges_hash[:16])
+        self.cache_files = dict([(matrix, os.path.join(cache_path, '{}_{}.npy'.format(cache_name, matrix)))
+                                 for matrix in ['nodes', 'edges', 'gcost', 'time', 'distance', 'predecessors']])
+
+        if all([os.path.exists(cache_file) for cache_file in self.cache_files.values()]) == False:
+            print ('* Estimating all-pairs {} paths of {}'.format(cost_criteria, edges_csv))
+            self._write_matrices(pd.read_csv(edges_csv, encoding='utf-8-sig'))
+
+        self.node_names = np.load(self.cache_files['nodes'])
+        self.node_lookup = pd.Index(self.node_names)
+        self.edge_ids = np.load(self.cache_files['edges'])
+        self.matrices = dict([(matrix, np.load(self.cache_files[matrix], mmap_mode='r'))
+                              for matrix in ['gcost', 'time', 'distance', 'predecessors']])
+
+    def _write_matrices(self, network_dataframe):
+        """Estimate the all-pairs matrices with scipy and save them to the cache files
+        """
+        from_col, to_col = list(network_dataframe.columns)[:2]
+        node_codes, node_names = pd.factorize(pd.concat([network_dataframe[from_col],
+                                                         network_dataframe[to_col]], ignore_index=True))
+        num_nodes = len(node_names)
+        num_edges = len(network_dataframe.index)
+
+        # Keep the lowest cost edge between each pair of nodes, in both directions
+        node_pairs = pd.DataFrame({
+            'from_node': np.concatenate((node_codes[:num_edges], node_codes[num_edges:])),
+            'to_node': np.concatenate((node_codes[num_edges:], node_codes[:num_edges])),
+            'edge_row': np.tile(np.arange(num_edges), 2),
+            'cost': np.tile(network_dataframe[self.cost_criteria].values.astype(float), 2)})
+        node_pairs = node_pairs.sort_values(by=['from_node', 'to_node', 'cost'], kind='mergesort')
+        node_pairs = node_pairs.drop_duplicates(subset=['from_node', 'to_node'], keep='first')
+        adjacency = csr_matrix((node_pairs['cost'].values,
+                                (node_pairs['from_node'].values, node_pairs['to_node'].values)),
+                               shape=(num_nodes, num_nodes))
+        gcost, predecessors = dijkstra(adjacency, directed=True, return_predecessors=True)
+
+        # Sum the time and distance of each route along its predecessors by pointer jumping
+        pair_edges = pd.Series(node_pairs['edge_row'].values,
+                               index=node_pairs['from_node'].values*num_nodes + node_pairs['to_node'].values)
+        has_predecessor = predecessors >= 0
+        target_nodes = np.broadcast_to(np.arange(num_nodes), predecessors.shape)
+        route_edges = np.full(predecessors.shape, -1, dtype=np.int64)
+        route_edges[has_predecessor] = pair_edges.loc[
+            predecessors[has_predecessor].astype(np.int64)*num_nodes + target_nodes[has_predecessor]].values
+        source_nodes = np.broadcast_to(np.arange(num_nodes)[:, None], predecessors.shape)
+        route_sums = {}
+        for matrix, column in [('time', self.time_criteria), ('distance', 'length')]:
+            edge_values = network_dataframe[column].values.astype(float)
+            values = np.where(has_predecessor, edge_values[route_edges], 0)
+            pointers = np.where(has_predecessor, predecessors, -1)
+            while (pointers >= 0).any():
+                follow = pointers >= 0
+                values[follow] += values[source_nodes[follow], pointers[follow]]
+                pointers[follow] = pointers[source_nodes[follow], pointers[follow]]
+            values[np.isinf(gcost)] = np.inf
+            route_sums[matrix] = values
+
+        np.save(self.cache_files['nodes'], np.asarray(node_names.tolist()))
+        np.save(self.cache_files['edges'], np.asarray(network_dataframe['edge_id'].values.tolist()))
+        np.save(self.cache_files['gcost'], gcost)
+        np.save(self.cache_files['time'], route_sums['time'])
+        np.save(self.cache_files['distance'], route_sums['distance'])
+        # Saved last, so an interrupted run does not leave a complete looking cache
+        route_edges_file = self.cache_files['predecessors']
+        np.save(route_edges_file + '.tmp.npy', np.stack((predecessors, route_edges.astype(np.int32))))
+        os.replace(route_edges_file + '.tmp.npy', route_edges_file)
+
+    def od_path_estimations(self, source, target):
+        """Estimate the paths, distances, times, and costs for given OD pairs from the cache,
+        in the same form as network_od_path_estimations
+
+        Parameters
+        ---------
+        source - String/Float/Integer name of Origin node ID
+        target - List of String/Float/Integer names of Destination node ID's
+
+        Returns
+        -------
+        edge_path_list - nested lists of Strings/Floats/Integers of edge ID's in routes
+        path_dist_list - estimated distances of routes
+        path_time_list - estimated times of routes
+        path_gcost_list - estimated generalised costs of routes
+        """
+        origins = [source]*len(target)
+        od_values = self.od_values(origins, target)
+        # Routes that do not exist are empty, with zero sums, as igraph returns them
+        path_sums = dict([(matrix, np.where(np.isinf(values), 0, values).tolist())
+                          for matrix, values in od_values.items()])
+
+        return (self.od_paths(origins, target), path_sums['distance'],
+                path_sums['time'], path_sums['gcost'])
+
+    def node_indexes(self, nodes):
+        """Positions of node ID's in the cached matrices
+
+        Raises
+        ------
+        ValueError
+            If a node is not in the network, as igraph does for unknown vertex names
+        """
+        node_indexes = self.node_lookup.get_indexer(nodes)
+        if (node_indexes < 0).any():
+            missing_nodes = list(dict.fromkeys(node for node, index in zip(nodes, node_indexes) if index < 0))
+            raise ValueError('Nodes not in the network: {}'.format(missing_nodes[:10]))
+        return node_indexes
+
+    def od_values(self, origins, destinations):
+        """Read the route costs, times and distances of OD pairs from the cached matrices
+
+        Returns
+        -------
+        od_values - Dictionary of gcost, time and distance arrays in the order of the OD
+            pairs, with inf for OD pairs that are not connected
+        """
+        origin_nodes = self.node_indexes(origins)
+        destination_nodes = self.node_indexes(destinations)
+        return dict([(matrix, np.asarray(self.matrices[matrix][origin_nodes, destination_nodes]))
+                     for matrix in ['gcost', 'time', 'distance']])
+
+    def od_paths(self, origins, destinations):
+        """Recover the routes of OD pairs from the cached predecessor matrix
+
+        Returns
+        -------
+        edge_path_list - List of lists of edge ID's of the routes, in the order of the OD pairs
+        """
+        predecessors = self.matrices['predecessors']
+        edge_path_list = []
+        for origin, destination in zip(self.node_indexes(origins),
+                                       self.node_indexes(destinations)):
+            edge_path = []
+            node = destination
+            while predecessors[0, origin, node] >= 0:
+                edge_path.append(predecessors[1, origin, node])
+                node = predecessors[0, origin, node]
+            edge_path_list.append(self.edge_ids[edge_path[::-1]].tolist())
+        return edge_path_list
+
+def flow_paths_incidence_matrix(save_paths_df, path_criteria, path_store=None):
+    """Build the sparse edge by OD flow incidence matrix of flow paths
+
+    Parameters
+    ---------
+    save_paths_df - Pandas DataFrame of OD flow paths
+    path_criteria - String name of column of edge paths in flow dataframe
+    path_store - Dictionary of CSR edge paths of the flows, from load_flow_path_store -
+        Default = None to use the lists of edge ID's in the path criteria column
+
+    Returns
+    -------
+    edge_ids - Array of edge ID's of the rows of the incidence matrix
+    incidence - scipy.sparse.csr_matrix with the number of times the path of each
+        OD flow (column) uses each edge (row)
+    """
+    num_flows = len(save_paths_df.index)
+    if path_store is not None:
+        offsets = path_store['{}_offsets'.format(path_criteria)]
+        if len(offsets) - 1 != len(flow_dataframe.index):
+            raise ValueError('Path store has {} flows, the flow dataframe has {}'.format(
+                len(offsets) - 1, len(flow_dataframe.index)))
+        edge_indexes = path_store['{}_indices'.format(path_criteria)]
+        edge_ids = path_store['edge_ids']
+    else:
+        paths = save_paths_df[path_criteria].values
+        path_lengths = np.fromiter((len(path) for path in paths), dtype=np.int64, count=num_flows)
+        offsets = np.concatenate(([0], np.cumsum(path_lengths)))
+        edge_indexes, edge_ids = pd.factorize(list(chain.from_iterable(paths)))
+        edge_ids = np.asarray(edge_ids.tolist())
+
+    flow_indexes = np.repeat(np.arange(num_flows), np.diff(offsets))
+    incidence = csr_matrix((np.ones(len(edge_indexes)), (edge_indexes, flow_indexes)),
+                           shape=(len(edge_ids), num_flows))
+    return edge_ids, incidence
+
+def get_edge_flows_from_paths(save_paths_df, path_criteria, industry_columns, path_store=None):
+    """Sum the OD flows of all commodities/industries on each edge of their paths
+
+    Computed as the product of the edge by OD flow incidence matrix and the
+    OD flow by commodity/industry tonnage matrix
+
+    Returns
+    -------
+    edge_flows - Pandas DataFrame of edge_id and summed flows of industry columns, for
+        edges on at least one path
+    """
+    edge_ids, incidence = flow_paths_incidence_matrix(save_paths_df, path_criteria, path_store=path_store)
+    used_edges = np.diff(incidence.indptr) > 0
+    tons = save_paths_df[industry_columns].fillna(0).values.astype(float)
+    edge_flows = pd.DataFrame(incidence[used_edges].dot(tons), columns=industry_columns)
+    edge_flows.insert(0, 'edge_id', edge_ids[used_edges])
+    return edge_flows
+
 def write_flow_paths_to_network_files(save_paths_df,
     min_industry_columns,
     max_industry_columns,
-    gdf_edges, save_csv=True, save_shapes=True, shape_output_path='',csv_output_path=''):
+    gdf_edges, save_csv=True, save_shapes=True, shape_output_path='',csv_output_path='',
+    path_store=None):
     """Write results to Shapefiles
 
     Outputs ``gdf_edges`` - a shapefile with minimum and maximum tonnage flows of all
@@ -321,59 +826,28 @@ def write_flow_paths_to_network_files(save_paths_df,
         Path where the output shapefile will be stored
     csv_output_path
         Path where the output csv file will be stored
+    path_store
+        Dictionary of CSR min-max edge paths of the OD flows, from load_flow_path_store,
+        to use instead of lists of edge ID's in the min_edge_path and max_edge_path columns
 
     """
-    edge_min_path_index = defaultdict(list)
-    edge_max_path_index = defaultdict(list)
-    for row in save_paths_df.itertuples():
-        for item in row.min_edge_path:
-            edge_min_path_index[item].append(row.Index)
-        for item in row.max_edge_path:
-            edge_max_path_index[item].append(row.Index)
-
-    edge_flows_min = []
-    edge_flows_max = []
-    for vals in edge_min_path_index.keys():
-        edge_flows = pd.DataFrame(list(zip([vals]*len(edge_min_path_index[vals]),edge_min_path_index[vals])),columns=['edge_id','path_index']).set_index('path_index')
-        edge_flows = edge_flows.join(save_paths_df, how='left').fillna(0)
-        edge_flows_min.append(edge_flows[['edge_id'] + min_industry_columns].groupby('edge_id')[min_industry_columns].sum().reset_index())
-        print ('Done with edge {} for min'.format(vals))
-
-    for vals in edge_max_path_index.keys():
-        edge_flows = pd.DataFrame(list(zip([vals]*len(edge_max_path_index[vals]),edge_max_path_index[vals])),columns=['edge_id','path_index']).set_index('path_index')
-        edge_flows = edge_flows.join(save_paths_df, how='left').fillna(0)
-        edge_flows_max.append(edge_flows[['edge_id'] + max_industry_columns].groupby('edge_id')[max_industry_columns].sum().reset_index())
-        print ('Done with edge {} for max'.format(vals))
-
-    if len(edge_flows_min) == 1:
-        edge_flows_min = edge_flows_min[0]
-    elif len(edge_flows_min) > 1:
-        edge_flows_min = pd.concat(edge_flows_min,axis=0,sort='False', ignore_index=True).groupby('edge_id')[min_industry_columns].sum().reset_index()
-
-    # print (edge_flows_min)
-
-    if len(edge_flows_max) == 1:
-        edge_flows_max = edge_flows_max[0]
-    elif len(edge_flows_max) > 1:
-        edge_flows_max = pd.concat(edge_flows_max,axis=0,sort='False', ignore_index=True).groupby('edge_id')[max_industry_columns].sum().reset_index()
-
-    # print (edge_flows_max)
+    edge_flows_min = get_edge_flows_from_paths(save_paths_df, 'min_edge_path', min_industry_columns,
+                                               path_store=path_store)
+    edge_flows_max = get_edge_flows_from_paths(save_paths_df, 'max_edge_path', max_industry_columns,
+                                               path_store=path_store)
+
     if min_industry_columns == max_industry_columns:
-        for ind in min_industry_columns:
-            edge_flows_min.rename(columns={ind:'min_'+ind},inplace=True)
-            edge_flows_max.rename(columns={ind:'max_'+ind},inplace=True)
+        edge_flows_min.rename(columns=dict([(ind,'min_'+ind) for ind in min_industry_columns]),inplace=True)
+        edge_flows_max.rename(columns=dict([(ind,'max_'+ind) for ind in max_industry_columns]),inplace=True)
 
     edge_flows = pd.merge(edge_flows_min,edge_flows_max,how='left',on=['edge_id']).fillna(0)
-    tqdm.pandas()
     if min_industry_columns == max_industry_columns:
         industry_columns = min_industry_columns
     else:
         industry_columns = [x[4:] for x in min_industry_columns]
 
     for ind in industry_columns:
-        edge_flows['swap'] = edge_flows.progress_apply(lambda x: swap_min_max(x,'min_{}'.format(ind),'max_{}'.format(ind)), axis = 1)
-        edge_flows[['min_{}'.format(ind),'max_{}'.format(ind)]] = edge_flows['swap'].apply(pd.Series)
-        edge_flows.drop('swap', axis=1, inplace=True)
+        edge_flows = swap_min_max_columns(edge_flows,'min_{}'.format(ind),'max_{}'.format(ind))
 
     gdf_edges = pd.merge(gdf_edges,edge_flows,how='left',on=['edge_id']).fillna(0)
 
@@ -387,10 +861,119 @@ def write_flow_paths_to_network_files(save_paths_df,
 
     del gdf_edges, save_paths_df
 
-def get_flow_paths_indexes_of_edges(flow_dataframe,path_criteria):
+def flow_path_source_signature(source_path):
+    """SHA-1 hash of the contents of the flow paths file a path store is made from
+    """
+    source_hash = hashlib.sha1()
+    with open(source_path, 'rb') as source_fh:
+        for block in iter(lambda: source_fh.read(1 << 20), b''):
+            source_hash.update(block)
+    return source_hash.hexdigest()
+
+def write_flow_path_store(store_path, flow_dataframe, path_columns, source_path=''):
+    """Save the edge paths of flows in compressed sparse row (CSR) form
+
+    For each path column the store holds an offsets array, with the paths of row i
+    starting at offsets[i] and ending at offsets[i+1], and an int32 array of indexes
+    into the edge ID's array shared by all path columns. The store also holds the
+    number of flows and the signature of the flow paths file it was made from, so it
+    is only used together with that file.
+
+    Parameters
+    ---------
+    store_path - Path of .npz file to save the paths to
+    flow_dataframe - Pandas DataFrame of flows with lists of edge ID's in path columns
+    path_columns - List of string names of path columns in flow dataframe
+    source_path - Path of the flow paths file of the flow dataframe - Default = '', no
+        signature is stored and the store never matches a flow paths file
+    """
+    path_edges = list(chain.from_iterable(
+        [chain.from_iterable(flow_dataframe[path_column].values) for path_column in path_columns]))
+    edge_indexes, edge_ids = pd.factorize(path_edges)
+    path_store = {'edge_ids': np.asarray(edge_ids.tolist()),
+                  'num_flows': np.asarray(len(flow_dataframe.index)),
+                  'source_signature': np.asarray(flow_path_source_signature(source_path) if source_path else '')}
+
+    start = 0
+    for path_column in path_columns:
+        path_lengths = np.fromiter((len(path) for path in flow_dataframe[path_column].values),
+                                   dtype=np.int64, count=len(flow_dataframe.index))
+        offsets = np.concatenate(([0], np.cumsum(path_lengths)))
+        path_store['{}_offsets'.format(path_column)] = offsets
+        path_store['{}_indices'.format(path_column)] = edge_indexes[start:start + offsets[-1]].astype(np.int32)
+        start += offsets[-1]
+
+    np.savez(store_path, **path_store)
+
+def load_flow_path_store(store_path, source_path=''):
+    """Load the edge paths of flows saved by write_flow_path_store
+
+    Parameters
+    ---------
+    store_path - Path of .npz file of the paths
+    source_path - Path of the flow paths file the store should be made from - Default =
+        '', the store is not checked
+
+    Returns
+    -------
+    path_store - Dictionary of edge_ids, and {path_column}_offsets and
+        {path_column}_indices arrays for each path column, or None if the store does
+        not exist or was made from another version of the flow paths file
+    """
+    if os.path.exists(store_path) == False:
+        return None
+    with np.load(store_path) as store:
+        path_store = dict([(key, store[key]) for key in store.files])
+
+    if source_path:
+        if 'source_signature' not in path_store or \
+                str(path_store['source_signature']) != flow_path_source_signature(source_path):
+            print ('* Path store {} does not match {}, the flow paths are parsed instead'.format(store_path, source_path))
+            return None
+    return path_store
+
+def get_flow_paths_from_store(path_store, path_criteria):
+    """Get the edge paths of flows as lists of edge ID's, in the order of flow rows
+    """
+    offsets = path_store['{}_offsets'.format(path_criteria)]
+    if len(offsets) == 1:
+        return []
+    path_edge_ids = path_store['edge_ids'][path_store['{}_indices'.format(path_criteria)]]
+    return [path.tolist() for path in np.split(path_edge_ids, offsets[1:-1])]
+
+def get_flow_paths_indexes_of_edges(flow_dataframe,path_criteria,path_store=None):
+    """Get the indexes of flows whose paths use each edge
+
+    Parameters
+    ---------
+    flow_dataframe - Pandas DataFrame of flows with paths in the path criteria column
+    path_criteria - String name of column of edge paths in flow dataframe
+    path_store - Dictionary of CSR edge paths of the flows, from load_flow_path_store -
+        Default = None to parse the stringified edge paths in the flow dataframe
+
+    Returns
+    -------
+    edge_path_index - Dictionary of edge ID's and lists of flow dataframe indexes
+    """
+    edge_path_index = defaultdict(list)
+    if path_store is not None:
+        offsets = path_store['{}_offsets'.format(path_criteria)]
+        if len(offsets) - 1 != len(flow_dataframe.index):
+            raise ValueError('Path store has {} flows, the flow dataframe has {}'.format(
+                len(offsets) - 1, len(flow_dataframe.index)))
+        edge_indexes = path_store['{}_indices'.format(path_criteria)]
+        path_rows = flow_dataframe.index.values[np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))]
+        edge_order = np.argsort(edge_indexes, kind='stable')
+        edge_indexes = edge_indexes[edge_order]
+        path_rows = path_rows[edge_order]
+        edges, edge_starts = np.unique(edge_indexes, return_index=True)
+        for edge_id, rows in zip(path_store['edge_ids'][edges].tolist(), np.split(path_rows, edge_starts[1:])):
+            edge_path_index[edge_id] = rows.tolist()
+
+        return edge_path_index
+
     tqdm.pandas()
     flow_dataframe[path_criteria] = flow_dataframe.progress_apply(lambda x:ast.literal_eval(x[path_criteria]),axis=1)
-    edge_path_index = defaultdict(list)
     for k,v in zip(chain.from_iterable(flow_dataframe[path_criteria].ravel()), flow_dataframe.index.repeat(flow_dataframe[path_criteria].str.len()).tolist()):
         edge_path_index[k].append(v)
 
@@ -398,21 +981,386 @@ def get_flow_paths_indexes_of_edges(flow_dataframe,path_criteria):
     return edge_path_index
 
 
+class FailureGraph():
+    """Network graph of a transport mode built once and reused for all failure scenarios
+
+    Instead of building a new graph without the failed edges for every scenario, the
+    failed edges are masked with an infinite cost while the scenario runs and their
+    costs are restored afterwards. Connected components of the network without the
+    failed edges are labelled from the edge endpoints, so the graph is never copied,
+    and OD pairs are found to be connected or isolated from the component labels of
+    their nodes.
+
+    Parameters
+    ---------
+    network_dataframe - Pandas DataFrame of network with from_node and to_node as the
+        first two columns, followed by the edge attributes
+    nodes_dataframe - GeoDataFrame of network nodes with node_id and Point geometries,
+        needed for 'astar' rerouting - Default = None
+    """
+    def __init__(self, network_dataframe, nodes_dataframe=None):
+        self.graph = ig.Graph.TupleList(network_dataframe.itertuples(
+            index=False), edge_attrs=list(network_dataframe.columns)[2:])
+        self.node_names = np.asarray(self.graph.vs['name'])
+        self.node_indexes = dict(zip(self.graph.vs['name'], range(self.graph.vcount())))
+        self.node_lookup = pd.Index(self.graph.vs['name'])
+        self.edge_endpoints = np.asarray(self.graph.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+        self.edge_indexes = defaultdict(list)
+        for e_index, edge_id in enumerate(self.graph.es['edge_id']):
+            self.edge_indexes[edge_id].append(e_index)
+        self.edge_attributes = EdgeAttributeTable(self.graph)
+        if nodes_dataframe is not None:
+            self.set_node_coordinates(nodes_dataframe)
+
+    def failed_edge_indexes(self, edge_failure_set):
+        """Get the graph edge indexes of a list of failed edge ID's
+        """
+        return list(chain.from_iterable(
+            [self.edge_indexes[edge_id] for edge_id in edge_failure_set if edge_id in self.edge_indexes]))
+
+    def masked_weights(self, cost_criteria):
+        """Name of the edge attribute holding the costs used for routing in failure scenarios
+        """
+        masked_criteria = 'masked_{}'.format(cost_criteria)
+        if masked_criteria not in self.graph.es.attributes():
+            self.graph.es[masked_criteria] = self.graph.es[cost_criteria]
+        return masked_criteria
+
+    def mask_edges(self, failed_edges, cost_criteria):
+        """Set an infinite routing cost on failed edges
+
+        Returns the name of the edge attribute to use as weights for routing
+        """
+        masked_criteria = self.masked_weights(cost_criteria)
+        if failed_edges:
+            self.graph.es[failed_edges][masked_criteria] = float('inf')
+        return masked_criteria
+
+    def restore_edges(self, failed_edges, cost_criteria):
+        """Restore the routing cost of failed edges after a scenario
+        """
+        masked_criteria = self.masked_weights(cost_criteria)
+        if failed_edges:
+            edges = self.graph.es[failed_edges]
+            edges[masked_criteria] = edges[cost_criteria]
+
+    def set_node_coordinates(self, nodes_dataframe, id_column='node_id'):
+        """Add the longitude and latitude of nodes, used to guide A* rerouting
+
+        Parameters
+        ---------
+        nodes_dataframe - GeoDataFrame of network nodes with Point geometries in WGS-84
+        id_column - String name of node ID column - Default = 'node_id'
+        """
+        node_positions = self.node_lookup.get_indexer(nodes_dataframe[id_column].values)
+        in_graph = node_positions >= 0
+        self.node_coordinates = np.full((len(self.node_names), 2), np.nan)
+        self.node_coordinates[node_positions[in_graph]] = np.array(
+            [(point.x, point.y) for point in nodes_dataframe.geometry.values[in_graph]]).reshape(-1, 2)
+        self.cost_per_km = {}
+
+    def cost_lower_bounds(self, target, cost_criteria):
+        """Estimate a lower bound of the cost of reaching a target node from every node
+
+        The great circle distance to the target is multiplied by the lowest cost per km
+        of any edge, so the estimates never exceed the true shortest path costs and
+        can be used as an admissible A* heuristic. Nodes without coordinates get 0.
+        """
+        if cost_criteria not in self.cost_per_km:
+            lengths = self.edge_attributes.values('length').astype(float)
+            costs = self.edge_attributes.values(cost_criteria).astype(float)
+            with_length = lengths > 0
+            if with_length.any():
+                self.cost_per_km[cost_criteria] = max(0, np.min(costs[with_length]/lengths[with_length]))
+            else:
+                self.cost_per_km[cost_criteria] = 0
+
+        lons = np.radians(self.node_coordinates[:, 0])
+        lats = np.radians(self.node_coordinates[:, 1])
+        a = np.sin(0.5*(lats - lats[target]))**2 + \
+            np.cos(lats)*np.cos(lats[target])*np.sin(0.5*(lons - lons[target]))**2
+        # Spherical distances are reduced slightly to stay below ellipsoidal edge lengths
+        distances = 0.995*2*6371.0088*np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+        return np.nan_to_num(self.cost_per_km[cost_criteria]*distances)
+
+    def path_nodes(self, origin, edge_path):
+        """Get the sequence of node indexes along a path of edge ID's starting at an origin node
+
+        Returns None if the origin or an edge is not in the graph, or the edges do not
+        form a path from the origin
+        """
+        if origin not in self.node_indexes:
+            return None
+        nodes = [self.node_indexes[origin]]
+        for edge_id in edge_path:
+            if edge_id not in self.edge_indexes:
+                return None
+            from_node, to_node = self.edge_endpoints[self.edge_indexes[edge_id][0]]
+            if from_node == nodes[-1]:
+                nodes.append(to_node)
+            elif to_node == nodes[-1]:
+                nodes.append(from_node)
+            else:
+                return None
+        return nodes
+
+    def remove_path_loops(self, origin_node, path):
+        """Remove the loops of a path of graph edge indexes starting at an origin node index,
+        so that no node is visited twice
+        """
+        nodes = [origin_node]
+        node_positions = {origin_node: 0}
+        edges = []
+        for e_index in path:
+            from_node, to_node = self.edge_endpoints[e_index]
+            next_node = to_node if from_node == nodes[-1] else from_node
+            if next_node in node_positions:
+                position = node_positions[next_node]
+                for node in nodes[position + 1:]:
+                    del node_positions[node]
+                nodes = nodes[:position + 1]
+                edges = edges[:position]
+            else:
+                node_positions[next_node] = len(nodes)
+                nodes.append(next_node)
+                edges.append(e_index)
+        return edges
+
+    def component_membership(self, failed_edges):
+        """Label the connected component of each node in the network without the failed edges
+        """
+        keep = np.ones(len(self.edge_endpoints), dtype=bool)
+        keep[failed_edges] = False
+        num_nodes = len(self.node_names)
+        adjacency = csr_matrix((np.ones(keep.sum()),
+                                (self.edge_endpoints[keep, 0], self.edge_endpoints[keep, 1])),
+                               shape=(num_nodes, num_nodes))
+        _, membership = connected_components(adjacency, directed=False)
+        return membership
+
+    def node_components(self, membership, node_ids):
+        """Look up the connected component labels of an array of node ID's
+
+        Returns an array of component labels, with -1 for nodes not in the network
+        """
+        node_positions = self.node_lookup.get_indexer(node_ids)
+        return np.where(node_positions >= 0, membership[node_positions], -1)
+
+
+def group_od_pairs_by_origin(od_flows):
+    """Group the rows of OD pairs by their origin
+
+    Returns
+    -------
+    od_groups - List of tuples of origin node ID and array of row positions of its OD pairs
+    """
+    origin_codes, origins = pd.factorize(od_flows['origin_id'].values)
+    row_order = np.argsort(origin_codes, kind='stable')
+    group_ends = np.cumsum(np.bincount(origin_codes, minlength=len(origins)))
+    return list(zip(origins.tolist(), np.split(row_order, group_ends[:-1]))) if len(origins) > 0 else []
+
+def reroute_od_flows(failure_graph, od_flows, weights, cost_criteria, time_criteria, new_path=True,
+    routing='dijkstra', failed_edges=None, path_criteria=None):
+    """Estimate the new routes of a set of OD pairs
+
+    The routes are found as graph edge indexes, with one shortest path search per origin
+    for 'dijkstra' routing as in the per component rerouting it replaces, and the route
+    attributes of all OD pairs are summed in one pass with EdgeAttributeTable.path_sums.
+    Routes are found even when new_path is False, as the distance and time are summed
+    along the least cost route, only their conversion to edge ID's is skipped.
+
+    Parameters
+    ---------
+    failure_graph - FailureGraph of network, with failed edges masked
+    od_flows - Pandas DataFrame of OD pairs with origin_id and destination_id columns
+    weights - String name of edge attribute of routing costs, from FailureGraph.mask_edges
+    cost_criteria - String name of edge attribute of generalised costs to sum along routes
+    time_criteria - String name of edge attribute of travel times to sum along routes
+    new_path - Boolean condition to return the edge ID's of the routes
+    routing - String name of rerouting mode - Default = 'dijkstra':
+        - 'dijkstra' - exhaustive search, with one shortest path search per origin
+        - 'astar' - A* search per OD pair guided by the great circle distance to the
+          destination, which gives the same route costs as 'dijkstra' but explores only
+          the nodes towards the destination. Needs FailureGraph.set_node_coordinates
+        - 'detour_heuristic' - keep the original route and replace the part between the
+          failed edges with the shortest detour between their end nodes, without loops.
+          The detours of all OD pairs crossing the same failed edges are shared. This is
+          a heuristic: the route costs are upper bounds of the 'dijkstra' route costs, as
+          a better route may leave the original route before the failure. OD pairs whose
+          original route is not a path of the graph are rerouted as with 'dijkstra'.
+          Needs failed_edges and path_criteria
+    failed_edges - List of graph edge indexes of failed edges, for 'detour_heuristic' routing
+    path_criteria - String name of column of original edge paths in od_flows, for
+        'detour_heuristic' routing
+
+    Returns
+    -------
+    reroutes - Dictionary of lists of new_distance, new_time, new_gcost and new_path values
+        in the order of the OD pairs, with empty new_path lists if new_path is False
+    """
+    if routing == 'dijkstra':
+        paths = od_shortest_paths(failure_graph, od_flows, weights)
+    elif routing == 'astar':
+        paths = od_astar_paths(failure_graph, od_flows, weights, cost_criteria)
+    elif routing == 'detour_heuristic':
+        paths = od_detour_paths(failure_graph, od_flows, weights, failed_edges, path_criteria)
+    else:
+        raise ValueError('Routing must be dijkstra, astar or detour_heuristic')
+
+    path_sums = failure_graph.edge_attributes.path_sums(paths, ['length', time_criteria, cost_criteria])
+    if new_path == True:
+        new_paths = failure_graph.edge_attributes.path_edge_ids(paths)
+    else:
+        new_paths = [[] for p in range(len(paths))]
+
+    return {'new_distance': path_sums['length'].tolist(),
+            'new_time': path_sums[time_criteria].tolist(),
+            'new_gcost': path_sums[cost_criteria].tolist(),
+            'new_path': new_paths}
+
+def od_shortest_paths(failure_graph, od_flows, weights):
+    """Get the shortest paths of OD pairs as lists of graph edge indexes, with one
+    shortest path search per origin
+    """
+    destinations = od_flows['destination_id'].values
+    paths = [[]]*len(od_flows.index)
+    for origin, od_rows in group_od_pairs_by_origin(od_flows):
+        origin_paths = failure_graph.graph.get_shortest_paths(
+            failure_graph.node_indexes[origin],
+            [failure_graph.node_indexes[d] for d in destinations[od_rows].tolist()],
+            weights=weights, output="epath")
+        for od_row, path in zip(od_rows.tolist(), origin_paths):
+            paths[od_row] = path
+
+    return paths
+
+def od_astar_paths(failure_graph, od_flows, weights, cost_criteria):
+    """Get the shortest paths of OD pairs as lists of graph edge indexes, with one A*
+    search per OD pair and one heuristic estimate per destination
+    """
+    origins = od_flows['origin_id'].values
+    destination_flows = od_flows.rename(columns={'origin_id': 'destination_id',
+                                                 'destination_id': 'origin_id'})
+    paths = [[]]*len(od_flows.index)
+    for destination, od_rows in group_od_pairs_by_origin(destination_flows):
+        target = failure_graph.node_indexes[destination]
+        lower_bounds = failure_graph.cost_lower_bounds(target, cost_criteria)
+        for od_row in od_rows.tolist():
+            paths[od_row] = failure_graph.graph.get_shortest_path_astar(
+                failure_graph.node_indexes[origins[od_row]], target,
+                lambda graph, node, target: lower_bounds[node],
+                weights=weights, output="epath")
+
+    return paths
+
+def od_detour_paths(failure_graph, od_flows, weights, failed_edges, path_criteria):
+    """Get the paths of OD pairs as lists of graph edge indexes, by replacing the failed
+    part of their original paths with the shortest detour around it
+
+    This is the 'detour_heuristic' routing of reroute_od_flows, which gives upper bounds
+    of the shortest path costs. OD pairs whose original path cannot be followed in the
+    graph get their shortest path instead.
+    """
+    failed_edge_ids = set([failure_graph.graph.es[e]['edge_id'] for e in failed_edges])
+    detour_ends = []
+    original_paths = []
+    full_search = []
+    for od_row, value in enumerate(od_flows[['origin_id', path_criteria]].itertuples(index=False)):
+        edge_path = value[1]
+        if isinstance(edge_path, str):
+            edge_path = ast.literal_eval(edge_path)
+        path_nodes = failure_graph.path_nodes(value[0], edge_path)
+        failed_positions = [p for p in range(len(edge_path)) if edge_path[p] in failed_edge_ids]
+        if path_nodes is None or not failed_positions:
+            full_search.append(od_row)
+            detour_ends.append(None)
+            original_paths.append(([], []))
+        else:
+            edge_indexes = [failure_graph.edge_indexes[e][0] for e in edge_path]
+            detour_ends.append((path_nodes[failed_positions[0]], path_nodes[failed_positions[-1] + 1]))
+            original_paths.append((edge_indexes[:failed_positions[0]], edge_indexes[failed_positions[-1] + 1:]))
+
+    detour_flows = list(set([ends for ends in detour_ends if ends is not None]))
+    detours = {}
+    if detour_flows:
+        detour_nodes = np.array(detour_flows, dtype=np.int64)
+        detour_paths = od_shortest_paths(failure_graph,
+                                         pd.DataFrame({'origin_id': failure_graph.node_names[detour_nodes[:, 0]],
+                                                       'destination_id': failure_graph.node_names[detour_nodes[:, 1]]}),
+                                         weights)
+        detours = dict(zip(detour_flows, detour_paths))
+
+    origins = od_flows['origin_id'].values
+    paths = []
+    for od_row, (ends, (path_start, path_end)) in enumerate(zip(detour_ends, original_paths)):
+        if ends is None:
+            paths.append([])
+        else:
+            paths.append(failure_graph.remove_path_loops(failure_graph.node_indexes[origins[od_row]],
+                                                         path_start + detours[ends] + path_end))
+
+    if full_search:
+        shortest_paths = od_shortest_paths(failure_graph, od_flows.iloc[full_search], weights)
+        for od_row, path in zip(full_search, shortest_paths):
+            paths[od_row] = path
+
+    return paths
+
+def compare_rerouting_modes(failure_graph, edge_failure_set, od_flows, cost_criteria, time_criteria,
+    routing, path_criteria=None):
+    """Check a rerouting mode against the exhaustive 'dijkstra' rerouting
+
+    Parameters
+    ---------
+    failure_graph - FailureGraph of network
+    edge_failure_set - List of string edge ID's
+    od_flows - Pandas DataFrame of disrupted OD pairs that stay connected after the failure
+    cost_criteria - String name of edge attribute of generalised costs
+    time_criteria - String name of edge attribute of travel times
+    routing - String name of rerouting mode to check, 'astar' or 'detour_heuristic'
+    path_criteria - String name of column of original edge paths in od_flows, for
+        'detour_heuristic' routing
+
+    Returns
+    -------
+    od_flows - Pandas DataFrame of OD pairs with the dijkstra_gcost and {routing}_gcost
+        route costs, and gcost_diff - Float difference of the {routing} and dijkstra costs
+    """
+    failed_edges = failure_graph.failed_edge_indexes(edge_failure_set)
+    weights = failure_graph.mask_edges(failed_edges, cost_criteria)
+    try:
+        exhaustive = reroute_od_flows(failure_graph, od_flows, weights, cost_criteria, time_criteria,
+                                      new_path=False)
+        checked = reroute_od_flows(failure_graph, od_flows, weights, cost_criteria, time_criteria,
+                                   new_path=False, routing=routing, failed_edges=failed_edges,
+                                   path_criteria=path_criteria)
+    finally:
+        failure_graph.restore_edges(failed_edges, cost_criteria)
+
+    od_flows = od_flows[['origin_id', 'destination_id']].copy()
+    od_flows['dijkstra_gcost'] = exhaustive['new_gcost']
+    od_flows['{}_gcost'.format(routing)] = checked['new_gcost']
+    od_flows['gcost_diff'] = od_flows['{}_gcost'.format(routing)] - od_flows['dijkstra_gcost']
+    return od_flows
+
 def igraph_scenario_edge_failures_new(network_df_in, edge_failure_set,
     flow_dataframe,edge_flow_path_indexes, path_criteria,
-    tons_criteria, cost_criteria, time_criteria,transport_mode,new_path = True):
+    tons_criteria, cost_criteria, time_criteria,transport_mode,new_path = True,routing = 'dijkstra'):
     """Estimate network impacts of each failures
     When the tariff costs of each path are fixed by vehicle weight
 
     Parameters
     ---------
-    network_df_in - Pandas DataFrame of network
+    network_df_in - Pandas DataFrame of network, or FailureGraph of network built once
+        for all scenarios
     edge_failure_set - List of string edge ID's
     flow_dataframe - Pandas DataFrame of list of edge paths
     path_criteria - String name of column of edge paths in flow dataframe
     tons_criteria - String name of column of path tons in flow dataframe
     cost_criteria - String name of column of path costs in flow dataframe
     time_criteria - String name of column of path travel time in flow dataframe
+    routing - String name of rerouting mode, 'dijkstra', 'astar' or 'detour_heuristic', see
+        reroute_od_flows - Default = 'dijkstra'
 
 
     Returns
@@ -431,76 +1379,45 @@ def igraph_scenario_edge_failures_new(network_df_in, edge_failure_set,
     edge_fail_dictionary = []
     # network_df,edge_path_index = identify_all_failure_paths(network_df_in,edge_failure_set,flow_dataframe,path_criteria)
 
-    edge_path_index = list(set(list(chain.from_iterable([path_idx for path_key,path_idx in edge_flow_path_indexes.items() if path_key in edge_failure_set]))))
+    edge_path_index = list(set(list(chain.from_iterable([edge_flow_path_indexes[path_key] for path_key in edge_failure_set if path_key in edge_flow_path_indexes]))))
 
     if edge_path_index:
         select_flows = flow_dataframe[flow_dataframe.index.isin(edge_path_index)]
         del edge_path_index
-        network_graph = ig.Graph.TupleList(network_df_in[~network_df_in['edge_id'].isin(edge_failure_set)].itertuples(
-            index=False), edge_attrs=list(network_df_in.columns)[2:])
+        if isinstance(network_df_in, FailureGraph):
+            failure_graph = network_df_in
+        else:
+            failure_graph = FailureGraph(network_df_in)
+        failed_edges = failure_graph.failed_edge_indexes(edge_failure_set)
 
         first_edge_id = edge_failure_set[0]
         del edge_failure_set
-        A = sorted(network_graph.clusters().subgraphs(),key=lambda l:len(l.es['edge_id']),reverse=True)
-        access_flows = []
+        weights = failure_graph.mask_edges(failed_edges, cost_criteria)
         edge_fail_dictionary = []
-        for i in range(len(A)):
-            network_graph = A[i]
-            nodes_name = np.asarray([x['name'] for x in network_graph.vs])
-            po_access = select_flows[(select_flows['origin_id'].isin(nodes_name)) & (
-                    select_flows['destination_id'].isin(nodes_name))]
-
-            if len(po_access.index) > 0:
-                po_access = po_access.set_index('origin_id')
-                origins = list(set(po_access.index.values.tolist()))
-                for o in range(len(origins)):
-                    origin = origins[o]
-                    destinations = po_access.loc[[origin], 'destination_id'].values.tolist()
-                    tons = po_access.loc[[origin], tons_criteria].values.tolist()
-                    paths = network_graph.get_shortest_paths(
-                        origin, destinations, weights=cost_criteria, output="epath")
-                    if new_path == True:
-                        for p in range(len(paths)):
-                            new_dist = 0
-                            new_time = 0
-                            new_gcost = 0
-                            new_path = []
-                            for n in paths[p]:
-                                new_dist += network_graph.es[n]['length']
-                                new_time += network_graph.es[n][time_criteria]
-                                new_gcost += network_graph.es[n][cost_criteria]
-                                new_path.append(network_graph.es[n]['edge_id'])
-                            edge_fail_dictionary.append({'edge_id': first_edge_id, 'origin_id': origin, 'destination_id': destinations[p],
-                                                         'new_path':new_path,'new_distance': new_dist, 'new_time': new_time,
-                                                         'new_cost': tons[p]*new_gcost, 'no_access': 0})
-                    else:
-                        for p in range(len(paths)):
-                            new_dist = 0
-                            new_time = 0
-                            new_gcost = 0
-                            for n in paths[p]:
-                                new_dist += network_graph.es[n]['length']
-                                new_time += network_graph.es[n][time_criteria]
-                                new_gcost += network_graph.es[n][cost_criteria]
-                            edge_fail_dictionary.append({'edge_id': first_edge_id, 'origin_id': origin, 'destination_id': destinations[p],
-                                                         'new_path':[],'new_distance': new_dist, 'new_time': new_time,
-                                                         'new_cost': tons[p]*new_gcost, 'no_access': 0})
-                    del destinations, tons, paths
-                del origins
-                po_access = po_access.reset_index()
-                po_access['access'] = 1
-                access_flows.append(po_access[['origin_id','destination_id','access']])
-            del po_access
-
-        del A
-
-        if len(access_flows):
-            access_flows = pd.concat(access_flows,axis=0,sort='False', ignore_index=True)
-            select_flows = pd.merge(select_flows,access_flows,how='left',on=['origin_id','destination_id']).fillna(0)
-        else:
-            select_flows['access'] = 0
-
-        no_access = select_flows[select_flows['access'] == 0]
+        try:
+            membership = failure_graph.component_membership(failed_edges)
+            origin_components = failure_graph.node_components(membership, select_flows['origin_id'].values)
+            destination_components = failure_graph.node_components(membership, select_flows['destination_id'].values)
+            access = (origin_components >= 0) & (origin_components == destination_components)
+            del membership, origin_components, destination_components
+
+            access_flows = select_flows[access]
+            if len(access_flows.index) > 0:
+                reroutes = reroute_od_flows(failure_graph, access_flows, weights,
+                                            cost_criteria, time_criteria, new_path=new_path,
+                                            routing=routing, failed_edges=failed_edges,
+                                            path_criteria=path_criteria)
+                new_costs = (access_flows[tons_criteria].values*np.asarray(reroutes['new_gcost'])).tolist()
+                for p, value in enumerate(access_flows[['origin_id','destination_id']].itertuples(index=False)):
+                    edge_fail_dictionary.append({'edge_id': first_edge_id, 'origin_id': value.origin_id, 'destination_id': value.destination_id,
+                                                 'new_path':reroutes['new_path'][p],'new_distance': reroutes['new_distance'][p],
+                                                 'new_time': reroutes['new_time'][p], 'new_cost': new_costs[p], 'no_access': 0})
+                del reroutes, new_costs
+            del access_flows
+        finally:
+            failure_graph.restore_edges(failed_edges, cost_criteria)
+
+        no_access = select_flows[~access]
         if len(no_access.index) > 0:
             for value in no_access.itertuples():
                 edge_fail_dictionary.append({'edge_id': first_edge_id, 'origin_id': getattr(value,'origin_id'),
@@ -511,6 +1428,194 @@ def igraph_scenario_edge_failures_new(network_df_in, edge_failure_set,
 
     return edge_fail_dictionary
 
+def _init_failure_worker(network_dataframe, nodes_dataframe, flow_dataframe, edge_flow_path_indexes,
+    path_criteria, tons_criteria, cost_criteria, time_criteria, transport_mode, new_path, routing):
+    """Store the shared inputs of the failure analysis once in each worker process
+    """
+    global _failure_worker_inputs
+    _failure_worker_inputs = {
+        'network_df_in': FailureGraph(network_dataframe, nodes_dataframe=nodes_dataframe),
+        'flow_dataframe': flow_dataframe,
+        'edge_flow_path_indexes': edge_flow_path_indexes,
+        'path_criteria': path_criteria,
+        'tons_criteria': tons_criteria,
+        'cost_criteria': cost_criteria,
+        'time_criteria': time_criteria,
+        'transport_mode': transport_mode,
+        'new_path': new_path,
+        'routing': routing
+    }
+
+def _run_failure_scenario(edge_failure_set):
+    """Estimate the failure impacts of one scenario with the inputs stored in the worker
+    """
+    if isinstance(edge_failure_set,list) == False:
+        edge_failure_set = [edge_failure_set]
+
+    return igraph_scenario_edge_failures_new(edge_failure_set=edge_failure_set,
+                                             **_failure_worker_inputs)
+
+class ScenarioResultCache():
+    """Store of failure scenario results on disk, addressed by the hash of their inputs
+
+    A scenario key is the hash of the version of the network attributes used for
+    routing, the failed edges, the affected OD flows and their edge paths, and the failure
+    criteria and routing mode, so cached results stay valid until one of these inputs
+    changes.
+
+    Parameters
+    ---------
+    cache_path - Path of the directory where results are stored as json files
+    """
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        if os.path.exists(self.cache_path) == False:
+            os.makedirs(self.cache_path)
+
+    def network_version(self, network_dataframe, attribute_columns):
+        """Hash of the topology and routing attributes of the network
+        """
+        network_columns = list(network_dataframe.columns)[:2] + ['edge_id'] + attribute_columns
+        return self._hash(network_dataframe[network_columns])
+
+    def scenario_key(self, network_version, edge_failure_set, flow_dataframe,
+        edge_flow_path_indexes, scenario_criteria, path_criteria=None):
+        """Hash of the inputs of a failure scenario
+
+        Parameters
+        ---------
+        network_version - String hash of the network from network_version
+        edge_failure_set - List of string edge ID's
+        flow_dataframe - Pandas DataFrame of OD flows
+        edge_flow_path_indexes - Dictionary of edge ID's and the indexes of flow paths using them
+        scenario_criteria - List of the column names and options of the failure analysis,
+            starting with the tons column and including the routing mode
+        path_criteria - String name of column of edge paths of the OD flows, which the
+            'detour_heuristic' routing starts from - Default = None, paths are not hashed
+        """
+        edge_path_index = sorted(set(chain.from_iterable(
+            [edge_flow_path_indexes[path_key] for path_key in edge_failure_set if path_key in edge_flow_path_indexes])))
+        select_flows = flow_dataframe.loc[edge_path_index, ['origin_id', 'destination_id', scenario_criteria[0]]]
+        if path_criteria is not None:
+            select_flows[path_criteria] = flow_dataframe.loc[edge_path_index, path_criteria].astype(str)
+        return hashlib.sha1('|'.join([network_version,
+                                      json.dumps([str(e) for e in edge_failure_set]),
+                                      json.dumps([str(c) for c in scenario_criteria]),
+                                      self._hash(select_flows)]).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Load the results of a scenario, or None if they are not cached
+        """
+        result_file = self._result_file(key)
+        if os.path.exists(result_file):
+            with open(result_file, 'r') as result_fh:
+                return json.load(result_fh)
+        return None
+
+    def put(self, key, edge_fail_dictionary):
+        """Save the results of a scenario, replacing the file only once it is complete
+        """
+        result_file = self._result_file(key)
+        if os.path.exists(os.path.dirname(result_file)) == False:
+            os.makedirs(os.path.dirname(result_file), exist_ok=True)
+        with open(result_file + '.tmp', 'w') as result_fh:
+            json.dump(edge_fail_dictionary, result_fh)
+        os.replace(result_file + '.tmp', result_file)
+
+    def _result_file(self, key):
+        return os.path.join(self.cache_path, key[:2], '{}.json'.format(key))
+
+    def _hash(self, dataframe):
+        return hashlib.sha1(pd.util.hash_pandas_object(dataframe, index=False).values.tobytes()).hexdigest()
+
+def run_edge_failure_scenarios(network_dataframe, edge_failure_scenarios,
+    flow_dataframe, edge_flow_path_indexes, path_criteria,
+    tons_criteria, cost_criteria, time_criteria, transport_mode, new_path=True,
+    num_processes=None, chunk_size=10, cache_path='', routing='dijkstra', nodes_dataframe=None):
+    """Estimate network impacts of a list of failure scenarios on a pool of processes
+
+    The network, flow paths and edge path indexes are sent to each worker process once,
+    where the network graph is built once as a FailureGraph, and only the failed edges
+    are sent with each task. Results are collected in the order
+    of the failure scenarios as soon as each chunk of scenarios is done.
+
+    If a cache path is given, scenarios whose inputs have not changed since they were
+    last estimated are read from the ScenarioResultCache instead of being run again,
+    and the results of the scenarios that are run are added to the cache.
+
+    Parameters
+    ---------
+    network_dataframe - Pandas DataFrame of network
+    edge_failure_scenarios - List of failed edge ID's or lists of failed edge ID's
+    flow_dataframe - Pandas DataFrame of list of edge paths
+    edge_flow_path_indexes - Dictionary of edge ID's and the indexes of flow paths using them
+    path_criteria - String name of column of edge paths in flow dataframe
+    tons_criteria - String name of column of path tons in flow dataframe
+    cost_criteria - String name of column of path costs in flow dataframe
+    time_criteria - String name of column of path travel time in flow dataframe
+    transport_mode - String name of transport mode
+    new_path - Boolean condition to estimate the edge paths of rerouted flows
+    num_processes - Integer number of worker processes - Default = None for all cores,
+        1 to run the scenarios serially in this process
+    chunk_size - Integer number of scenarios sent to a worker at a time - Default = 10
+    cache_path - Path of the directory of cached scenario results - Default = '' for no cache
+    routing - String name of rerouting mode, 'dijkstra', 'astar' or 'detour_heuristic', see
+        reroute_od_flows - Default = 'dijkstra'
+    nodes_dataframe - GeoDataFrame of network nodes with node_id and Point geometries,
+        needed for 'astar' rerouting - Default = None
+
+    Returns
+    -------
+    edge_failure_dictionary : list[dict]
+        Failure results of all scenarios, as given by igraph_scenario_edge_failures_new
+    """
+    shared_inputs = (network_dataframe, nodes_dataframe, flow_dataframe, edge_flow_path_indexes,
+                    path_criteria, tons_criteria, cost_criteria, time_criteria,
+                    transport_mode, new_path, routing)
+    num_scenarios = len(edge_failure_scenarios)
+    scenario_results = [None]*num_scenarios
+    if cache_path:
+        scenario_cache = ScenarioResultCache(cache_path)
+        network_version = scenario_cache.network_version(network_dataframe,
+                                                         ['length', time_criteria, cost_criteria])
+        scenario_criteria = [tons_criteria, cost_criteria, time_criteria, new_path, routing]
+        scenario_keys = []
+        for f_edge in range(num_scenarios):
+            fail_edge = edge_failure_scenarios[f_edge]
+            if isinstance(fail_edge,list) == False:
+                fail_edge = [fail_edge]
+            scenario_keys.append(scenario_cache.scenario_key(network_version, fail_edge,
+                                    flow_dataframe, edge_flow_path_indexes, scenario_criteria,
+                                    path_criteria=path_criteria))
+            scenario_results[f_edge] = scenario_cache.get(scenario_keys[-1])
+
+    run_scenarios = [f_edge for f_edge in range(num_scenarios) if scenario_results[f_edge] is None]
+    print ('Number of failure scenarios to run {} out of {}'.format(len(run_scenarios), num_scenarios))
+    if run_scenarios and num_processes == 1:
+        _init_failure_worker(*shared_inputs)
+        results = map(_run_failure_scenario, [edge_failure_scenarios[f_edge] for f_edge in run_scenarios])
+        for f_edge, ef_dict in zip(run_scenarios, results):
+            scenario_results[f_edge] = ef_dict
+            if cache_path:
+                scenario_cache.put(scenario_keys[f_edge], ef_dict)
+            print('Done with mode {0} edge {1} out of {2}'.format(transport_mode, f_edge, num_scenarios))
+    elif run_scenarios:
+        with multiprocessing.Pool(processes=num_processes,
+                                  initializer=_init_failure_worker,
+                                  initargs=shared_inputs) as pool:
+            results = pool.imap(_run_failure_scenario,
+                                [edge_failure_scenarios[f_edge] for f_edge in run_scenarios],
+                                chunksize=chunk_size)
+            for f_edge, ef_dict in zip(run_scenarios, results):
+                scenario_results[f_edge] = ef_dict
+                if cache_path:
+                    scenario_cache.put(scenario_keys[f_edge], ef_dict)
+                print('Done with mode {0} edge {1} out of {2}'.format(transport_mode, f_edge, num_scenarios))
+
+    edge_fail_dictionary = list(chain.from_iterable(scenario_results))
+    del scenario_results
+    return edge_fail_dictionary
+
 
 def rearrange_minmax_values(edge_failure_dataframe):
     """Write results to Shapefiles
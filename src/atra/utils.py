@@ -1,9 +1,11 @@
 """Shared plotting functions
 """
 import csv
+import hashlib
 import json
 import math
 import os
+import re
 
 from collections import namedtuple, OrderedDict
 
@@ -14,17 +16,20 @@ import geopandas as gpd
 import matplotlib.patches as mpatches
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
+import rasterio
 
 from boltons.iterutils import pairwise
-from geopy.distance import vincenty
+from geopy.distance import ELLIPSOIDS
 from osgeo import gdal
 
 import shapely.geometry
 import shapely.ops
 from boltons.iterutils import pairwise
 from colour import Color
-from geopy.distance import vincenty
+from geopy.distance import ELLIPSOIDS
 from osgeo import gdal
+from rasterio.windows import Window
 from scipy.spatial import Voronoi
 from shapely.geometry import Polygon, shape
 
@@ -55,7 +60,7 @@ def transform_geo_file(source_file, sink_file, sink_schema, transform_record):
         if any(source.crs):
             crs = source.crs
         else:
-            crs = {'init': 'epsg:4326'}
+            crs = 'epsg:4326'
         with fiona.open(
                 sink_file,
                 'w',
@@ -318,32 +323,252 @@ def round_sf(x, places=1):
     return rounded * sign
 
 
-def get_data(filename):
-    """Read in data (as array) and extent of each raster
+def get_raster_window(dataset, bounds=None):
+    """Window of a rasterio dataset covering bounds, clipped to the raster
+
+    Args:
+        dataset: open rasterio dataset.
+
+        bounds: (xmin, ymin, xmax, ymax) in the projection of the raster. Default is the
+        whole raster.
+
+    Returns:
+        rasterio Window, of zero width or height when bounds miss the raster.
     """
-    gdal.UseExceptions()
-    ds = gdal.Open(filename)
-    data = ds.ReadAsArray()
-    data[data < 0] = 0
+    full_window = Window(0, 0, dataset.width, dataset.height)
+    if bounds is None:
+        return full_window
+    window = rasterio.windows.from_bounds(*bounds, transform=dataset.transform)
+    window = window.round_offsets(op='floor').round_lengths(op='ceil')
+    col_off, row_off = max(window.col_off, 0), max(window.row_off, 0)
+    col_end = min(window.col_off + window.width, dataset.width)
+    row_end = min(window.row_off + window.height, dataset.height)
+    return Window(col_off, row_off, max(col_end - col_off, 0), max(row_end - row_off, 0))
+
+
+def get_data(filename, bounds=None, max_size=None):
+    """Read in data (as array) and extent of each raster
 
-    gt = ds.GetGeoTransform()
+    Only the window of the raster covering bounds is read, and when max_size is given
+    the window is read decimated to at most max_size pixels along each side, from the
+    raster overviews where they exist, so memory does not grow with the raster size.
 
-    # get the edge coordinates
-    width = ds.RasterXSize
-    height = ds.RasterYSize
-    xres = gt[1]
-    yres = gt[5]
+    Args:
+        filename: path of the raster file.
+
+        bounds: (xmin, ymin, xmax, ymax) of the area to read, e.g. a map extent. Default
+        is the whole raster.
 
-    xmin = gt[0]
-    xmax = gt[0] + (xres * width)
-    ymin = gt[3] + (yres * height)
-    ymax = gt[3]
+        max_size: maximum number of pixels along each side of the data read. Default is
+        the full resolution.
 
+    Returns:
+        data array and (xmin, xmax, ymax, ymin) extent of the data.
+    """
+    with rasterio.open(filename) as ds:
+        window = get_raster_window(ds, bounds)
+        out_shape = (int(window.height), int(window.width))
+        if max_size and max(out_shape) > max_size:
+            scale = float(max_size)/max(out_shape)
+            out_shape = (max(int(round(out_shape[0]*scale)), 1), max(int(round(out_shape[1]*scale)), 1))
+        if ds.count == 1:
+            data = ds.read(1, window=window, out_shape=out_shape)
+        else:
+            data = ds.read(window=window, out_shape=(ds.count,) + out_shape)
+        xmin, ymax = ds.transform * (window.col_off, window.row_off)
+        xmax, ymin = ds.transform * (window.col_off + window.width, window.row_off + window.height)
+
+    data[data < 0] = 0
     lat_lon_extent = (xmin, xmax, ymax, ymin)
 
     return data, lat_lon_extent
 
 
+class HazardCatalogue():
+    """Index of the hazard GeoTiff files under a directory
+
+    Each raster is indexed by hazard type, return period, climate scenario and bounding
+    box from its name, directory and header, without reading its data. The data is then
+    read for an area only, in tiles or at an overview level.
+
+    Args:
+        hazard_dir: directory of the hazard rasters, e.g. flood_data/FATHOM, whose
+        subdirectories name the climate scenarios.
+
+    Attributes:
+        rasters: DataFrame of file_path, file_name, hazard_type, return_period, probability,
+        climate_scenario, xmin, ymin, xmax, ymax, width and height of each raster.
+    """
+    hazard_types = {'FU': 'fluvial undefended', 'FD': 'fluvial defended',
+                    'PU': 'pluvial undefended', 'PD': 'pluvial defended',
+                    'inunriver': 'fluvial undefended'}
+
+    def __init__(self, hazard_dir):
+        self.hazard_dir = hazard_dir
+        rasters = []
+        for root, dirs, files in os.walk(hazard_dir):
+            for file in sorted(files):
+                if file.endswith(".tif") or file.endswith(".tiff"):
+                    file_path = os.path.join(root, file)
+                    file_name = file.split('.tif')[0]
+                    name_parts = re.split('[-_]', file_name)
+                    hazard_type = [self.hazard_types[n] for n in name_parts if n in self.hazard_types]
+                    return_period = re.findall(r'(\d+)$', file_name)
+                    scenario_dir = os.path.relpath(root, hazard_dir).split(os.sep)[0]
+                    with rasterio.open(file_path) as dataset:
+                        rasters.append({
+                            'file_path': file_path,
+                            'file_name': file_name,
+                            'hazard_type': hazard_type[0] if hazard_type else 'none',
+                            'return_period': float(return_period[0]) if return_period else np.nan,
+                            'probability': 1.0/float(return_period[0]) if return_period and float(return_period[0]) > 0 else np.nan,
+                            'climate_scenario': scenario_dir if scenario_dir != '.' else 'none',
+                            'xmin': dataset.bounds.left, 'ymin': dataset.bounds.bottom,
+                            'xmax': dataset.bounds.right, 'ymax': dataset.bounds.top,
+                            'width': dataset.width, 'height': dataset.height})
+
+        self.rasters = pd.DataFrame(rasters, columns=['file_path', 'file_name', 'hazard_type', 'return_period',
+                                                      'probability', 'climate_scenario', 'xmin', 'ymin',
+                                                      'xmax', 'ymax', 'width', 'height'])
+
+    def select(self, hazard_type=None, return_period=None, climate_scenario=None, bounds=None):
+        """Rasters matching the hazard attributes that are given and intersecting bounds
+
+        Returns:
+            DataFrame of the selected rows of rasters.
+        """
+        selected = np.ones(len(self.rasters.index), dtype=bool)
+        if hazard_type is not None:
+            selected &= (self.rasters['hazard_type'] == hazard_type).values
+        if return_period is not None:
+            selected &= (self.rasters['return_period'] == return_period).values
+        if climate_scenario is not None:
+            selected &= (self.rasters['climate_scenario'] == climate_scenario).values
+        if bounds is not None:
+            selected &= ((self.rasters['xmin'] < bounds[2]) & (self.rasters['xmax'] > bounds[0]) &
+                         (self.rasters['ymin'] < bounds[3]) & (self.rasters['ymax'] > bounds[1])).values
+        return self.rasters[selected]
+
+    def read(self, file_path, bounds=None, max_size=None):
+        """Read the window of a raster covering bounds, see get_data
+        """
+        return get_data(file_path, bounds=bounds, max_size=max_size)
+
+    def read_tiles(self, file_path, bounds=None, tile_size=1024):
+        """Read the window of a raster covering bounds in tiles, one tile in memory at a time
+
+        Yields:
+            data array and (xmin, xmax, ymax, ymin) extent of each tile.
+        """
+        with rasterio.open(file_path) as ds:
+            window = get_raster_window(ds, bounds)
+            for row_off in range(int(window.row_off), int(window.row_off + window.height), tile_size):
+                for col_off in range(int(window.col_off), int(window.col_off + window.width), tile_size):
+                    tile = Window(col_off, row_off,
+                                  min(tile_size, int(window.col_off + window.width) - col_off),
+                                  min(tile_size, int(window.row_off + window.height) - row_off))
+                    data = ds.read(1, window=tile)
+                    data[data < 0] = 0
+                    xmin, ymax = ds.transform * (tile.col_off, tile.row_off)
+                    xmax, ymin = ds.transform * (tile.col_off + tile.width, tile.row_off + tile.height)
+                    yield data, (xmin, xmax, ymax, ymin)
+
+
+def vincenty_distances(lat_1, lon_1, lat_2, lon_2, ellipsoid='WGS-84', iterations=20):
+    """Vincenty distances in kilometers between arrays of points, given in degrees.
+
+    Vectorised form of the Vincenty inverse formula used by `geopy.distance.vincenty`,
+    iterated over all point pairs at once until every pair has converged.
+
+    Args:
+        lat_1, lon_1, lat_2, lon_2: numpy arrays of latitudes and longitudes of the start
+        and end points.
+
+        ellipsoid: string name of an ellipsoid that `geopy` understands.
+
+        iterations: maximum number of iterations of the formula.
+
+    Returns:
+        numpy array of distances in kilometers.
+    """
+    major, minor, f = ELLIPSOIDS[ellipsoid]
+
+    lat_1, lon_1, lat_2, lon_2 = [np.radians(np.asarray(x, dtype=float)) for x in (lat_1, lon_1, lat_2, lon_2)]
+    delta_lon = lon_2 - lon_1
+    reduced_lat_1 = np.arctan((1 - f)*np.tan(lat_1))
+    reduced_lat_2 = np.arctan((1 - f)*np.tan(lat_2))
+    sin_u1, cos_u1 = np.sin(reduced_lat_1), np.cos(reduced_lat_1)
+    sin_u2, cos_u2 = np.sin(reduced_lat_2), np.cos(reduced_lat_2)
+
+    lambda_lon = delta_lon.copy()
+    active = np.ones(delta_lon.shape, dtype=bool)
+    sin_sigma = np.zeros(delta_lon.shape)
+    cos_sigma = np.ones(delta_lon.shape)
+    sigma = np.zeros(delta_lon.shape)
+    cos_sq_alpha = np.ones(delta_lon.shape)
+    cos2_sigma_m = np.zeros(delta_lon.shape)
+    for _ in range(iterations):
+        if not active.any():
+            break
+        sin_lambda, cos_lambda = np.sin(lambda_lon[active]), np.cos(lambda_lon[active])
+        su1, cu1, su2, cu2 = sin_u1[active], cos_u1[active], sin_u2[active], cos_u2[active]
+        sin_s = np.sqrt((cu2*sin_lambda)**2 + (cu1*su2 - su1*cu2*cos_lambda)**2)
+        cos_s = su1*su2 + cu1*cu2*cos_lambda
+        sig = np.arctan2(sin_s, cos_s)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sin_alpha = np.where(sin_s == 0, 0, cu1*cu2*sin_lambda/sin_s)
+            cos_sq_a = 1 - sin_alpha**2
+            cos2_sm = np.where(cos_sq_a == 0, 0, cos_s - 2*su1*su2/cos_sq_a)
+        c = f/16.*cos_sq_a*(4 + f*(4 - 3*cos_sq_a))
+        lambda_prev = lambda_lon[active]
+        lambda_next = delta_lon[active] + (1 - c)*f*sin_alpha*(
+            sig + c*sin_s*(cos2_sm + c*cos_s*(-1 + 2*cos2_sm**2)))
+
+        sin_sigma[active], cos_sigma[active], sigma[active] = sin_s, cos_s, sig
+        cos_sq_alpha[active], cos2_sigma_m[active] = cos_sq_a, cos2_sm
+        lambda_lon[active] = lambda_next
+        # Coincident points have converged with zero distance
+        converged = (np.abs(lambda_next - lambda_prev) <= 1e-12) | (sin_s == 0)
+        active[np.flatnonzero(active)[converged]] = False
+
+    u_sq = cos_sq_alpha*(major**2 - minor**2)/minor**2
+    a = 1 + u_sq/16384.*(4096 + u_sq*(-768 + u_sq*(320 - 175*u_sq)))
+    b = u_sq/1024.*(256 + u_sq*(-128 + u_sq*(74 - 47*u_sq)))
+    delta_sigma = b*sin_sigma*(cos2_sigma_m + b/4.*(
+        cos_sigma*(-1 + 2*cos2_sigma_m**2) -
+        b/6.*cos2_sigma_m*(-3 + 4*sin_sigma**2)*(-3 + 4*cos2_sigma_m**2)))
+
+    return minor*a*(sigma - delta_sigma)
+
+
+def line_lengths(geoms, ellipsoid='WGS-84'):
+    """Lengths of lines in kilometers, given in geographic coordinates.
+
+    Batched form of `line_length`, computed from the flattened coordinates of all lines.
+
+    Args:
+        geoms: GeoSeries or sequence of shapely LineString or MultiLineString objects with
+        WGS-84 coordinates. Other geometries have zero length.
+
+        ellipsoid: string name of an ellipsoid that `geopy` understands.
+
+    Returns:
+        numpy array of lengths of lines in kilometers.
+    """
+    geoms = np.asarray(getattr(geoms, 'values', geoms), dtype=object)
+    if len(geoms) == 0:
+        return np.zeros(0)
+    parts, geom_index = shapely.get_parts(geoms, return_index=True)
+    coords, part_index = shapely.get_coordinates(parts, return_index=True)
+    same_part = part_index[1:] == part_index[:-1]
+    segment_lengths = vincenty_distances(
+        coords[:-1, 1][same_part], coords[:-1, 0][same_part],
+        coords[1:, 1][same_part], coords[1:, 0][same_part], ellipsoid=ellipsoid)
+
+    return np.bincount(geom_index[part_index[1:][same_part]], weights=segment_lengths,
+                       minlength=len(geoms)).astype(float)
+
+
 def line_length(line, ellipsoid='WGS-84'):
     """Length of a line in meters, given in geographic coordinates.
 
@@ -357,13 +582,123 @@ def line_length(line, ellipsoid='WGS-84'):
     Returns:
         Length of line in kilometers.
     """
-    if line.geometryType() == 'MultiLineString':
-        return sum(line_length(segment) for segment in line)
+    return line_lengths([line], ellipsoid=ellipsoid)[0]
+
+# Parsed geo files of this process, keyed by path and modification time, with the least
+# recently used files evicted beyond _geo_file_memo_size
+_geo_file_memo = OrderedDict()
+_geo_file_memo_size = 8
+
+def geo_file_signature(file_path):
+    """Modification times and sizes of a geo file and its sidecar files, e.g. .dbf and .prj
+    """
+    file_root = os.path.splitext(file_path)[0]
+    sidecar_files = sorted([file_root + ext for ext in ['.shp', '.shx', '.dbf', '.prj', '.cpg']
+                            if os.path.exists(file_root + ext)] + [file_path])
+    return [(f, os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in sorted(set(sidecar_files))]
+
+
+def geo_file_hash(file_path):
+    """SHA-1 hash of the contents of a geo file and its sidecar files
+    """
+    file_hash = hashlib.sha1()
+    for sidecar_file, _, _ in geo_file_signature(file_path):
+        with open(sidecar_file, 'rb') as sidecar_fh:
+            for block in iter(lambda: sidecar_fh.read(1 << 20), b''):
+                file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def write_json_atomic(json_file, data):
+    """Write data to a json file through a temporary file, so readers never see a partial file
+    """
+    tmp_file = '{}.{}.tmp'.format(json_file, os.getpid())
+    with open(tmp_file, 'w') as json_fh:
+        json.dump(data, json_fh)
+    os.replace(tmp_file, json_file)
+
+
+def read_geo_file(file_path, encoding='utf-8', cache_path='', memo=True, cache=True):
+    """Read a geo file, e.g. a network shapefile, through an in-process memo and an on-disk
+    GeoParquet cache
+
+    A file is parsed once per process while it is unchanged, and the parsed GeoDataFrame is
+    also written as GeoParquet, with WKB geometry, which later processes read much faster
+    than a shapefile. The cache is used while the modification times of the source files
+    match, or their contents hash to the same value. Without pyarrow only the in-process
+    memo is used. The memo keeps the most recently read files only, and files that are read
+    once, e.g. intermediate results, should be read with memo and cache switched off.
+
+    Args:
+        file_path: path of the geo file.
+
+        encoding: encoding of the attributes of the geo file.
+
+        cache_path: directory of the GeoParquet files. Default is a .geo_cache directory
+        next to the geo file.
+
+        memo: keep the parsed file in the in-process memo. Default is True.
+
+        cache: read and write the GeoParquet cache. Default is True.
+
+    Returns:
+        GeoDataFrame copy of the geo file, which callers are free to change.
+    """
+    if memo == False and cache == False:
+        return gpd.read_file(file_path, encoding=encoding)
+
+    file_path = os.path.abspath(file_path)
+    signature = geo_file_signature(file_path)
+    memo_key = (file_path, encoding)
+    if memo and memo_key in _geo_file_memo and _geo_file_memo[memo_key][0] == signature:
+        _geo_file_memo.move_to_end(memo_key)
+        return _geo_file_memo[memo_key][1].copy()
+
+    if not cache_path:
+        cache_path = os.path.join(os.path.dirname(file_path), '.geo_cache')
+    cache_name = '{}_{}'.format(os.path.splitext(os.path.basename(file_path))[0],
+                                hashlib.sha1('{}|{}'.format(file_path, encoding).encode('utf-8')).hexdigest()[:12])
+    cache_file = os.path.join(cache_path, cache_name + '.parquet')
+    cache_info_file = os.path.join(cache_path, cache_name + '.json')
+
+    pyarrow = None
+    if cache:
+        try:
+            import pyarrow
+        except ImportError:
+            pyarrow = None
+
+    gdf = None
+    if pyarrow is not None and os.path.exists(cache_file) and os.path.exists(cache_info_file):
+        with open(cache_info_file, 'r') as cache_info_fh:
+            cache_info = json.load(cache_info_fh)
+        signature_list = [list(f) for f in signature]
+        if cache_info['signature'] == signature_list:
+            gdf = gpd.read_parquet(cache_file)
+        elif cache_info['sha1'] == geo_file_hash(file_path):
+            gdf = gpd.read_parquet(cache_file)
+            cache_info['signature'] = signature_list
+            write_json_atomic(cache_info_file, cache_info)
+
+    if gdf is None:
+        gdf = gpd.read_file(file_path, encoding=encoding)
+        if pyarrow is not None:
+            if os.path.exists(cache_path) == False:
+                os.makedirs(cache_path)
+            tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+            gdf.to_parquet(tmp_file)
+            os.replace(tmp_file, cache_file)
+            write_json_atomic(cache_info_file, {'signature': signature, 'sha1': geo_file_hash(file_path)})
+
+    if memo == False:
+        return gdf
+
+    _geo_file_memo[memo_key] = (signature, gdf)
+    _geo_file_memo.move_to_end(memo_key)
+    while len(_geo_file_memo) > _geo_file_memo_size:
+        _geo_file_memo.popitem(last=False)
+    return gdf.copy()
 
-    return sum(
-        vincenty(tuple(reversed(a)), tuple(reversed(b)), ellipsoid=ellipsoid).kilometers
-        for a, b in pairwise(line.coords)
-    )
 
 def gdf_geom_clip(gdf_in, clip_geom):
     """Filter a dataframe to contain only features within a clipping geometry
@@ -444,8 +779,8 @@ def gdf_clip(shape_in,clip_geom):
     Outputs are:
         province_geom -- shapely geometry of province for what we do the calculation
     """
-    gdf = gpd.read_file(shape_in)
-    gdf = gdf.to_crs({'init': 'epsg:4326'})
+    gdf = read_geo_file(shape_in)
+    gdf = gdf.to_crs('epsg:4326')
     return gdf.loc[gdf['geometry'].apply(lambda x: x.within(clip_geom))].reset_index(drop=True)
 
 
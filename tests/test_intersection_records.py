@@ -0,0 +1,68 @@
+"""Test the network-hazard-boundary intersection records written by IntersectionRecordSink
+"""
+import os
+
+import pandas as pd
+import pytest
+from atra.transport_flow_and_failure_functions import (IntersectionRecordSink,
+                                                       cast_to_schema,
+                                                       intersection_record_schema)
+
+
+def hazard_records(edge_ids, min_depth, max_depth):
+    """Intersection records of edges, in the form given by spatial_scenario_attributes
+    """
+    return pd.DataFrame({'edge_id': edge_ids,
+                         'length': [100.0*(e + 1) for e in range(len(edge_ids))],
+                         'province_id': [2, 14][:len(edge_ids)],
+                         'province_name': ['Buenos Aires', 'Cordoba'][:len(edge_ids)],
+                         'department_id': [101, 1402][:len(edge_ids)],
+                         'department_name': ['La Plata', 'Capital'][:len(edge_ids)],
+                         'sector': 'road',
+                         'hazard_type': 'fluvial flooding',
+                         'model': 'FATHOM',
+                         'year': 2016,
+                         'climate_scenario': 'Baseline',
+                         'probability': 0.01,
+                         'min_depth': min_depth,
+                         'max_depth': max_depth})
+
+
+def test_parquet_records_round_trip(tmpdir):
+    """Depth bands and boundary IDs are read back as they were written
+    """
+    pytest.importorskip('pyarrow')
+    records_path = os.path.join(str(tmpdir), 'road_hazard_intersection_records.parquet')
+    sink = IntersectionRecordSink(records_path=records_path, chunk_size=2,
+                                  schema=intersection_record_schema('edge_id', network_type='edges'))
+    sink.append(hazard_records(['roade_1', 'roade_2'], '50cm', '1m'))
+    sink.append(hazard_records(['roade_3'], '4m', '999m'))
+    aggregate = sink.close()
+
+    records = pd.read_parquet(records_path)
+    assert records['edge_id'].tolist() == ['roade_1', 'roade_2', 'roade_3']
+    assert records['min_depth'].tolist() == ['50cm', '50cm', '4m']
+    assert records['max_depth'].tolist() == ['1m', '1m', '999m']
+    assert records['province_id'].tolist() == [2, 14, 2]
+    assert records['department_id'].tolist() == [101, 1402, 101]
+    assert records['length'].tolist() == [100.0, 200.0, 100.0]
+
+    # The records file and the aggregate have the same types of IDs and depths
+    assert sorted(aggregate['province_id'].tolist()) == [2, 2, 14]
+    assert pd.api.types.is_integer_dtype(aggregate['province_id'])
+    assert pd.api.types.is_integer_dtype(records['province_id'])
+    assert sorted(aggregate['min_depth'].unique().tolist()) == ['4m', '50cm']
+
+
+def test_cast_to_schema_raises_on_unconvertible_values():
+    """Values that do not fit the type of their column are not silently dropped
+    """
+    schema = intersection_record_schema('edge_id', network_type='edges')
+    records = hazard_records(['roade_1', 'roade_2'], '50cm', '1m')
+
+    with pytest.raises(ValueError):
+        cast_to_schema(records.assign(probability='1in100'), schema)
+    with pytest.raises(ValueError):
+        cast_to_schema(records.assign(province_id=2.5), schema)
+    with pytest.raises(ValueError):
+        cast_to_schema(records.assign(band_num=1), schema)
@@ -0,0 +1,151 @@
+"""Test the array-based MRIA tables and model parameters against the dictionary construction
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('openpyxl')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src', 'atra', 'mria'))
+from table import io_basic
+
+
+def write_io_table(file_path, regions, sectors, fd_cats, seed=0):
+    """Write a synthetic IO table in the layout of the MRIA Excel tables
+    """
+    rng = np.random.RandomState(seed)
+    T_labels = [(r, s) for r in regions for s in sectors]
+    FD_labels = [(r, f) for r in regions for f in fd_cats]
+    n = len(T_labels)
+
+    T = rng.rand(n, n)*10
+    T[0, :] = 0
+    with pd.ExcelWriter(file_path) as writer:
+        pd.DataFrame(T_labels).to_excel(writer, sheet_name='labels_T', header=False, index=False)
+        pd.DataFrame(FD_labels).to_excel(writer, sheet_name='labels_FD', header=False, index=False)
+        pd.DataFrame([['Export']]).to_excel(writer, sheet_name='labels_ExpROW', header=False, index=False)
+        pd.DataFrame([['Import', 'VA'], ['Import', 'VA']]).to_excel(
+            writer, sheet_name='labels_VA', header=False, index=False)
+        pd.DataFrame(T).to_excel(writer, sheet_name='T', header=False, index=False)
+        pd.DataFrame(rng.rand(n, len(FD_labels))*50 + 20).to_excel(
+            writer, sheet_name='FD', header=False, index=False)
+        pd.DataFrame(rng.rand(n, 1)*5).to_excel(writer, sheet_name='ExpROW', header=False, index=False)
+        pd.DataFrame(rng.rand(n + len(FD_labels) + 1, 2)*5).to_excel(
+            writer, sheet_name='VA', header=False, index=False)
+
+
+def frame_dictionary(table):
+    """Dictionary of a table, built row by row
+    """
+    return {r + k: v for r, kv in table.iterrows() for k, v in kv.to_dict().items()}
+
+
+def baseline_values(Table, regions, sectors, fd_cats):
+    """Baseline parameters and initial values of the MRIA model, from the dictionaries of the table
+    """
+    Z_matrix = frame_dictionary(Table.T_data)
+    A_matrix = frame_dictionary(Table.A)
+    FinalD = frame_dictionary(Table.FD_data)
+    ExpROW = frame_dictionary(Table.ExpROW_data)
+
+    fd = {(R, S): sum(FinalD[R, S, Rb, f] for Rb in regions for f in fd_cats)
+          for R in regions for S in sectors}
+    lfd = {(R, S): sum(FinalD[R, S, R, f] for f in fd_cats) for R in regions for S in sectors}
+    Xbase = {(R, S): sum(Z_matrix[R, S, Rb, Sb] for Rb in regions for Sb in sectors)
+             + fd[R, S] + ExpROW[R, S, 'Export'] for R in regions for S in sectors}
+    X = {(R, S): sum(A_matrix[R, S, Rb, Sb]*Xbase[Rb, Sb] for Rb in regions for Sb in sectors)
+         + fd[R, S] + ExpROW[R, S, 'Export'] for R in regions for S in sectors}
+
+    def use(R, S, Rb):
+        # demand of region Rb for sector S of region R
+        return sum(A_matrix[R, S, Rb, Sb]*X[Rb, Sb] for Sb in sectors)
+
+    trade = {(R, Rb, S): sum(A_matrix[Rb, S, R, i]*X[R, i] for i in sectors)
+             + sum(FinalD[Rb, S, R, f] for f in fd_cats)
+             for R in regions for Rb in regions for S in sectors if R != Rb}
+    TotExp = {(R, S): sum(trade[Rb, R, S] for Rb in regions if R != Rb)
+              for R in regions for S in sectors}
+    TotImp = {(R, S): sum(trade[R, Rb, S] for Rb in regions if R != Rb)
+              for R in regions for S in sectors}
+    ImportShare = {}
+    for R in regions:
+        for Rb in regions:
+            for S in sectors:
+                if R == Rb:
+                    continue
+                try:
+                    ImportShare[R, Rb, S] = trade[Rb, R, S]/(use(R, S, Rb) + fd[Rb, S])
+                except ZeroDivisionError:
+                    ImportShare[R, Rb, S] = 0
+    Demand = {(R, S): use(R, S, R) + lfd[R, S]
+              + sum(ImportShare[R, Rb, S]*(use(R, S, Rb) + fd[Rb, S]) for Rb in regions if R != Rb)
+              + ExpROW[R, S, 'Export'] for R in regions for S in sectors}
+
+    return {'A_matrix': A_matrix, 'Xbase': Xbase, 'X': X, 'trade': trade, 'TotExp': TotExp,
+            'TotImp': TotImp, 'ImportShare': ImportShare, 'Demand': Demand}
+
+
+def assert_same_values(model_values, expected):
+    """The values of a model component equal the expected dictionary, for each key
+    """
+    model_values = {k: v for k, v in model_values.items() if v is not None}
+    assert sorted(model_values) == sorted(expected)
+    for key, expected_value in expected.items():
+        assert model_values[key] == pytest.approx(expected_value, rel=1e-9, abs=1e-12), key
+
+
+def test_model_arrays_match_dictionaries(tmpdir):
+    """A transposed axis of any of the arrays changes the values of the model
+    """
+    pytest.importorskip('pyomo')
+    pytest.importorskip('gams')
+    from model import MRIA_IO
+
+    regions = ['r0', 'r1', 'r2']
+    sectors = ['s0', 's1']
+    fd_cats = ['hh', 'gov']
+    file_path = os.path.join(str(tmpdir), 'io_table.xlsx')
+    write_io_table(file_path, regions, sectors, fd_cats)
+
+    # a different order of the regions than in the table
+    model_regions = regions[::-1]
+    Table = io_basic('test', file_path, model_regions)
+    Table.prep_data()
+
+    assert Table.Z_matrix == frame_dictionary(Table.T_data)
+    assert Table.A_matrix == frame_dictionary(Table.A)
+    assert Table.FinalD == frame_dictionary(Table.FD_data)
+
+    MRIA_model = MRIA_IO('test', Table.regions, Table.sectors, list_fd_cats=Table.FD_cat)
+    MRIA_model.create_sets()
+    MRIA_model.create_alias()
+    MRIA_model.baseline_data(Table, {}, {})
+    MRIA_model.create_X_up({})
+    MRIA_model.create_Rdem()
+    MRIA_model.create_Rat(Table.final_demand(Table.FD_cat), Table.Z_array)
+    MRIA_model.create_DisImp({})
+    MRIA_model.create_demand()
+
+    expected = baseline_values(Table, regions, sectors, fd_cats)
+    model = MRIA_model.m
+    for name in ['A_matrix', 'Xbase', 'trade', 'TotExp', 'TotImp', 'ImportShare']:
+        assert_same_values(getattr(model, name).extract_values(), expected[name])
+    assert_same_values(model.X.extract_values(), expected['X'])
+    assert_same_values(model.Demand.extract_values(), expected['Demand'])
+
+
+def test_damaged_sheet_cache_is_read_again(tmpdir):
+    """A cache that cannot be unpickled is replaced by the sheets of the Excel file
+    """
+    file_path = os.path.join(str(tmpdir), 'io_table.xlsx')
+    write_io_table(file_path, ['r0', 'r1'], ['s0'], ['hh'])
+    with open(os.path.join(str(tmpdir), 'io_table.pkl'), 'wb') as cache:
+        cache.write(b'not a pickle')
+
+    sheets = io_basic('test', file_path, []).read_sheets()
+    assert sheets['labels_T'].values.tolist() == [['r0', 's0'], ['r1', 's0']]
+    assert io_basic('test', file_path, []).read_sheets()['T'].shape == (2, 2)